@@ -0,0 +1,123 @@
+"""Operator endpoints, served only when ADMIN_TOKEN is set.
+
+Requests must send the token in the X-Admin-Token header. Every endpoint
+acts on the worker process that receives the request.
+"""
+
+import asyncio
+import hmac
+import os
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from .infer import classifier
+from .profiler import PROFILE_MAX_SECONDS, profiler
+from .registry import ModelValidationError
+from .schemas import ModelsStatus, ProfileStatus
+
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_TOKEN:
+        # Indistinguishable from a missing route while admin access is off
+        raise HTTPException(404, "Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(403, "Invalid admin token")
+
+
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)], include_in_schema=False)
+
+
+@admin_router.get("/profile", response_model=ProfileStatus)
+def profile_status() -> ProfileStatus:
+    return ProfileStatus(**profiler.status())
+
+
+@admin_router.post("/profile")
+async def start_profile(
+    seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(5.0, ge=1.0, le=1000.0),
+    wait: bool = Query(False, description="Block until the run ends and return the collapsed stacks"),
+):
+    """Sample this worker's stacks for `seconds`."""
+    if not profiler.start(seconds, interval_ms / 1000.0):
+        raise HTTPException(409, "A profile is already running in this worker")
+    if not wait:
+        return ProfileStatus(**profiler.status())
+    path = await asyncio.to_thread(profiler.wait)
+    if path is None:
+        raise HTTPException(500, f"The profile run wrote no file: {profiler.last_error or 'unknown error'}")
+    try:
+        return PlainTextResponse(path.read_text())
+    except OSError as e:
+        raise HTTPException(500, f"Cannot read the profile {path}: {e}") from e
+
+
+@admin_router.post("/profile/stop", response_model=ProfileStatus)
+async def stop_profile() -> ProfileStatus:
+    profiler.stop()
+    await asyncio.to_thread(profiler.wait, 5.0)
+    return ProfileStatus(**profiler.status())
+
+
+@admin_router.get("/models", response_model=ModelsStatus)
+def models_status() -> ModelsStatus:
+    return ModelsStatus(**classifier.models.status())
+
+
+@admin_router.post("/models/load", response_model=ModelsStatus)
+async def load_model(
+    path: Optional[str] = Query(None, description="Directory laid out like MODELS_DIR "
+                                                  "(default: MODELS_DIR, or the variant LATENCY_BUDGET_MS selects)"),
+    activate: bool = Query(False, description="Serve the new version as soon as it passes validation"),
+    wait: bool = Query(False, description="Block until loading and validation finish"),
+):
+    """Load and validate a candidate model version in the background."""
+    if not classifier.models.load_candidate(Path(path) if path else classifier.serving_dir(), activate):
+        raise HTTPException(409, "A model is already loading in this worker")
+    if wait:
+        await asyncio.to_thread(classifier.models.wait)
+    return ModelsStatus(**classifier.models.status())
+
+
+@admin_router.post("/models/activate", response_model=ModelsStatus)
+def activate_model() -> ModelsStatus:
+    """Serve the candidate from the next batch on; in-flight batches finish on the old version."""
+    try:
+        classifier.models.activate()
+    except LookupError as e:
+        raise HTTPException(409, str(e))
+    except Exception as e:
+        raise HTTPException(500, classifier.models.error or str(e)) from e
+    return ModelsStatus(**classifier.models.status())
+
+
+@admin_router.post("/models/rollback", response_model=ModelsStatus)
+def rollback_model() -> ModelsStatus:
+    try:
+        classifier.models.rollback()
+    except LookupError as e:
+        raise HTTPException(409, str(e))
+    except Exception as e:
+        raise HTTPException(500, classifier.models.error or str(e)) from e
+    return ModelsStatus(**classifier.models.status())
+
+
+@admin_router.post("/models/shadow", response_model=ModelsStatus)
+def shadow_model(fraction: float = Query(..., ge=0.0, le=1.0)) -> ModelsStatus:
+    """Re-score `fraction` of batches with the candidate (0 stops); resets the shadow statistics."""
+    try:
+        classifier.models.set_shadow(fraction)
+    except (LookupError, ModelValidationError) as e:
+        raise HTTPException(409, str(e))
+    return ModelsStatus(**classifier.models.status())
+
+
+@admin_router.delete("/models/candidate", response_model=ModelsStatus)
+def discard_model() -> ModelsStatus:
+    classifier.models.discard()
+    return ModelsStatus(**classifier.models.status())
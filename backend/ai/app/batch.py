@@ -0,0 +1,243 @@
+"""Offline scoring of recorded landmark sequences.
+
+Runs the same features, rolling windows, classifier and rep counters as
+the service over landmark files, without HTTP:
+
+    python -m app.batch recordings/*.npy sessions.jsonl --workers 4 --output summaries.jsonl
+
+Input formats (one sequence is a run of frames with the same sequence id):
+
+    .npy    (T, 33, 3) or (T, 99) frames of one sequence, id = file stem;
+            (S, T, 33, 3) holds S sequences, ids <stem>:<index>
+    .csv    header row; optional `sequence_id` and `exercise` columns, then
+            99 landmark columns in x0, y0, v0, x1, ... order (any other
+            non-landmark column such as `frame` must be named in --skip-columns)
+    .jsonl  one frame per line: {"sequence_id": ..., "exercise": ...,
+            "landmarks": [[x, y, v], ...] or [{"x": ..., "y": ..., "visibility": ...}, ...]}
+
+Files are sharded across a process pool; each worker streams its file in
+chunks of --chunk-frames frames, so memory stays bounded by the chunk size
+rather than the recording length. One JSON summary per sequence is written
+in input order, and throughput is reported on stderr.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import rep_counter
+from .calibration import Calibrator, calibrations
+from .infer import classifier
+from .preprocess import compute_features, get_primary_angle, get_primary_angles
+from .rep_counter import RepCounter
+from .windows import FeatureWindows, windows
+
+CHUNK_FRAMES = 4096
+
+N_VALUES = 33 * 3
+
+# (sequence_id, exercise or None, (n, 33, 3) frames)
+Chunk = Tuple[str, Optional[str], np.ndarray]
+
+
+def _npy_chunks(path: Path, chunk_frames: int) -> Iterator[Chunk]:
+    data = np.load(path, mmap_mode="r")
+    if data.ndim == 2:
+        data = data.reshape(len(data), 33, 3)
+    sequences = data if data.ndim == 4 else data[None]
+    for i, frames in enumerate(sequences):
+        sequence_id = path.stem if data.ndim == 3 else f"{path.stem}:{i}"
+        for start in range(0, len(frames), chunk_frames):
+            yield sequence_id, None, np.asarray(frames[start:start + chunk_frames], dtype=np.float64)
+
+
+def _grouped(rows: Iterator[Tuple[str, Optional[str], np.ndarray]], chunk_frames: int) -> Iterator[Chunk]:
+    """Group consecutive per-frame rows into chunks of one sequence."""
+    key, frames = None, []
+    for sequence_id, exercise, values in rows:
+        if frames and ((sequence_id, exercise) != key or len(frames) == chunk_frames):
+            yield key[0], key[1], np.array(frames).reshape(-1, 33, 3)
+            frames = []
+        key = (sequence_id, exercise)
+        frames.append(values)
+    if frames:
+        yield key[0], key[1], np.array(frames).reshape(-1, 33, 3)
+
+
+def _csv_rows(path: Path, skip_columns: List[str]):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        id_col = header.index("sequence_id") if "sequence_id" in header else None
+        ex_col = header.index("exercise") if "exercise" in header else None
+        skip = {id_col, ex_col} | {header.index(c) for c in skip_columns if c in header}
+        value_cols = [i for i in range(len(header)) if i not in skip]
+        if len(value_cols) != N_VALUES:
+            raise ValueError(f"{path}: expected {N_VALUES} landmark columns, found {len(value_cols)}")
+        for row in reader:
+            sequence_id = row[id_col] if id_col is not None else path.stem
+            exercise = (row[ex_col] or None) if ex_col is not None else None
+            yield sequence_id, exercise, [float(row[i]) for i in value_cols]
+
+
+def _jsonl_rows(path: Path):
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            landmarks = rec["landmarks"]
+            if landmarks and isinstance(landmarks[0], dict):
+                landmarks = [(lm["x"], lm["y"], lm.get("visibility", 1.0)) for lm in landmarks]
+            yield str(rec.get("sequence_id", path.stem)), rec.get("exercise"), landmarks
+
+
+def read_chunks(path: Path, chunk_frames: int = CHUNK_FRAMES, skip_columns: List[str] = ()) -> Iterator[Chunk]:
+    """Stream a landmark file as (sequence_id, exercise, frames) chunks, oldest frames first."""
+    suffix = path.suffix.lower()
+    if suffix == ".npy":
+        return _npy_chunks(path, chunk_frames)
+    if suffix == ".csv":
+        return _grouped(_csv_rows(path, list(skip_columns)), chunk_frames)
+    if suffix == ".jsonl":
+        return _grouped(_jsonl_rows(path), chunk_frames)
+    raise ValueError(f"Unsupported input format: {path}")
+
+
+class SequenceScorer:
+    """Accumulates one sequence's predictions and rep counts across chunks."""
+
+    def __init__(self, source: str, sequence_id: str):
+        self.source = source
+        self.sequence_id = sequence_id
+        self.frames = 0
+        self.confidence_sum = 0.0
+        self.labels: Counter = Counter()
+        self.counters: Dict[str, RepCounter] = {}
+        self.calibrators: Dict[str, Calibrator] = {}
+
+    def update(self, feats: np.ndarray, probs: np.ndarray, exercise: Optional[str]):
+        targets, confidences = classifier.resolve_batch(probs, exercise)
+        for row, target in zip(feats, targets):
+            counter = self.counters.get(target)
+            if counter is None:
+                counter = self.counters[target] = RepCounter()
+            down, up = rep_counter.THRESHOLDS.get(target, (55, 160))
+            if calibrations.enabled:
+                calibrator = self.calibrators.get(target)
+                if calibrator is None:
+                    calibrator = self.calibrators[target] = Calibrator()
+                angle, thresholds, min_count, switched = calibrator.update(*get_primary_angles(row, target))
+                down, up = thresholds or (down, up)
+                if switched:
+                    counter.restart_smoothing()
+                counter.credit(min_count)
+            else:
+                angle = get_primary_angle(row, target)
+            counter.update(angle, down, up)
+        self.frames += len(feats)
+        self.confidence_sum += float(confidences.sum())
+        self.labels.update(targets)
+
+    def summary(self) -> dict:
+        exercise = self.labels.most_common(1)[0][0]
+        return {
+            "source": self.source,
+            "sequence_id": self.sequence_id,
+            "frames": self.frames,
+            "exercise": exercise,
+            "mean_confidence": self.confidence_sum / self.frames,
+            "rep_count": self.counters[exercise].count,
+            "rep_counts": {ex: c.count for ex, c in self.counters.items()},
+            "exercise_frames": dict(self.labels),
+        }
+
+
+def _init_worker(thresholds: Optional[Dict[str, List[float]]], calibrate: bool = False):
+    calibrations.enabled = calibrate
+    classifier.load()
+    if not classifier.is_loaded:
+        raise RuntimeError("Model not loaded - check MODELS_DIR")
+    if thresholds:
+        rep_counter.THRESHOLDS.update({ex: tuple(t) for ex, t in thresholds.items()})
+
+
+def score_file(path: str, chunk_frames: int = CHUNK_FRAMES, exercise: Optional[str] = None,
+               skip_columns: List[str] = ()) -> Tuple[List[dict], int, float]:
+    """Score every sequence in one file; returns (summaries, frames, CPU seconds)."""
+    started = time.process_time()
+    # Sized by classifier.load() in the worker initializer
+    seq_windows = FeatureWindows(windows.window_size, windows.ddof)
+    summaries, scorer = [], None
+    for sequence_id, chunk_exercise, pts in read_chunks(Path(path), chunk_frames, skip_columns):
+        if scorer is None or scorer.sequence_id != sequence_id:
+            if scorer is not None:
+                summaries.append(scorer.summary())
+                seq_windows.reset(scorer.sequence_id)
+            scorer = SequenceScorer(Path(path).name, sequence_id)
+        feats = compute_features(pts)
+        probs = classifier.predict_stats(seq_windows.push_many(sequence_id, feats))
+        scorer.update(feats, probs, exercise or chunk_exercise)
+    if scorer is not None:
+        summaries.append(scorer.summary())
+    return summaries, sum(s["frames"] for s in summaries), time.process_time() - started
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.batch", description="Score recorded landmark sequences offline.")
+    parser.add_argument("inputs", nargs="+", type=Path, help=".npy, .csv or .jsonl files, or directories of them")
+    parser.add_argument("--output", "-o", type=Path, help="JSONL summaries (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-frames", type=int, default=CHUNK_FRAMES)
+    parser.add_argument("--exercise", help="Score every sequence as this exercise (default: per-file column or auto-detect)")
+    parser.add_argument("--thresholds", type=Path, help='JSON {"exercise": [down, up]} overriding rep_counter.THRESHOLDS')
+    parser.add_argument("--calibrate", action="store_true", default=calibrations.enabled,
+                        help="Adapt thresholds and side per sequence (as REP_CALIBRATION=1)")
+    parser.add_argument("--skip-columns", nargs="*", default=["frame"], help="Non-landmark CSV columns")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.inputs:
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in (".npy", ".csv", ".jsonl")))
+        else:
+            files.append(path)
+    thresholds = json.loads(args.thresholds.read_text()) if args.thresholds else None
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    started = time.perf_counter()
+    frames = sequences = 0
+    cpu = 0.0
+    workers = max(1, min(args.workers, len(files)))
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(thresholds, args.calibrate)) as pool:
+            jobs = [pool.submit(score_file, str(f), args.chunk_frames, args.exercise, args.skip_columns) for f in files]
+            for job in jobs:
+                summaries, n, seconds = job.result()
+                for summary in summaries:
+                    out.write(json.dumps(summary) + "\n")
+                frames += n
+                sequences += len(summaries)
+                cpu += seconds
+    finally:
+        if args.output:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{sequences} sequences, {frames} frames from {len(files)} files in {elapsed:.2f}s "
+          f"with {workers} workers: {frames / elapsed:.0f} frames/s, "
+          f"{frames / elapsed / workers:.0f} frames/s per core ({frames / cpu if cpu else 0:.0f} per CPU-second)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
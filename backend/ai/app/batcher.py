@@ -0,0 +1,172 @@
+"""Micro-batching of concurrent /analyze calls."""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import metrics
+from .executor import executor
+from .infer import Frame, classifier
+
+logger = logging.getLogger(__name__)
+
+# Collection window in milliseconds; 0 leaves micro-batching off
+BATCH_WINDOW_MS = float(os.environ.get("ANALYZE_BATCH_WINDOW_MS", "0"))
+MAX_BATCH = int(os.environ.get("ANALYZE_MAX_BATCH", "64"))
+
+# Upper bounds of the batch size histogram buckets (last bucket is +Inf)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-frame requests into predict_batch calls.
+
+    A single consumer task drains the queue in FIFO order and runs one batch
+    at a time, so frames of the same session reach the rep counter in the
+    order their requests arrived.
+    """
+
+    def __init__(self, window_ms: float = BATCH_WINDOW_MS, max_batch: int = MAX_BATCH):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Requests taken off the queue and not yet answered; failed by stop()
+        self._inflight: List[tuple] = []
+        self.batches = 0
+        self.frames = 0
+        self.size_counts = [0] * (len(SIZE_BUCKETS) + 1)
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Micro-batching enabled (window={self.window * 1000:.1f}ms, max_batch={self.max_batch})")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        pending = self._inflight
+        self._inflight = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, frame: Frame) -> Tuple[str, float, int]:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((frame, future, time.monotonic()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._inflight = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._dispatch(batch)
+            self._inflight = []
+
+    async def _dispatch(self, batch: List[tuple]):
+        now = time.monotonic()
+        self._record(len(batch), [now - enqueued for _, _, enqueued in batch])
+        frames = [frame for frame, _, _ in batch]
+        try:
+            if executor.serves(classifier.active):
+                results = await classifier.predict_batch_async(frames)
+            else:
+                results = await asyncio.to_thread(classifier.predict_batch, frames)
+        except Exception as e:
+            if len(batch) == 1:
+                results = [e]
+            else:
+                # Retry frame by frame so only the frames that fail on their own fail their requests
+                logger.warning(f"Batch of {len(batch)} frames failed ({e}), retrying frame by frame")
+                results = await asyncio.to_thread(_predict_each, frames)
+        for (_, future, _), result in zip(batch, results):
+            # The client may have gone away while the batch was running
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _record(self, size: int, waits: List[float]):
+        self.batches += 1
+        self.frames += size
+        bucket = next((i for i, bound in enumerate(SIZE_BUCKETS) if size <= bound), len(SIZE_BUCKETS))
+        self.size_counts[bucket] += 1
+        self.wait_total += sum(waits)
+        self.wait_max = max(self.wait_max, max(waits))
+        for wait in waits:
+            metrics.observe_stage("batch_wait", wait)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "frames": self.frames,
+            "batch_size_buckets": dict(zip([str(b) for b in SIZE_BUCKETS] + ["+Inf"], self.size_counts)),
+            "wait_ms_avg": self.wait_total / self.frames * 1000.0 if self.frames else 0.0,
+            "wait_ms_max": self.wait_max * 1000.0,
+        }
+
+
+def _predict_each(frames: Sequence[Frame]) -> List[object]:
+    """predict_batch one frame at a time; a frame that raises gets its exception as result."""
+    results = []
+    for frame in frames:
+        try:
+            results.append(classifier.predict_batch([frame])[0])
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+batcher = MicroBatcher()
+
+
+async def analyze_frame(frame: Frame) -> Tuple[str, float, int]:
+    """Classify one frame, through the micro-batcher when it is running."""
+    if batcher.enabled:
+        return await batcher.submit(frame)
+    if executor.serves(classifier.active):
+        # The model call leaves the process anyway; no hop through the thread pool
+        return (await classifier.predict_batch_async([frame]))[0]
+    return (await asyncio.to_thread(classifier.predict_batch, [frame]))[0]
+
+
+async def analyze_frames(frames: Sequence[Frame]) -> List[Tuple[str, float, int]]:
+    """Classify frames that arrived together as one batch, bypassing the micro-batcher."""
+    if executor.serves(classifier.active):
+        return await classifier.predict_batch_async(frames)
+    return await asyncio.to_thread(classifier.predict_batch, frames)
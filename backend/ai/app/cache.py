@@ -0,0 +1,167 @@
+"""Per-session reuse of class probabilities for near-identical frames.
+
+While a user holds a position, consecutive model inputs barely change.
+`InferenceCache` keeps, per session, the input row the last probabilities
+were computed for; a frame whose row is within INFERENCE_CACHE_TOL of it
+reuses those probabilities instead of calling predict_proba. Distances are
+measured against the row of the last real prediction (not the previous
+frame), so slow drift cannot accumulate unnoticed, and every
+INFERENCE_CACHE_REFRESH frames a prediction is forced regardless.
+
+Columns are compared in scaled units: 1 unit is one degree for the angle
+and tilt columns and 0.01 for the ratio columns.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .rep_counter import SESSION_MAX
+
+# 0 disables the cache
+INFERENCE_CACHE_TOL = float(os.environ.get("INFERENCE_CACHE_TOL", "0"))
+INFERENCE_CACHE_NORM = os.environ.get("INFERENCE_CACHE_NORM", "linf")  # "linf" or "l2"
+INFERENCE_CACHE_REFRESH = int(os.environ.get("INFERENCE_CACHE_REFRESH", "10"))
+
+# Size of one tolerance unit per feature (default: 1, i.e. one degree)
+FEATURE_UNITS = {"ratio_sh_hip": 0.01, "ratio_arm_torso": 0.01}
+
+
+def column_units(feature_cols: Sequence[str]) -> np.ndarray:
+    """Tolerance unit of every model column (`<feature>_mean` / `_std` share their feature's)."""
+    return np.array([FEATURE_UNITS.get(col.rsplit("_", 1)[0], FEATURE_UNITS.get(col, 1.0))
+                     for col in feature_cols])
+
+
+class _Entry:
+    __slots__ = ("x", "probs", "age")
+
+    def __init__(self, x: np.ndarray, probs: np.ndarray):
+        self.x = x
+        self.probs = probs
+        self.age = 0
+
+
+class InferenceCache:
+    def __init__(self, tol: float = INFERENCE_CACHE_TOL, norm: str = INFERENCE_CACHE_NORM,
+                 refresh: int = INFERENCE_CACHE_REFRESH, max_sessions: int = SESSION_MAX):
+        if norm not in ("linf", "l2"):
+            raise ValueError(f"INFERENCE_CACHE_NORM must be 'linf' or 'l2', not {norm!r}")
+        self.tol = tol
+        self.norm = norm
+        self.refresh = max(1, refresh)
+        self.max_sessions = max(1, max_sessions)
+        self._inv_units = np.ones(0)
+        self.hits = 0
+        self.misses = 0
+        self.forced = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()  # Requests look up and store from several threads
+
+    @property
+    def enabled(self) -> bool:
+        return self.tol > 0
+
+    def configure(self, feature_cols: Sequence[str]):
+        """Set column units for the loaded model; drops cached entries."""
+        with self._lock:
+            self._inv_units = 1.0 / column_units(feature_cols)
+            self._entries.clear()
+
+    def _within(self, x: np.ndarray, cached: np.ndarray) -> bool:
+        d = np.abs(x - cached)
+        d *= self._inv_units
+        if self.norm == "linf":
+            return d.max() <= self.tol
+        return d @ d <= self.tol * self.tol
+
+    def predict_proba(self, session_ids: Sequence[str], X: np.ndarray,
+                      predict_proba: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """predict_proba(X) with cache hits filled in per session; rows are in frame order."""
+        if not self.enabled:
+            return predict_proba(X)
+        misses, hits = self._lookup(session_ids, X)
+        fresh = predict_proba(X[misses] if hits else X) if misses else None
+        return self._complete(session_ids, X, misses, hits, fresh)
+
+    async def predict_proba_async(self, session_ids: Sequence[str], X: np.ndarray,
+                                  predict_proba: Callable[[np.ndarray], Awaitable[np.ndarray]]) -> np.ndarray:
+        """`predict_proba` with an awaitable model call."""
+        if not self.enabled:
+            return await predict_proba(X)
+        misses, hits = self._lookup(session_ids, X)
+        fresh = await predict_proba(X[misses] if hits else X) if misses else None
+        return self._complete(session_ids, X, misses, hits, fresh)
+
+    def _lookup(self, session_ids: Sequence[str], X: np.ndarray) -> Tuple[List[int], List[Tuple[int, np.ndarray]]]:
+        """(rows to predict, [(row, cached probabilities)])"""
+        misses: List[int] = []
+        hits: List[Tuple[int, np.ndarray]] = []
+        # A session with a miss earlier in this batch has no valid entry for its later frames
+        pending = set()
+        with self._lock:
+            for i, session_id in enumerate(session_ids):
+                entry = self._entries.get(session_id)
+                if entry is None or session_id in pending:
+                    hit = False
+                elif entry.age + 1 >= self.refresh:
+                    self.forced += 1
+                    hit = False
+                else:
+                    hit = self._within(X[i], entry.x)
+                if hit:
+                    entry.age += 1
+                    hits.append((i, entry.probs))
+                    self._entries.move_to_end(session_id)
+                else:
+                    misses.append(i)
+                    pending.add(session_id)
+
+            self.hits += len(hits)
+            self.misses += len(misses)
+        return misses, hits
+
+    def _complete(self, session_ids: Sequence[str], X: np.ndarray, misses: List[int],
+                  hits: List[Tuple[int, np.ndarray]], fresh: Optional[np.ndarray]) -> np.ndarray:
+        """Merge fresh predictions for `misses` with the hits and store them."""
+        if not misses:
+            return np.array([probs for _, probs in hits])
+
+        if hits:
+            out = np.empty((len(X), fresh.shape[1]))
+            out[misses] = fresh
+            for i, probs in hits:
+                out[i] = probs
+        else:
+            out = fresh
+        with self._lock:
+            for i, probs in zip(misses, fresh):
+                self._entries[session_ids[i]] = _Entry(X[i].copy(), probs)
+                self._entries.move_to_end(session_ids[i])
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+        return out
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "tolerance": self.tol,
+            "norm": self.norm,
+            "refresh_frames": self.refresh,
+            "sessions": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "forced_refreshes": self.forced,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+inference_cache = InferenceCache()
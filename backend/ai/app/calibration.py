@@ -0,0 +1,219 @@
+"""Per-session rep thresholds learned from the user's own range of motion.
+
+The fixed `rep_counter.THRESHOLDS` assume a full range of motion seen from
+the front on the left side. With REP_CALIBRATION=1, every (session,
+exercise) also keeps streaming sketches of its left and right primary
+angles: min/max and P² estimates of the 10th and 90th percentiles, O(1)
+memory each. Once CALIBRATION_MIN_REPS movement cycles spanning at least
+CALIBRATION_MIN_RANGE degrees have been seen, the counter's (down, up)
+thresholds are placed CALIBRATION_MARGIN of the p10..p90 band inside it,
+and the side with the wider, better-tracked motion drives the counter.
+Until then the fixed thresholds and the left side are used, as before.
+
+Thresholds are re-derived on every frame, so they follow the user as the
+sketches settle; `RepCounter.update` itself is unchanged. The cycles seen
+before calibration are credited once it starts (`RepCounter.credit`), so a
+user whose range never reached the fixed thresholds does not lose their
+first reps. When the driving side changes, the counter's smoothing window
+is emptied, so the two sides' angles are never averaged together.
+
+Calibration state is per worker process, also with SESSION_BACKEND=shm.
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .rep_counter import SESSION_MAX
+
+CALIBRATION_ENABLED = os.environ.get("REP_CALIBRATION", "0").lower() in ("1", "true", "yes", "on")
+CALIBRATION_MIN_REPS = int(os.environ.get("CALIBRATION_MIN_REPS", "3"))
+CALIBRATION_MIN_RANGE = float(os.environ.get("CALIBRATION_MIN_RANGE", "30"))
+CALIBRATION_MARGIN = float(os.environ.get("CALIBRATION_MARGIN", "0.25"))
+
+LOW_QUANTILE, HIGH_QUANTILE = 0.1, 0.9
+# Fraction of the band around its middle an angle must clear to count as a turn of a cycle
+CYCLE_HYSTERESIS = 0.15
+# The other side takes over only when its score is this much better
+SIDE_SWITCH_RATIO = 1.25
+
+
+class P2Quantile:
+    """P² streaming quantile estimate (Jain & Chlamtac, 1985): five markers, O(1) per value."""
+
+    __slots__ = ("p", "heights", "positions", "desired", "increments", "n")
+
+    def __init__(self, p: float):
+        self.p = p
+        self.heights: List[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1.0, 1.0 + 2 * p, 1.0 + 4 * p, 3.0 + 2 * p, 5.0]
+        self.increments = (0.0, p / 2, p, (1 + p) / 2, 1.0)
+        self.n = 0
+
+    def add(self, x: float):
+        self.n += 1
+        h = self.heights
+        if self.n <= 5:
+            h.append(x)
+            h.sort()
+            return
+
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+        pos, desired = self.positions, self.desired
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            desired[i] += self.increments[i]
+
+        # Move the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = h[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (h[i + 1] - h[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (h[i] - h[i - 1]) / (pos[i] - pos[i - 1]))
+                if h[i - 1] < parabolic < h[i + 1]:
+                    h[i] = parabolic
+                else:
+                    h[i] += d * (h[i + d] - h[i]) / (pos[i + d] - pos[i])
+                pos[i] += d
+
+    def value(self) -> float:
+        if self.n > 5:
+            return self.heights[2]
+        if not self.heights:
+            return math.nan
+        # Exact quantile of the first few values
+        return self.heights[min(len(self.heights) - 1, int(self.p * len(self.heights)))]
+
+
+class AngleSketch:
+    """Streaming statistics of one side's primary angle."""
+
+    __slots__ = ("low", "high", "min", "max", "frames", "valid", "cycles", "_high_side")
+
+    def __init__(self):
+        self.low = P2Quantile(LOW_QUANTILE)
+        self.high = P2Quantile(HIGH_QUANTILE)
+        self.min = math.inf
+        self.max = -math.inf
+        self.frames = 0
+        self.valid = 0
+        self.cycles = 0  # Trips from the low side of the band to the high side
+        self._high_side = True
+
+    def add(self, angle: float):
+        self.frames += 1
+        if angle != angle:  # NaN: not visible
+            return
+        self.valid += 1
+        self.low.add(angle)
+        self.high.add(angle)
+        self.min = min(self.min, angle)
+        self.max = max(self.max, angle)
+        if self.valid > 5:
+            lo, hi = self.band()
+            mid, slack = (lo + hi) / 2, CYCLE_HYSTERESIS * (hi - lo)
+            if self._high_side and angle < mid - slack:
+                self._high_side = False
+            elif not self._high_side and angle > mid + slack:
+                self._high_side = True
+                self.cycles += 1
+
+    def band(self) -> Tuple[float, float]:
+        """(p10, p90) of the angles seen so far."""
+        return self.low.value(), self.high.value()
+
+    def score(self) -> float:
+        """Range of motion weighted by how often the side was visible."""
+        if self.valid <= 5:
+            return 0.0
+        lo, hi = self.band()
+        return (hi - lo) * self.valid / self.frames
+
+
+class Calibrator:
+    """Calibration of one (session, exercise): picks the side and thresholds for each frame."""
+
+    __slots__ = ("sides", "side", "thresholds", "min_count")
+
+    def __init__(self):
+        self.sides = (AngleSketch(), AngleSketch())
+        self.side = 0  # 0: left, 1: right
+        self.thresholds: Optional[Tuple[float, float]] = None  # None until calibrated
+        self.min_count = 0  # Cycles seen when calibration started
+
+    def update(self, left: float, right: float) -> Tuple[float, Optional[Tuple[float, float]], int, bool]:
+        """Observe both primary angles.
+
+        Returns (angle to count, (down, up) or None for the fixed thresholds,
+        reps to credit the counter with, whether the angle now comes from the
+        other side).
+        """
+        self.sides[0].add(left)
+        self.sides[1].add(right)
+        current, other = self.sides[self.side], self.sides[1 - self.side]
+        switched = other.score() > SIDE_SWITCH_RATIO * current.score()
+        if switched:
+            self.side = 1 - self.side
+            current = other
+
+        if current.cycles >= CALIBRATION_MIN_REPS:
+            lo, hi = current.band()
+            if hi - lo >= CALIBRATION_MIN_RANGE:
+                if self.thresholds is None:
+                    self.min_count = current.cycles
+                margin = CALIBRATION_MARGIN * (hi - lo)
+                self.thresholds = (lo + margin, hi - margin)
+        return (right if self.side else left), self.thresholds, self.min_count, switched
+
+
+class SessionCalibrations:
+    """Calibrators per session and exercise, LRU-bounded by SESSION_MAX sessions."""
+
+    def __init__(self, enabled: bool = CALIBRATION_ENABLED, max_sessions: int = SESSION_MAX):
+        self.enabled = enabled
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: "OrderedDict[str, Dict[str, Calibrator]]" = OrderedDict()
+        self._lock = threading.Lock()  # Requests update from several threads
+
+    def update(self, session_id: str, exercise: str, left: float,
+               right: float) -> Tuple[float, Optional[Tuple[float, float]], int, bool]:
+        with self._lock:
+            calibrators = self._sessions.get(session_id)
+            if calibrators is None:
+                calibrators = self._sessions[session_id] = {}
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            calibrator = calibrators.get(exercise)
+            if calibrator is None:
+                calibrator = calibrators[exercise] = Calibrator()
+        return calibrator.update(left, right)
+
+    def get(self, session_id: str, exercise: str) -> Optional[Calibrator]:
+        return self._sessions.get(session_id, {}).get(exercise)
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+calibrations = SessionCalibrations()
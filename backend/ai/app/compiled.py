@@ -0,0 +1,303 @@
+"""Array-backed tree ensembles with a pure-NumPy predict_proba.
+
+`compile_model` flattens a fitted scikit-learn forest or XGBoost classifier
+into contiguous node arrays (split feature, threshold, child indices,
+missing-value direction and leaf values). `CompiledEnsemble.predict_proba`
+then walks every tree for every row at once, one tree level per step,
+avoiding the per-call validation and DMatrix conversion of the original
+libraries.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Ensemble kinds: averaged per-tree class probabilities, or summed margins
+FOREST = "forest"
+SOFTMAX = "softmax"
+LOGISTIC = "logistic"
+
+ARRAY_FIELDS = ("feature", "threshold", "left", "right", "default_left", "value", "roots", "tree_class")
+
+# Batches with at most this many (row, node) pairs evaluate all splits up front
+DENSE_SPLIT_LIMIT = 1 << 16
+# One step of the level-by-level walk costs about as much as this many dense split evaluations
+WALK_STEP_COST = 4
+
+
+class CompiledEnsemble:
+    """Flattened tree ensemble.
+
+    Nodes of all trees live in the same arrays (indices are np.intp so they
+    can be used for fancy indexing without conversion); `roots` holds the
+    index of each tree's root. Leaves point to themselves, so traversal runs
+    a fixed `max_depth` steps without per-row branching.
+    """
+
+    def __init__(self, kind: str, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, default_left: np.ndarray, value: np.ndarray, roots: np.ndarray,
+                 tree_class: np.ndarray, n_classes: int, max_depth: int, base_margin: float = 0.0):
+        self.kind = kind
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.tree_class = tree_class
+        self.n_classes = int(n_classes)
+        self.max_depth = int(max_depth)
+        self.base_margin = float(base_margin)
+        # Maps each boosted tree's leaf value onto its class column
+        self._class_onehot = np.eye(self.n_classes)[tree_class] if kind != FOREST else None
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Return the (N, n_trees) leaf node index reached by every row in every tree."""
+        # Both libraries split on float32 feature values
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n = X.shape[0]
+        has_missing = bool(np.isnan(X).any())
+        
+        if n * self.n_nodes <= DENSE_SPLIT_LIMIT:
+            return self._apply_dense(X, has_missing)
+        if self.n_nodes <= DENSE_SPLIT_LIMIT and self.n_nodes < WALK_STEP_COST * self.n_trees * self.max_depth:
+            # Large batches: dense blocks still beat walking level by level, unless the trees are deep and few
+            block = DENSE_SPLIT_LIMIT // self.n_nodes
+            return np.concatenate([self._apply_dense(X[i:i + block], has_missing) for i in range(0, n, block)])
+        
+        node = np.broadcast_to(self.roots, (n, self.n_trees))
+        rows = np.arange(n)[:, None]
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = x <= self.threshold[node]
+            if has_missing:
+                go_left = np.where(np.isnan(x), self.default_left[node], go_left)
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+    
+    def _apply_dense(self, X: np.ndarray, has_missing: bool) -> np.ndarray:
+        """apply for small batches: evaluate every split once, then only follow child pointers."""
+        n = X.shape[0]
+        node = np.broadcast_to(self.roots, (n, self.n_trees))
+        x = X[:, self.feature]
+        go_left = x <= self.threshold
+        if has_missing:
+            go_left = np.where(np.isnan(x), self.default_left, go_left)
+        go_left = go_left.ravel()
+        offset = (np.arange(n) * self.n_nodes)[:, None]
+        for _ in range(self.max_depth):
+            node = np.where(go_left[offset + node], self.left[node], self.right[node])
+        return node
+    
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities, column order as in the source model's classes_."""
+        leaves = self.apply(X)
+        if self.kind == FOREST:
+            return self.value[leaves].mean(axis=1)
+        margin = self.value[leaves] @ self._class_onehot + self.base_margin
+        if self.kind == LOGISTIC:
+            p = 1.0 / (1.0 + np.exp(-margin[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        margin -= margin.max(axis=1, keepdims=True)
+        e = np.exp(margin)
+        return e / e.sum(axis=1, keepdims=True)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Node and tree arrays by name (see `from_arrays`)."""
+        return {name: getattr(self, name) for name in ARRAY_FIELDS}
+    
+    def params(self) -> Dict[str, object]:
+        """Scalar parameters (see `from_arrays`)."""
+        return {"kind": self.kind, "n_classes": self.n_classes, "max_depth": self.max_depth,
+                "base_margin": self.base_margin}
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], params: Dict[str, object]) -> "CompiledEnsemble":
+        return cls(params["kind"], *(arrays[name] for name in ARRAY_FIELDS),
+                   params["n_classes"], params["max_depth"], params["base_margin"])
+
+
+class HybridPredictor:
+    """A compiled ensemble for batches it scores in one dense block, its library model for larger ones.
+    
+    The compiled form has no per-call overhead and wins on single rows and
+    small batches; the libraries' own predictors win on large batches.
+    """
+    
+    def __init__(self, compiled: CompiledEnsemble, model):
+        self.compiled = compiled
+        self.model = model
+        self.max_rows = max(1, DENSE_SPLIT_LIMIT // compiled.n_nodes)
+    
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        if len(X) <= self.max_rows:
+            return self.compiled.predict_proba(X)
+        return self.model.predict_proba(X)
+
+
+class _Builder:
+    """Accumulates per-tree node arrays and re-bases child indices into one flat layout."""
+
+    def __init__(self):
+        self.parts: Dict[str, List[np.ndarray]] = {
+            k: [] for k in ("feature", "threshold", "left", "right", "default_left", "value")
+        }
+        self.roots: List[int] = []
+        self.offset = 0
+        self.max_depth = 0
+
+    def add_tree(self, feature, threshold, left, right, default_left, value, depth: int):
+        n = len(feature)
+        is_leaf = left < 0
+        own = np.arange(n) + self.offset
+        self.parts["feature"].append(np.where(is_leaf, 0, feature).astype(np.intp))
+        self.parts["threshold"].append(np.where(is_leaf, 0.0, threshold).astype(np.float64))
+        self.parts["left"].append(np.where(is_leaf, own, left + self.offset).astype(np.intp))
+        self.parts["right"].append(np.where(is_leaf, own, right + self.offset).astype(np.intp))
+        self.parts["default_left"].append(np.asarray(default_left, dtype=bool))
+        self.parts["value"].append(np.asarray(value, dtype=np.float64))
+        self.roots.append(self.offset)
+        self.offset += n
+        self.max_depth = max(self.max_depth, depth)
+
+    def build(self, kind: str, tree_class, n_classes: int, base_margin: float = 0.0) -> CompiledEnsemble:
+        cat = {k: np.concatenate(v) for k, v in self.parts.items()}
+        return CompiledEnsemble(
+            kind, cat["feature"], cat["threshold"], cat["left"], cat["right"], cat["default_left"],
+            cat["value"], np.array(self.roots, dtype=np.intp), np.asarray(tree_class, dtype=np.intp),
+            n_classes, self.max_depth, base_margin,
+        )
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth, frontier = 0, [0]
+    while True:
+        frontier = [c for n in frontier for c in (left[n], right[n]) if c >= 0]
+        if not frontier:
+            return depth
+        depth += 1
+
+
+def _compile_forest(model) -> CompiledEnsemble:
+    builder = _Builder()
+    for est in model.estimators_:
+        tree = est.tree_
+        counts = tree.value[:, 0, :]
+        totals = counts.sum(axis=1, keepdims=True)
+        totals[totals == 0.0] = 1.0
+        default_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=bool))
+        builder.add_tree(tree.feature, tree.threshold, tree.children_left, tree.children_right,
+                         default_left, counts / totals, tree.max_depth)
+    return builder.build(FOREST, np.zeros(0, dtype=np.intp), len(model.classes_))
+
+
+def _compile_xgboost(model) -> CompiledEnsemble:
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    objective = learner["objective"]["name"]
+    gbtree = learner["gradient_booster"]
+    if gbtree["name"] != "gbtree":
+        raise ValueError(f"Unsupported booster: {gbtree['name']}")
+    trees = gbtree["model"]["trees"]
+    tree_info = gbtree["model"]["tree_info"]
+    # Honour early stopping the same way XGBClassifier.predict_proba does
+    best_iteration = getattr(model, "best_iteration", None)
+    if best_iteration is not None:
+        n_used = gbtree["model"]["iteration_indptr"][best_iteration + 1]
+        trees, tree_info = trees[:n_used], tree_info[:n_used]
+    base_score = float(learner["learner_model_param"]["base_score"])
+
+    builder = _Builder()
+    for tree in trees:
+        if any(tree["split_type"]):
+            raise ValueError("Categorical splits are not supported")
+        left = np.array(tree["left_children"])
+        right = np.array(tree["right_children"])
+        split = np.array(tree["split_conditions"], dtype=np.float32)
+        # XGBoost goes left on x < split; x is a float32 value, so that equals x <= previous float32
+        threshold = np.nextafter(split, np.float32(-np.inf))
+        builder.add_tree(tree["split_indices"], threshold, left, right, tree["default_left"],
+                         split, _tree_depth(left, right))
+
+    if objective in ("multi:softprob", "multi:softmax"):
+        return builder.build(SOFTMAX, tree_info, int(learner["learner_model_param"]["num_class"]), base_score)
+    if objective == "binary:logistic":
+        return builder.build(LOGISTIC, tree_info, 1, float(np.log(base_score / (1.0 - base_score))))
+    raise ValueError(f"Unsupported objective: {objective}")
+
+
+def compile_model(model) -> CompiledEnsemble:
+    """Flatten a fitted forest or XGBoost classifier into a CompiledEnsemble."""
+    if hasattr(model, "get_booster"):
+        return _compile_xgboost(model)
+    if hasattr(model, "estimators_") and all(hasattr(est, "tree_") for est in model.estimators_):
+        return _compile_forest(model)
+    raise ValueError(f"Cannot compile model of type {type(model).__name__}")
+
+
+def probe_inputs(compiled: CompiledEnsemble, n_features: int, n: int = 512, seed: int = 0) -> np.ndarray:
+    """Rows scattered around the ensemble's own split thresholds, so both sides of splits get exercised."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(0.0, 1.0, (n, n_features))
+    is_split = compiled.left != np.arange(compiled.n_nodes)
+    for f in range(n_features):
+        thresholds = compiled.threshold[is_split & (compiled.feature == f)]
+        if len(thresholds):
+            spread = max(float(np.ptp(thresholds)), 1e-3)
+            X[:, f] = rng.choice(thresholds, n) + X[:, f] * spread * 0.05
+    return X
+
+
+def parity_error(model, compiled: CompiledEnsemble, n_features: int) -> float:
+    """Max absolute probability difference between the library model and its compiled form."""
+    X = probe_inputs(compiled, n_features)
+    return float(np.abs(model.predict_proba(X) - compiled.predict_proba(X)).max())
+
+
+def file_sha256(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def save_artifact(directory: Path, compiled: CompiledEnsemble, classes: Sequence[str],
+                  feature_cols: Sequence[str], source: Path, parity: float):
+    """Write a startup-optimized model bundle: one .npy per array plus manifest.json.
+
+    The manifest records the source pickle's hash so a stale bundle can be
+    detected after the model is retrained.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in compiled.arrays().items():
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+    manifest = {
+        **compiled.params(),
+        "classes": [str(c) for c in classes],
+        "feature_columns": list(feature_cols),
+        "source": Path(source).name,
+        "source_sha256": file_sha256(source),
+        "parity_error": parity,
+    }
+    with open(directory / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_artifact(directory: Path) -> Tuple[CompiledEnsemble, dict]:
+    """Map a bundle written by save_artifact without copying the arrays."""
+    directory = Path(directory)
+    with open(directory / "manifest.json") as f:
+        manifest = json.load(f)
+    # np.asarray drops the memmap subclass (cheaper indexing) but keeps the mapping
+    arrays = {name: np.asarray(np.load(directory / f"{name}.npy", mmap_mode="r")) for name in ARRAY_FIELDS}
+    return CompiledEnsemble.from_arrays(arrays, manifest), manifest
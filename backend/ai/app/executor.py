@@ -0,0 +1,199 @@
+"""Process-pool inference executor with one shared copy of the model.
+
+With INFERENCE_PROCESSES=N > 0, predict_proba runs in N worker processes
+instead of under the serving process's GIL. The active model is exported
+once, as compiled node arrays (see app.compiled), to INFERENCE_SHM_DIR (a
+tmpfs), and every worker memory-maps those read-only pages: the model is
+held once per host however many processes score with it. Feature
+extraction, windows, caches and rep counters stay in the serving process;
+only float32 feature matrices and class probabilities cross the process
+boundary, and a batch is split across the processes in chunks of at least
+INFERENCE_MIN_CHUNK rows.
+
+This replaces `--workers N`: run one serving worker with
+INFERENCE_PROCESSES set to the cores to use. Models that cannot be compiled,
+and batches the pool fails on, are predicted in the serving process, on the
+thread pool rather than the event loop.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from .compiled import CompiledEnsemble, load_artifact
+
+logger = logging.getLogger(__name__)
+
+# 0 predicts in the serving process
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", "0"))
+INFERENCE_SHM_DIR = Path(os.environ.get("INFERENCE_SHM_DIR", "/dev/shm" if os.path.isdir("/dev/shm")
+                                        else tempfile.gettempdir()))
+INFERENCE_MIN_CHUNK = int(os.environ.get("INFERENCE_MIN_CHUNK", "32"))
+
+# Exported models kept (and mapped per worker): the active one and the one it replaced
+KEEP_BUNDLES = 2
+
+# Worker side: bundle directory -> mapped model
+_bundles: "OrderedDict[str, CompiledEnsemble]" = OrderedDict()
+
+
+def _attach(directory: str) -> CompiledEnsemble:
+    ensemble = _bundles.get(directory)
+    if ensemble is None:
+        ensemble = _bundles[directory] = load_artifact(Path(directory))[0]
+        while len(_bundles) > KEEP_BUNDLES:
+            _bundles.popitem(last=False)
+    else:
+        _bundles.move_to_end(directory)
+    return ensemble
+
+
+def _predict_proba(directory: str, X: np.ndarray) -> np.ndarray:
+    return _attach(directory).predict_proba(X)
+
+
+def _warm(directory: str) -> int:
+    _attach(directory)
+    return os.getpid()
+
+
+class InferenceExecutor:
+    """Pool of scoring processes; model versions are published to it by key."""
+
+    def __init__(self, processes: int = INFERENCE_PROCESSES, shm_dir: Path = INFERENCE_SHM_DIR,
+                 min_chunk: int = INFERENCE_MIN_CHUNK):
+        self.processes = processes
+        self.shm_dir = Path(shm_dir)
+        self.min_chunk = max(1, min_chunk)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._published: "OrderedDict[str, str]" = OrderedDict()  # version -> bundle directory
+        self.batches = 0
+        self.rows = 0
+        self.fallbacks = 0
+        # Also on exit without a clean shutdown: bundles in a tmpfs outlive the process
+        atexit.register(self._remove_bundles)
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None
+
+    def serves(self, version) -> bool:
+        """Whether `version` is published to a running pool (otherwise it is predicted in-process)."""
+        return self._pool is not None and version is not None and version.version in self._published
+
+    def start(self):
+        if self._pool is None and self.processes > 0:
+            # spawn: workers import NumPy and app.compiled only, none of the serving process's state
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Inference executor: {self.processes} processes, models shared through {self.shm_dir}")
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self._remove_bundles()
+
+    def _remove_bundles(self):
+        for directory in self._published.values():
+            shutil.rmtree(directory, ignore_errors=True)
+        self._published.clear()
+
+    def publish(self, version: str, ensemble: CompiledEnsemble) -> str:
+        """Export `ensemble` for the workers (once per version key); returns its bundle directory."""
+        directory = self._published.get(version)
+        if directory is None:
+            name = f"olympose-{os.getpid()}-{re.sub(r'[^A-Za-z0-9_.-]', '_', version)}"
+            # Written aside and renamed, so a worker never maps a partial bundle
+            staging = Path(tempfile.mkdtemp(prefix=f"{name}.", dir=self.shm_dir))
+            for field, array in ensemble.arrays().items():
+                np.save(staging / f"{field}.npy", np.ascontiguousarray(array))
+            (staging / "manifest.json").write_text(json.dumps(ensemble.params()))
+            directory = str(self.shm_dir / name)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.rename(staging, directory)
+            self._published[version] = directory
+            while len(self._published) > KEEP_BUNDLES:
+                # Workers keep the mapping of removed files until they drop the bundle
+                shutil.rmtree(self._published.popitem(last=False)[1], ignore_errors=True)
+            logger.info(f"Published model {version} for the inference executor ({directory})")
+        self._published.move_to_end(version)
+        if self._pool is not None:
+            for _ in range(self.processes):
+                self._pool.submit(_warm, directory)
+        return directory
+
+    def _chunks(self, X: np.ndarray):
+        # float32: the trees compare float32 feature values anyway (CompiledEnsemble.apply)
+        X = np.asarray(X, dtype=np.float32)
+        return np.array_split(X, max(1, min(self.processes, len(X) // self.min_chunk)))
+
+    def _failed(self, version, error: Optional[Exception]):
+        """Count a batch the pool did not score; restart the pool if it broke."""
+        self.fallbacks += 1
+        if isinstance(error, BrokenProcessPool):
+            logger.error("Inference executor pool broke, restarting it")
+            pool, self._pool = self._pool, None
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            self.start()
+        elif error is not None:
+            logger.warning(f"Inference executor failed on {version.version}: {type(error).__name__}: {error}")
+
+    def predict_proba(self, version, X: np.ndarray) -> np.ndarray:
+        """`version.predictor.predict_proba(X)` computed by the pool, blocking the calling thread."""
+        directory = self._published.get(version.version)
+        if self._pool is None or directory is None:
+            self._failed(version, None)
+            return version.predictor.predict_proba(X)
+        try:
+            futures = [self._pool.submit(_predict_proba, directory, part) for part in self._chunks(X)]
+            probs = np.concatenate([future.result() for future in futures])
+        except Exception as e:
+            self._failed(version, e)
+            return version.predictor.predict_proba(X)
+        self.batches += 1
+        self.rows += len(X)
+        return probs
+
+    async def predict_proba_async(self, version, X: np.ndarray) -> np.ndarray:
+        """`predict_proba` awaited without holding a thread; in-process fallbacks run on the thread pool."""
+        directory = self._published.get(version.version)
+        if self._pool is None or directory is None:
+            self._failed(version, None)
+            return await asyncio.to_thread(version.predictor.predict_proba, X)
+        try:
+            parts = await asyncio.gather(*(asyncio.wrap_future(self._pool.submit(_predict_proba, directory, part))
+                                           for part in self._chunks(X)))
+        except Exception as e:
+            self._failed(version, e)
+            return await asyncio.to_thread(version.predictor.predict_proba, X)
+        self.batches += 1
+        self.rows += len(X)
+        return np.concatenate(parts)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "processes": self.processes if self.enabled else 0,
+            "min_chunk": self.min_chunk,
+            "published": list(self._published),
+            "batches": self.batches,
+            "rows": self.rows,
+            "fallbacks": self.fallbacks,
+        }
+
+
+executor = InferenceExecutor()
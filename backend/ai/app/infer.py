@@ -1,30 +1,366 @@
 """Model loading and inference."""
 
+import asyncio
+import functools
 import json
+import math
 import os
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-import joblib
 import numpy as np
 
+from . import metrics
+from .cache import inference_cache
+from .calibration import calibrations
+from .compiled import CompiledEnsemble, HybridPredictor, compile_model, file_sha256, load_artifact, parity_error
+from .executor import executor
+from .registry import ModelRegistry, ModelValidationError
 from .schemas import Landmark
-from .preprocess import extract_features, get_primary_angle, features_to_vector
-from .rep_counter import sessions
+from .preprocess import (
+    compute_features, feature_column_index, features_to_matrix, get_primary_angle, get_primary_angles,
+    landmarks_to_array, primary_angle,
+)
+from .rep_counter import SESSION_MAX, sessions
+from .windows import FEATURE_STD_DDOF, FEATURE_WINDOW, windows
 
 MODELS_DIR = Path(os.environ.get("MODELS_DIR", Path(__file__).parent.parent / "models"))
 
+# Precompiled model bundle written by `scripts/regenerate_models.py --compile`
+COMPILED_MODEL_DIR = Path(os.environ.get("COMPILED_MODEL_DIR", MODELS_DIR / "compiled"))
+
+# Inference backend:
+#   "auto"     - unpickle the model; score small batches with its compiled form (the bundle if it matches,
+#                else compiled at load) and batches past one dense block with the model's own predict_proba
+#   "compiled" - memory-map the compiled bundle if present (no unpickling), else compile the unpickled
+#                model; every batch size is scored compiled
+#   "library"  - always unpickle and call the model's own predict_proba
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "auto")
+# Largest probability difference tolerated between a compiled model and its source
+COMPILED_PARITY_TOL = 1e-5
+
+# Variants written by scripts/prune_models.py; with a budget, serve the most accurate one whose
+# single-row predict_proba latency fits it (0: serve MODELS_DIR)
+MODEL_VARIANTS_DIR = Path(os.environ.get("MODEL_VARIANTS_DIR", MODELS_DIR / "variants"))
+LATENCY_BUDGET_MS = float(os.environ.get("LATENCY_BUDGET_MS", "0"))
+
+# Reps-only mode (/analyze_reps): run the classifier for confidence on every Nth frame of a session (0: never)
+REPS_CONFIDENCE_EVERY = int(os.environ.get("REPS_CONFIDENCE_EVERY", "10"))
+
+# One frame to classify: (33, 3) [x, y, visibility] landmarks, session id, selected exercise
+Frame = Tuple[np.ndarray, str, Optional[str]]
+
+# Striped locks that keep concurrent predict_batch calls of one session from interleaving
+ORDER_STRIPES = 64
+
+
+def track_session_id(session_id: str, track_id: str) -> str:
+    """Sub-session of one tracked person in a multi-person (/analyze_people) session."""
+    return f"{session_id}#{track_id}"
+
+
+class TrackIndex:
+    """Track ids seen per multi-person session, so a session-level reset can clear their sub-sessions.
+    
+    Per worker process and LRU-bounded by SESSION_MAX sessions, like the stores it indexes.
+    """
+    
+    def __init__(self, max_sessions: int = SESSION_MAX):
+        self.max_sessions = max(1, max_sessions)
+        self._tracks: "OrderedDict[str, set]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def add(self, session_id: str, track_ids: Iterable[str]):
+        with self._lock:
+            known = self._tracks.get(session_id)
+            if known is None:
+                known = self._tracks[session_id] = set()
+                while len(self._tracks) > self.max_sessions:
+                    self._tracks.popitem(last=False)
+            else:
+                self._tracks.move_to_end(session_id)
+            known.update(track_ids)
+    
+    def add_sub_sessions(self, session_ids: Iterable[str]):
+        """Index existing `track_session_id` sub-sessions, e.g. restored from the session journal."""
+        for session_id in session_ids:
+            if "#" in session_id:
+                group, track_id = session_id.split("#", 1)
+                self.add(group, (track_id,))
+    
+    def discard(self, session_id: str, track_id: str):
+        with self._lock:
+            known = self._tracks.get(session_id)
+            if known is not None:
+                known.discard(track_id)
+                if not known:
+                    del self._tracks[session_id]
+    
+    def pop(self, session_id: str) -> List[str]:
+        """The session's known track ids, forgetting them."""
+        with self._lock:
+            return sorted(self._tracks.pop(session_id, ()))
+    
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+
+tracks = TrackIndex()
+
+
+class ModelVersion:
+    """One loaded model and everything needed to serve it; not modified after loading."""
+    
+    def __init__(self, predictor, backend: str, classes, feature_cols: Sequence[str], meta: dict,
+                 source: Path, sha256: str, model=None, label_encoder=None):
+        self.predictor = predictor
+        self.backend = backend
+        self.model = model
+        self.label_encoder = label_encoder
+        self.classes = np.asarray(classes)
+        self.class_index = {c: i for i, c in enumerate(self.classes)}
+        self.feature_cols: List[str] = list(feature_cols)
+        self.col_index = feature_column_index(self.feature_cols)
+        self.meta = meta
+        self.window_size = int(meta.get("window_size", FEATURE_WINDOW))
+        self.ddof = int(meta.get("std_ddof", FEATURE_STD_DDOF))
+        self.source = source
+        self.version = f"{source.name}@{sha256[:12]}"
+        self.loaded_at = time.time()
+    
+    def describe(self) -> Dict[str, object]:
+        return {
+            "version": self.version,
+            "source": str(self.source),
+            "backend": self.backend,
+            "classes": [str(c) for c in self.classes],
+            "features": len(self.feature_cols),
+            "window_size": self.window_size,
+            "loaded_at": self.loaded_at,
+        }
+    
+    def resolve(self, probs: np.ndarray, exercise: Optional[str]) -> Tuple[str, float]:
+        # If user selected an exercise, use that and get its confidence
+        if exercise:
+            exercise_idx = self.class_index.get(exercise)
+            if exercise_idx is not None:
+                return exercise, float(probs[exercise_idx])
+            # Fallback: use max confidence if exercise not in model classes
+            return exercise, float(np.max(probs))
+        # Auto-detect mode: use predicted exercise
+        idx = int(np.argmax(probs))
+        return str(self.classes[idx]), float(probs[idx])
+    
+    def resolve_batch(self, probs: np.ndarray, exercise: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """resolve for many frames sharing one exercise selection: (targets, confidences)."""
+        exercise_idx = self.class_index.get(exercise) if exercise else None
+        if exercise_idx is not None:
+            return np.full(len(probs), exercise, dtype=object), probs[:, exercise_idx]
+        if exercise:
+            return np.full(len(probs), exercise, dtype=object), probs.max(axis=1)
+        idx = probs.argmax(axis=1)
+        return self.classes[idx].astype(str).astype(object), probs[np.arange(len(probs)), idx]
+
+
+def select_variant(variants_dir: Path, budget_ms: float, logger) -> Optional[Path]:
+    """Directory of the variant to serve under budget_ms, from variants_dir/manifest.json; None to serve MODELS_DIR."""
+    manifest_path = variants_dir / "manifest.json"
+    if budget_ms <= 0 or not manifest_path.exists():
+        return None
+    variants = json.loads(manifest_path.read_text()).get("variants", [])
+    if not variants:
+        return None
+    
+    fitting = [v for v in variants if v["latency_ms"]["single"] <= budget_ms]
+    if fitting:
+        chosen = max(fitting, key=lambda v: (v["accuracy"], -v["latency_ms"]["single"]))
+    else:
+        chosen = min(variants, key=lambda v: v["latency_ms"]["single"])
+        logger.warning(f"No model variant fits LATENCY_BUDGET_MS={budget_ms}, using the fastest")
+    logger.info(f"Model variant {chosen['name']}: accuracy {chosen['accuracy']:.3f}, "
+                f"{chosen['latency_ms']['single']:.3f} ms per row (budget {budget_ms} ms)")
+    return variants_dir / chosen["directory"]
+
+
+def load_version(models_dir: Path, compiled_dir: Path, logger) -> ModelVersion:
+    """Load the model in `models_dir` (or its compiled bundle in `compiled_dir`), per MODEL_BACKEND."""
+    # Bundle only: no unpickling and no xgboost/sklearn import
+    if MODEL_BACKEND == "compiled":
+        version = _load_artifact(models_dir, compiled_dir, logger)
+        if version is not None:
+            return version
+    
+    # Load feature metadata
+    metadata_path = models_dir / "feature_metadata.json"
+    if not metadata_path.exists():
+        raise FileNotFoundError(f"Feature metadata not found: {metadata_path}")
+    
+    with open(metadata_path) as f:
+        meta = json.load(f)
+    feature_cols = meta.get("enhanced_feature_columns", [])
+    logger.info(f"Loaded feature metadata with {len(feature_cols)} features")
+    
+    # Load label encoder
+    encoder_path = models_dir / "label_encoder.pkl"
+    if not encoder_path.exists():
+        raise FileNotFoundError(f"Label encoder not found: {encoder_path}")
+    
+    # Deferred import: only the pickle path needs joblib (and through it sklearn/xgboost)
+    import joblib
+    
+    try:
+        label_encoder = joblib.load(encoder_path)
+        logger.info(f"Successfully loaded label encoder with classes: {list(label_encoder.classes_)}")
+    except Exception as e:
+        logger.error(f"Failed to load label encoder: {e}")
+        raise RuntimeError(f"Cannot load label encoder: {e}") from e
+    
+    # Load model (try in priority order)
+    model = path = None
+    for name in ["xgb_enhanced.pkl", "rf_enhanced.pkl", "rf_baseline.pkl"]:
+        path = models_dir / name
+        if not path.exists():
+            logger.debug(f"Model file not found: {name}, skipping...")
+            continue
+        
+        try:
+            model = joblib.load(path)
+            logger.info(f"Successfully loaded model: {name} (type: {type(model).__name__})")
+            break
+        except Exception as e:
+            logger.warning(f"Failed to load {name}: {e}, trying next model...")
+            model = None
+            continue
+    
+    if model is None:
+        raise RuntimeError("No model files could be loaded. Check model files exist and are compatible.")
+    
+    sha256 = file_sha256(path)
+    predictor, backend = _build_predictor(model, feature_cols, _read_bundle(compiled_dir, path, sha256, logger),
+                                          logger)
+    return ModelVersion(predictor, backend, label_encoder.classes_, feature_cols, meta, path, sha256,
+                        model=model, label_encoder=label_encoder)
+
+
+def _read_bundle(compiled_dir: Path, source: Path, sha256: str, logger) -> Optional[CompiledEnsemble]:
+    """The compiled bundle in compiled_dir if it was exported from `source` at this hash, else None."""
+    if MODEL_BACKEND == "library" or not (compiled_dir / "manifest.json").exists():
+        return None
+    try:
+        compiled, manifest = load_artifact(compiled_dir)
+    except Exception as e:
+        logger.warning(f"Cannot load compiled model bundle: {e}")
+        return None
+    if manifest["source"] != source.name or manifest["source_sha256"] != sha256:
+        logger.warning(f"Compiled model bundle is stale ({source.name} changed), compiling at load")
+        return None
+    return compiled
+
+
+def _load_artifact(models_dir: Path, compiled_dir: Path, logger) -> Optional[ModelVersion]:
+    """Map the compiled bundle in compiled_dir; None if absent, unreadable or stale."""
+    if not (compiled_dir / "manifest.json").exists():
+        return None
+    try:
+        compiled, manifest = load_artifact(compiled_dir)
+    except Exception as e:
+        logger.warning(f"Cannot load compiled model bundle: {e}, falling back to pickled models")
+        return None
+    
+    source = models_dir / manifest["source"]
+    if source.exists() and file_sha256(source) != manifest["source_sha256"]:
+        logger.warning(f"Compiled model bundle is stale ({source.name} changed), falling back to pickled models")
+        return None
+    
+    # The bundle carries columns only; the window size still comes from the training metadata
+    metadata_path = models_dir / "feature_metadata.json"
+    meta = json.loads(metadata_path.read_text()) if metadata_path.exists() else {}
+    logger.info(f"Loaded compiled model bundle for {source.name} ({compiled.n_trees} trees, {compiled.n_nodes} nodes)")
+    return ModelVersion(compiled, "compiled", manifest["classes"], manifest["feature_columns"], meta,
+                        source, manifest["source_sha256"])
+
+
+def _build_predictor(model, feature_cols: Sequence[str], bundle: Optional[CompiledEnsemble], logger):
+    """Return (object whose predict_proba serves requests, backend name), per MODEL_BACKEND.
+    
+    `bundle` is the model's exported compiled form, if any; it is used
+    instead of compiling the model again.
+    """
+    if MODEL_BACKEND not in ("auto", "compiled"):
+        if MODEL_BACKEND != "library":
+            logger.warning(f"Unknown MODEL_BACKEND '{MODEL_BACKEND}', using library backend")
+        return model, "library"
+    
+    compiled = bundle
+    if compiled is None:
+        try:
+            compiled = compile_model(model)
+            n_features = getattr(model, "n_features_in_", len(feature_cols))
+            error = parity_error(model, compiled, n_features)
+        except Exception as e:
+            logger.warning(f"Cannot compile {type(model).__name__}: {e}, using library backend")
+            return model, "library"
+        
+        if error > COMPILED_PARITY_TOL:
+            logger.warning(f"Compiled model differs from source by {error:.2e}, using library backend")
+            return model, "library"
+        logger.info(f"Compiled model: {compiled.n_trees} trees, {compiled.n_nodes} nodes, parity error {error:.1e}")
+    
+    if MODEL_BACKEND == "compiled":
+        return compiled, "compiled"
+    hybrid = HybridPredictor(compiled, model)
+    logger.info(f"Using auto backend: compiled model up to {hybrid.max_rows} rows per call, library model above")
+    return hybrid, "auto"
+
+
+def validate_version(version: ModelVersion, n_probe: int = 64):
+    """Raise ModelValidationError unless the version agrees with its metadata and encoder and predicts sanely."""
+    unknown = [col for col, i in zip(version.feature_cols, version.col_index) if i < 0]
+    if not version.feature_cols or unknown:
+        raise ModelValidationError(f"Feature columns missing or unknown: {unknown or version.feature_cols}")
+    meta_cols = version.meta.get("enhanced_feature_columns")
+    if meta_cols is not None and list(meta_cols) != version.feature_cols:
+        raise ModelValidationError("Model feature columns differ from feature_metadata.json")
+    n_features = getattr(version.model, "n_features_in_", len(version.feature_cols))
+    if n_features != len(version.feature_cols):
+        raise ModelValidationError(f"Model expects {n_features} features, metadata lists {len(version.feature_cols)}")
+    n_classes = len(getattr(version.model, "classes_", version.classes))
+    if n_classes != len(version.classes):
+        raise ModelValidationError(f"Model has {n_classes} classes, label encoder has {len(version.classes)}")
+    
+    # Plausible inputs: angles in degrees, ratios around 1, small standard deviations
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0.0, 180.0, (n_probe, len(version.feature_cols)))
+    X[0] = 0.0
+    try:
+        probs = np.asarray(version.predictor.predict_proba(X))
+    except Exception as e:
+        raise ModelValidationError(f"predict_proba failed: {e}") from e
+    if probs.shape != (n_probe, len(version.classes)):
+        raise ModelValidationError(f"predict_proba returned shape {probs.shape}, expected {(n_probe, len(version.classes))}")
+    if not np.isfinite(probs).all() or np.abs(probs.sum(axis=1) - 1.0).max() > 1e-3:
+        raise ModelValidationError("predict_proba returned rows that are not probability distributions")
+
 
 class Classifier:
     def __init__(self):
-        self.model = None
-        self.label_encoder = None
-        self.feature_cols: List[str] = []
-        self._loaded = False
+        self.models = ModelRegistry(self._load_candidate, self._on_activate)
+        self.reps_confidence_every = REPS_CONFIDENCE_EVERY
+        # Reps-only sessions: session id -> [frames since confidence was computed, confidence]
+        self._reps_confidence: "OrderedDict[str, list]" = OrderedDict()
+        self._reps_lock = threading.Lock()  # Sampled frames run count_reps on worker threads
+        # A batch's sessions stay claimed from the window push to the rep count, so a later batch of the
+        # same session cannot push its windows in between and then count its reps first:
+        # threads in predict_batch hold lock stripes, coroutines in predict_batch_async chain futures
+        self._order = [threading.Lock() for _ in range(ORDER_STRIPES)]
+        self._tails: Dict[str, asyncio.Future] = {}  # Session -> done when its latest async batch is
     
     def load(self):
         """Load models with proper error handling and logging."""
-        if self._loaded:
+        if self.models.active is not None:
             return
         
         import logging
@@ -32,57 +368,8 @@ class Classifier:
         
         try:
             logger.info("Starting model loading process...")
-            
-            # Load feature metadata
-            metadata_path = MODELS_DIR / "feature_metadata.json"
-            if not metadata_path.exists():
-                raise FileNotFoundError(f"Feature metadata not found: {metadata_path}")
-            
-            with open(metadata_path) as f:
-                meta = json.load(f)
-            self.feature_cols = meta.get("enhanced_feature_columns", [])
-            logger.info(f"Loaded feature metadata with {len(self.feature_cols)} features")
-            
-            # Load label encoder
-            encoder_path = MODELS_DIR / "label_encoder.pkl"
-            if not encoder_path.exists():
-                raise FileNotFoundError(f"Label encoder not found: {encoder_path}")
-            
-            try:
-                self.label_encoder = joblib.load(encoder_path)
-                logger.info(f"Successfully loaded label encoder with classes: {list(self.label_encoder.classes_)}")
-            except Exception as e:
-                logger.error(f"Failed to load label encoder: {e}")
-                raise RuntimeError(f"Cannot load label encoder: {e}") from e
-            
-            # Load model (try in priority order)
-            model_loaded = False
-            for name in ["xgb_enhanced.pkl", "rf_enhanced.pkl", "rf_baseline.pkl"]:
-                path = MODELS_DIR / name
-                if not path.exists():
-                    logger.debug(f"Model file not found: {name}, skipping...")
-                    continue
-                
-                try:
-                    self.model = joblib.load(path)
-                    logger.info(f"Successfully loaded model: {name} (type: {type(self.model).__name__})")
-                    model_loaded = True
-                    break
-                except Exception as e:
-                    logger.warning(f"Failed to load {name}: {e}, trying next model...")
-                    continue
-            
-            if not model_loaded:
-                raise RuntimeError("No model files could be loaded. Check model files exist and are compatible.")
-            
-            # Verify model and encoder are compatible
-            if hasattr(self.model, 'classes_'):
-                model_classes = set(self.model.classes_)
-                encoder_classes = set(self.label_encoder.classes_)
-                if model_classes != encoder_classes:
-                    logger.warning(f"Model classes {model_classes} don't match encoder classes {encoder_classes}")
-            
-            self._loaded = True
+            version = self._load_candidate(self.serving_dir())
+            self.models.activate(version)
             logger.info("✓ All models loaded successfully!")
             
         except Exception as e:
@@ -94,45 +381,285 @@ class Classifier:
             import traceback
             logger.error(f"Traceback:\n{traceback.format_exc()}")
             logger.error("=" * 60)
-            self._loaded = False
             # Don't raise - allow service to start without models
     
+    def serving_dir(self) -> Path:
+        """MODELS_DIR, or the variant selected for LATENCY_BUDGET_MS."""
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        try:
+            return select_variant(MODEL_VARIANTS_DIR, LATENCY_BUDGET_MS, logger) or MODELS_DIR
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cannot read model variants manifest: {e}, using MODELS_DIR")
+            return MODELS_DIR
+    
+    def _load_candidate(self, path: Path) -> ModelVersion:
+        """Registry loader: a validated version from a directory laid out like MODELS_DIR."""
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        path = Path(path)
+        compiled_dir = COMPILED_MODEL_DIR if path == MODELS_DIR else path / "compiled"
+        version = load_version(path, compiled_dir, logger)
+        validate_version(version)
+        return version
+    
+    def _on_activate(self, version: ModelVersion):
+        """Size the per-session feature windows like the training windows; drop stale cached probabilities.
+        
+        With the inference executor running, also publish the version to its processes.
+        """
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        windows.configure(version.window_size, version.ddof)
+        if "window_size" in version.meta:
+            logger.info(f"Feature window: {version.window_size} frames (from feature metadata), std ddof={version.ddof}")
+        else:
+            logger.warning(f"{version.source.parent / 'feature_metadata.json'} records no window_size: assuming "
+                           f"FEATURE_WINDOW={version.window_size} frames, std ddof={version.ddof}. Set both to the "
+                           "training windows or the _mean/_std features will not match what the model learned.")
+        inference_cache.configure(version.feature_cols)
+        if executor.enabled:
+            self._publish(version, logger)
+    
+    def _publish(self, version: ModelVersion, logger):
+        """Share the version with the inference executor, compiling a library model first."""
+        ensemble = version.predictor
+        if isinstance(ensemble, HybridPredictor):
+            ensemble = ensemble.compiled
+        elif not isinstance(ensemble, CompiledEnsemble):
+            try:
+                ensemble = compile_model(version.model)
+                n_features = getattr(version.model, "n_features_in_", len(version.feature_cols))
+                error = parity_error(version.model, ensemble, n_features)
+            except Exception as e:
+                logger.warning(f"Cannot compile {version.version} for the inference executor ({e}), "
+                               "predicting in this process")
+                return
+            if error > COMPILED_PARITY_TOL:
+                logger.warning(f"Compiled {version.version} differs from source by {error:.2e}, predicting in this process")
+                return
+        executor.publish(version.version, ensemble)
+    
+    @property
+    def active(self) -> ModelVersion:
+        version = self.models.active
+        if version is None:
+            raise RuntimeError("Model not loaded")
+        return version
+    
+    # Attributes of the active version
+    
+    @property
+    def model(self):
+        return self.active.model
+    
+    @property
+    def predictor(self):
+        return self.active.predictor
+    
+    @property
+    def backend(self) -> str:
+        return self.active.backend
+    
+    @property
+    def classes(self) -> np.ndarray:
+        return self.active.classes
+    
+    @property
+    def feature_cols(self) -> List[str]:
+        return self.active.feature_cols
+    
     @property
     def is_loaded(self) -> bool:
-        return self._loaded
+        return self.models.active is not None
     
     def predict(self, landmarks: List[Landmark], session_id: str, exercise: Optional[str] = None) -> Tuple[str, float, int]:
-        if not self._loaded or self.model is None or self.label_encoder is None:
-            raise RuntimeError("Model not loaded")
+        return self.predict_batch([(landmarks_to_array(landmarks), session_id, exercise)])[0]
+    
+    def predict_batch(self, frames: Sequence[Frame]) -> List[Tuple[str, float, int]]:
+        """Classify many frames with a single predict_proba call.
         
-        feats = extract_features(landmarks)
-        X = np.array([features_to_vector(feats, self.feature_cols)])
+        Rep counters are fed in list order, so frames of the same session
+        must be passed oldest first.
+        """
+        # One version for the whole batch, even if another is activated meanwhile
+        version = self.active
+        if not frames:
+            return []
         
-        probs = self.model.predict_proba(X)[0]
-        classes = self.label_encoder.classes_
+        # Sorted, so two batches always take shared stripes in the same order
+        stripes = sorted({hash(session_id) % ORDER_STRIPES for _, session_id, _ in frames})
+        for i in stripes:
+            self._order[i].acquire()
+        try:
+            feats, stats = self._prepare(frames)
+            with metrics.stage("predict_proba"):
+                X = features_to_matrix(stats, version.col_index)
+                shadow = self.models.shadow_sample()
+                start = time.perf_counter()
+                if executor.enabled:
+                    predict_proba = functools.partial(executor.predict_proba, version)
+                else:
+                    predict_proba = version.predictor.predict_proba
+                # Sessions whose input barely moved reuse their last probabilities (INFERENCE_CACHE_TOL)
+                probs = inference_cache.predict_proba([session_id for _, session_id, _ in frames], X, predict_proba)
+                if shadow is not None:
+                    self.models.shadow.submit(version, shadow, features_to_matrix(stats, shadow.col_index), probs,
+                                              time.perf_counter() - start)
+            return self._finish(version, frames, feats, probs)
+        finally:
+            for i in reversed(stripes):
+                self._order[i].release()
+    
+    async def predict_batch_async(self, frames: Sequence[Frame]) -> List[Tuple[str, float, int]]:
+        """predict_batch with the model call awaited on the inference executor (INFERENCE_PROCESSES).
         
-        # If user selected an exercise, use that and get its confidence
-        if exercise:
-            target = exercise
-            # Get confidence for the selected exercise
-            if exercise in classes:
-                exercise_idx = list(classes).index(exercise)
-                confidence = float(probs[exercise_idx])
-            else:
-                # Fallback: use max confidence if exercise not in model classes
-                confidence = float(np.max(probs))
-        else:
-            # Auto-detect mode: use predicted exercise
-            idx = int(np.argmax(probs))
-            target = self.label_encoder.inverse_transform([idx])[0]
-            confidence = float(probs[idx])
+        Features and windows are computed on a worker thread, rep counts on
+        the event loop. A batch waits for the previous async batch of each
+        of its sessions to finish before it starts.
+        """
+        version = self.active
+        if not frames:
+            return []
+        
+        session_ids = {session_id for _, session_id, _ in frames}
+        previous = {self._tails[session_id] for session_id in session_ids if session_id in self._tails}
+        done = asyncio.get_running_loop().create_future()
+        for session_id in session_ids:
+            self._tails[session_id] = done
+        try:
+            if previous:
+                await asyncio.wait(previous)
+            feats, stats = await asyncio.to_thread(self._prepare, frames)
+            with metrics.stage("predict_proba"):
+                X = features_to_matrix(stats, version.col_index)
+                shadow = self.models.shadow_sample()
+                start = time.perf_counter()
+                probs = await inference_cache.predict_proba_async([session_id for _, session_id, _ in frames], X,
+                                                                  functools.partial(executor.predict_proba_async, version))
+                if shadow is not None:
+                    self.models.shadow.submit(version, shadow, features_to_matrix(stats, shadow.col_index), probs,
+                                              time.perf_counter() - start)
+            return self._finish(version, frames, feats, probs)
+        finally:
+            done.set_result(None)
+            for session_id in session_ids:
+                if self._tails.get(session_id) is done:
+                    del self._tails[session_id]
+    
+    def _prepare(self, frames: Sequence[Frame]) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-frame features and per-session window statistics (pushed in frame order)."""
+        metrics.observe_batch(len(frames))
+        with metrics.stage("features"):
+            feats = compute_features(np.stack([pts for pts, _, _ in frames]))
+        with metrics.stage("windows"):
+            stats = np.stack([windows.push(session_id, row) for (_, session_id, _), row in zip(frames, feats)])
+        return feats, stats
+    
+    def _finish(self, version: ModelVersion, frames: Sequence[Frame], feats: np.ndarray,
+                probs: np.ndarray) -> List[Tuple[str, float, int]]:
+        results = []
+        with metrics.stage("rep_count"):
+            for (_, session_id, exercise), row, frame_probs in zip(frames, feats, probs):
+                target, confidence = version.resolve(frame_probs, exercise)
+                # Get angle for rep counting (reuses the features computed above)
+                if calibrations.enabled:
+                    angle, thresholds, min_count, switched = calibrations.update(session_id, target,
+                                                                                 *get_primary_angles(row, target))
+                else:
+                    angle, thresholds, min_count, switched = get_primary_angle(row, target), None, 0, False
+                rep_count = sessions.update(session_id, target, angle, thresholds, min_count, switched)
+                # Return the target exercise (user's selection or prediction), not always prediction
+                results.append((target, confidence, rep_count))
+        return results
+    
+    def count_reps(self, pts: np.ndarray, session_id: str, exercise: str) -> Tuple[Optional[float], int, Optional[int]]:
+        """Rep counting for a fixed exercise: (confidence, rep_count, frames since the confidence was computed).
         
-        # Get angle for rep counting
-        angle = get_primary_angle(landmarks, target)
-        rep_count = sessions.update(session_id, target, angle)
+        Most frames only compute the exercise's primary angle. The first frame
+        of a session and then every reps_confidence_every-th frame also go
+        through the feature window and the model, so the window holds sampled
+        frames only and spans that many times more of the session.
+        """
+        every = self.reps_confidence_every
+        state = self._reps_confidence.get(session_id)
+        if every > 0 and (state is None or state[0] + 1 >= every):
+            version = self.active
+            with metrics.stage("features"):
+                feats = compute_features(pts)
+            with metrics.stage("windows"):
+                stats = windows.push(session_id, feats)
+            with metrics.stage("predict_proba"):
+                probs = inference_cache.predict_proba([session_id], features_to_matrix(stats[None], version.col_index),
+                                                      version.predictor.predict_proba)
+            state = [0, version.resolve(probs[0], exercise)[1]]
+            angles = get_primary_angles(feats, exercise)
+        else:
+            if state is None:
+                state = [0, None]
+            else:
+                state[0] += 1
+            angles = (primary_angle(pts, exercise),
+                      primary_angle(pts, exercise, right=True) if calibrations.enabled else math.nan)
+        with self._reps_lock:
+            self._reps_confidence[session_id] = state
+            self._reps_confidence.move_to_end(session_id)
+            if len(self._reps_confidence) > SESSION_MAX:
+                self._reps_confidence.popitem(last=False)
         
-        # Return the target exercise (user's selection or prediction), not always prediction
-        return target, confidence, rep_count
+        with metrics.stage("rep_count"):
+            if calibrations.enabled:
+                angle, thresholds, min_count, switched = calibrations.update(session_id, exercise, *angles)
+            else:
+                angle, thresholds, min_count, switched = angles[0], None, 0, False
+            rep_count = sessions.update(session_id, exercise, angle, thresholds, min_count, switched)
+        return state[1], rep_count, None if state[1] is None else state[0]
+    
+    def confidence_due(self, session_id: str) -> bool:
+        """Whether count_reps will run the model for this session's next frame."""
+        every = self.reps_confidence_every
+        if every <= 0:
+            return False
+        state = self._reps_confidence.get(session_id)
+        return state is None or state[0] + 1 >= every
+    
+    def reset_reps(self, session_id: str):
+        with self._reps_lock:
+            self._reps_confidence.pop(session_id, None)
+    
+    def predict_stats(self, stats: np.ndarray) -> np.ndarray:
+        """Class probabilities for (N, 2 * features) window statistics rows."""
+        version = self.active
+        return version.predictor.predict_proba(features_to_matrix(stats, version.col_index))
+    
+    def resolve_batch(self, probs: np.ndarray, exercise: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """ModelVersion.resolve for many frames sharing one exercise selection: (targets, confidences)."""
+        return self.active.resolve_batch(probs, exercise)
 
 
 classifier = Classifier()
+
+
+def forget_session(session_id: str):
+    """Drop a session from every per-session store but the rep counters (their eviction hook)."""
+    windows.reset(session_id)
+    inference_cache.reset(session_id)
+    classifier.reset_reps(session_id)
+    calibrations.reset(session_id)
+    group, _, track_id = session_id.partition("#")
+    if track_id:
+        tracks.discard(group, track_id)
+
+
+def reset_session(session_id: str):
+    """Drop a session from every per-session store."""
+    sessions.reset(session_id)
+    forget_session(session_id)
+
+
+if hasattr(sessions, "on_evict"):
+    # The shared-memory store evicts by key hash; the other stores keep their own bounds there
+    sessions.on_evict.append(forget_session)
@@ -0,0 +1,474 @@
+"""Rep counts that survive worker restarts (memory session backend).
+
+With SESSION_JOURNAL_DIR set, every change of a counter's count or phase
+is queued by the request thread (a list append) and a background thread
+writes the queue every SESSION_JOURNAL_FLUSH_MS as one group commit to an
+append-only journal of fixed-size binary records:
+
+    id u32 | count i32 | op u8 | phase u8 | pad u16      (12 bytes)
+
+`id` numbers each (session, exercise) pair within a generation; the pair's
+name is appended to a names file ("session\\0exercise\\0") the first time it
+is used, before any journal record that refers to it. A flush that fails
+part-way is cut back off both files and retried with the next one, so a
+name's position in the names file always is its id. After
+SESSION_SNAPSHOT_RECORDS records the live counters are written as a
+compacted snapshot (counts, phases and names, ids renumbered) and a new
+generation with an empty journal starts.
+
+On startup a worker rebuilds its sessions from the latest snapshot plus the
+journal tail: the journal is memory-mapped and the last record of every id
+is found in one vectorized pass. Only counts and phases are kept; the
+smoothing window and debounce refill within a few frames.
+
+Each worker claims its own slot directory under SESSION_JOURNAL_DIR with an
+exclusive lock, so a worker started to replace one that died (gunicorn
+recycles, OOM kills, deploys) takes over that worker's sessions. Up to one
+flush interval of changes is lost on a hard kill.
+
+While writes keep failing the queue holds at most SESSION_JOURNAL_MAX_PENDING
+changes; beyond that the oldest are dropped (counted in `stats()`), so a
+full or broken disk costs recovered counts instead of the worker's memory.
+"""
+
+import fcntl
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SESSION_JOURNAL_DIR = os.environ.get("SESSION_JOURNAL_DIR", "")
+SESSION_JOURNAL_FLUSH_MS = float(os.environ.get("SESSION_JOURNAL_FLUSH_MS", "50"))
+SESSION_JOURNAL_FSYNC = os.environ.get("SESSION_JOURNAL_FSYNC", "1").lower() in ("1", "true", "yes", "on")
+SESSION_SNAPSHOT_RECORDS = int(os.environ.get("SESSION_SNAPSHOT_RECORDS", "200000"))
+# Changes queued while flushes fail; the oldest are dropped beyond this
+SESSION_JOURNAL_MAX_PENDING = int(os.environ.get("SESSION_JOURNAL_MAX_PENDING", "200000"))
+
+RECORD = np.dtype([("id", "<u4"), ("count", "<i4"), ("op", "u1"), ("phase", "u1"), ("pad", "<u2")])
+SNAPSHOT_STATE = np.dtype([("count", "<i4"), ("phase", "u1"), ("pad", "u1", (3,))])
+_SNAPSHOT_HEADER = np.dtype([("magic", "S8"), ("generation", "<u8"), ("entries", "<u8"), ("names_bytes", "<u8")])
+_SNAPSHOT_MAGIC = b"OPSNAP01"
+
+OP_STATE = 1  # The pair's counter now has this count and phase
+OP_DROP = 2  # The pair's counter was reset or evicted
+_PHASES = ("up", "down")
+
+# One recovered counter: (session_id, exercise, count, phase)
+Entry = Tuple[str, str, int, str]
+
+
+def _encode_names(pairs) -> bytes:
+    return b"".join(f"{session_id}\0{exercise}\0".encode() for session_id, exercise in pairs)
+
+
+def _decode_names(blob: bytes) -> Tuple[List[Tuple[str, str]], int]:
+    """(pairs, bytes they span); an incomplete trailing pair is ignored."""
+    parts = blob.split(b"\0")
+    complete = (len(parts) - 1) // 2
+    leftover = parts[2 * complete:]
+    used = len(blob) - sum(len(p) for p in leftover) - (len(leftover) - 1)
+    names = blob[:used].decode().split("\0")
+    return list(zip(names[0:-1:2], names[1::2])), used
+
+
+class SessionJournal:
+    """Journal and snapshots of one worker's counters in one slot directory."""
+
+    def __init__(self, directory: str, flush_ms: float = SESSION_JOURNAL_FLUSH_MS,
+                 fsync: bool = SESSION_JOURNAL_FSYNC, snapshot_records: int = SESSION_SNAPSHOT_RECORDS,
+                 max_pending: int = SESSION_JOURNAL_MAX_PENDING):
+        self.root = Path(directory)
+        self.flush_interval = flush_ms / 1000.0
+        self.fsync = fsync
+        self.snapshot_records = max(1, snapshot_records)
+        self.max_pending = max(1, max_pending)
+        self.slot: Optional[Path] = None
+        self.generation = 0
+        self._lock_fd: Optional[int] = None
+        self._journal_fd: Optional[int] = None
+        self._names_fd: Optional[int] = None
+        # Owned by the flusher thread once started
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self._live: Dict[int, Tuple[int, int]] = {}  # id -> (count, phase)
+        self._records = 0  # In the current generation's journal
+        self._journal_size = 0
+        self._names_size = 0
+        self._stale = False  # The current generation must not be appended to (see compact)
+        # Request threads only append here
+        self._pending: List[tuple] = []
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.flushed_records = 0
+        self.errors = 0
+        self.dropped = 0  # Queued changes discarded by the max_pending bound
+        self.snapshots = 0
+        self.last_flush_ms = 0.0
+        self.recovered = 0
+        self.recovery_ms = 0.0
+
+    # Request path
+
+    def record(self, session_id: str, exercise: str, count: int, phase: str):
+        with self._pending_lock:
+            self._pending.append((session_id, exercise, count, phase))
+            if len(self._pending) > self.max_pending:
+                self._trim()
+
+    def drop(self, session_id: str, exercises):
+        with self._pending_lock:
+            self._pending.extend((session_id, exercise, 0, None) for exercise in exercises)
+            if len(self._pending) > self.max_pending:
+                self._trim()
+
+    def _trim(self):
+        """Drop the oldest queued changes beyond max_pending; caller holds the pending lock."""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped += excess
+
+    # Startup
+
+    def claim(self) -> Path:
+        """Lock the first free slot directory (slot-0, slot-1, ...) for this process."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        i = 0
+        while True:
+            slot = self.root / f"slot-{i}"
+            slot.mkdir(exist_ok=True)
+            fd = os.open(slot / "lock", os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                i += 1
+                continue
+            self._lock_fd, self.slot = fd, slot
+            return slot
+
+    def _path(self, kind: str, generation: int) -> Path:
+        return self.slot / f"{kind}-{generation:08d}.bin"
+
+    def _generations(self, kind: str) -> List[int]:
+        pattern = re.compile(rf"{kind}-(\d{{8}})\.bin$")
+        return sorted(int(m.group(1)) for p in self.slot.iterdir() if (m := pattern.match(p.name)))
+
+    def _read_snapshot(self, generation: int) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+        data = self._path("snapshot", generation).read_bytes()
+        header = np.frombuffer(data, _SNAPSHOT_HEADER, count=1)[0]
+        if header["magic"] != _SNAPSHOT_MAGIC:
+            raise ValueError("bad magic")
+        n = int(header["entries"])
+        offset = _SNAPSHOT_HEADER.itemsize
+        states = np.frombuffer(data, SNAPSHOT_STATE, count=n, offset=offset)
+        offset += n * SNAPSHOT_STATE.itemsize
+        pairs, used = _decode_names(data[offset:offset + int(header["names_bytes"])])
+        if len(pairs) != n or used != int(header["names_bytes"]):
+            raise ValueError("truncated names")
+        return pairs, states
+
+    def recover(self) -> List[Entry]:
+        """Claim a slot and return its live counters; journaling continues in the same generation."""
+        t0 = time.perf_counter()
+        if self.slot is None:
+            self.claim()
+        pairs: List[Tuple[str, str]] = []
+        counts = np.zeros(0, dtype=np.int64)
+        phases = np.zeros(0, dtype=np.uint8)
+        alive = np.zeros(0, dtype=bool)
+        generation = 0
+        # Newest readable snapshot; a crash while compacting can leave a partial one
+        for candidate in reversed(self._generations("snapshot")):
+            try:
+                pairs, states = self._read_snapshot(candidate)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring session snapshot {candidate} in {self.slot}: {e}")
+                continue
+            generation = candidate
+            counts = states["count"].astype(np.int64)
+            phases = states["phase"].copy()
+            alive = np.ones(len(pairs), dtype=bool)
+            break
+
+        # Names first: a journal record never refers to a name that was not written before it
+        names_path = self._path("names", generation)
+        if names_path.exists():
+            new_pairs, used = _decode_names(names_path.read_bytes())
+            os.truncate(names_path, used)
+            pairs = pairs + new_pairs
+            counts = np.concatenate([counts, np.zeros(len(new_pairs), dtype=np.int64)])
+            phases = np.concatenate([phases, np.zeros(len(new_pairs), dtype=np.uint8)])
+            alive = np.concatenate([alive, np.zeros(len(new_pairs), dtype=bool)])
+
+        journal_path = self._path("journal", generation)
+        records = 0
+        if journal_path.exists() and journal_path.stat().st_size >= RECORD.itemsize:
+            records = journal_path.stat().st_size // RECORD.itemsize
+            # Drop a torn trailing record
+            os.truncate(journal_path, records * RECORD.itemsize)
+            with open(journal_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                journal = np.frombuffer(mm, RECORD, count=records)
+                ids = journal["id"]
+                # Last record of every id: first occurrence in the reversed journal
+                uniq, first = np.unique(ids[::-1], return_index=True)
+                last = journal[records - 1 - first]
+                known = uniq < len(pairs)
+                uniq, last = uniq[known], last[known]
+                alive[uniq] = last["op"] == OP_STATE
+                counts[uniq] = last["count"]
+                phases[uniq] = last["phase"]
+                del journal, ids, last
+        elif journal_path.exists():
+            os.truncate(journal_path, 0)
+
+        live = np.flatnonzero(alive).tolist()
+        live_counts, live_phases = counts[live].tolist(), phases[live].tolist()
+        entries = [(*pairs[i], c, _PHASES[p]) for i, c, p in zip(live, live_counts, live_phases)]
+        self.generation = generation
+        self._ids = dict(zip(pairs, range(len(pairs))))
+        self._live = dict(zip(live, zip(live_counts, live_phases)))
+        self._records = records
+        self._remove_generations(keep=generation)
+        self._open_generation()
+        self.recovered = len(entries)
+        self.recovery_ms = (time.perf_counter() - t0) * 1e3
+        logger.info(f"Recovered {len(entries)} session counters from {self.slot} "
+                    f"(generation {generation}, {records} journal records) in {self.recovery_ms:.1f} ms")
+        return entries
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="olympose-journal", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Write everything queued, stop and release the slot."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        else:
+            self._flush()
+        for fd in (self._journal_fd, self._names_fd):
+            if fd is not None:
+                os.close(fd)
+        self._journal_fd = self._names_fd = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # Flusher thread
+
+    def _open_generation(self, truncate: bool = False):
+        """Open the current generation's journal and names files for appending."""
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (os.O_TRUNC if truncate else 0)
+        journal_fd = os.open(self._path("journal", self.generation), flags, 0o600)
+        try:
+            names_fd = os.open(self._path("names", self.generation), flags, 0o600)
+        except OSError:
+            os.close(journal_fd)
+            raise
+        self._journal_fd, self._names_fd = journal_fd, names_fd
+        # Last known-good ends, restored if a flush fails part-way
+        self._journal_size = os.fstat(journal_fd).st_size
+        self._names_size = os.fstat(names_fd).st_size
+
+    def _remove_generations(self, keep: int):
+        for kind in ("snapshot", "journal", "names"):
+            for generation in self._generations(kind):
+                if generation != keep:
+                    self._path(kind, generation).unlink(missing_ok=True)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def _append(self, fd: int, data: bytes):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        if self.fsync:
+            os.fsync(fd)
+
+    def _requeue(self, batch: List[tuple]):
+        """Put a batch that was not written back in front of the queue, for the next flush."""
+        with self._pending_lock:
+            self._pending[:0] = batch
+            self._trim()
+
+    def _flush(self):
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self._stale:
+            # An earlier failure left the files' ends unknown: continue in a fresh generation first
+            try:
+                self.compact()
+            except OSError as e:
+                self.errors += 1
+                logger.error(f"Session journal compaction in {self.slot} failed: {e}")
+                self._requeue(batch)
+                return
+        t0 = time.perf_counter()
+        # Ids of new pairs only become real once their names are on disk
+        new_ids: Dict[Tuple[str, str], int] = {}
+        changes: Dict[int, Optional[Tuple[int, int]]] = {}  # id -> (count, phase), None when dropped
+        ids, counts, ops, phases = [], [], [], []
+        for session_id, exercise, count, phase in batch:
+            pair = (session_id, exercise)
+            i = self._ids.get(pair)
+            if i is None:
+                i = new_ids.get(pair)
+            if i is None:
+                if phase is None or "\0" in session_id or "\0" in exercise:
+                    continue  # Dropping a pair never journaled, or a name that cannot be stored
+                i = new_ids[pair] = len(self._ids) + len(new_ids)
+            if phase is None:
+                changes[i] = None
+                ops.append(OP_DROP)
+                phases.append(0)
+            else:
+                down = int(phase == "down")
+                changes[i] = (count, down)
+                ops.append(OP_STATE)
+                phases.append(down)
+            ids.append(i)
+            counts.append(count)
+
+        records = np.zeros(len(ids), dtype=RECORD)
+        records["id"], records["count"], records["op"], records["phase"] = ids, counts, ops, phases
+        names = _encode_names(new_ids)
+        data = records.tobytes()
+        try:
+            if names:
+                self._append(self._names_fd, names)
+            self._append(self._journal_fd, data)
+        except OSError as e:
+            self.errors += 1
+            logger.error(f"Session journal write to {self.slot} failed: {e}")
+            self._rollback()
+            self._requeue(batch)
+            return
+        self._names_size += len(names)
+        self._journal_size += len(data)
+        self._ids.update(new_ids)
+        for i, state in changes.items():
+            if state is None:
+                self._live.pop(i, None)
+            else:
+                self._live[i] = state
+        self._records += len(records)
+        self.flushes += 1
+        self.flushed_records += len(records)
+        self.last_flush_ms = (time.perf_counter() - t0) * 1e3
+        if self._records >= self.snapshot_records:
+            try:
+                self.compact()
+            except OSError as e:
+                self.errors += 1
+                logger.error(f"Session journal compaction in {self.slot} failed: {e}")
+                self._stale = True
+
+    def _rollback(self):
+        """Cut both files back to their last complete flush, so positions in the names file stay ids."""
+        try:
+            os.ftruncate(self._names_fd, self._names_size)
+            os.ftruncate(self._journal_fd, self._journal_size)
+        except OSError as e:
+            logger.error(f"Session journal rollback in {self.slot} failed ({e}), starting a new generation")
+            self._stale = True
+
+    def compact(self):
+        """Write the live counters as the next generation's snapshot and start an empty journal.
+
+        Flusher thread only (or before `start`). On failure the current
+        generation is left as it was, unless the snapshot is already in
+        place; then `_stale` makes the next flush retry before writing.
+        """
+        generation = self.generation + 1
+        ids = list(self._live)
+        pairs = [None] * len(self._ids)
+        for pair, i in self._ids.items():
+            pairs[i] = pair
+        live_pairs = [pairs[i] for i in ids]
+        states = np.zeros(len(ids), dtype=SNAPSHOT_STATE)
+        if ids:
+            states["count"], states["phase"] = zip(*(self._live[i] for i in ids))
+        names = _encode_names(live_pairs)
+        header = np.array([(_SNAPSHOT_MAGIC, generation, len(ids), len(names))], dtype=_SNAPSHOT_HEADER)
+
+        path = self._path("snapshot", generation)
+        staging = path.with_suffix(".tmp")
+        with open(staging, "wb") as f:
+            f.write(header.tobytes())
+            f.write(states.tobytes())
+            f.write(names)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(staging, path)
+        # From here on recovery reads this snapshot: nothing more may go to the old generation
+        self._stale = True
+        dir_fd = os.open(self.slot, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        old_fds = (self._journal_fd, self._names_fd)
+        self.generation, previous = generation, self.generation
+        try:
+            self._open_generation(truncate=True)
+        except OSError:
+            self.generation = previous
+            raise
+        for fd in old_fds:
+            os.close(fd)
+        self._ids = {pair: i for i, pair in enumerate(live_pairs)}
+        self._live = {i: self._live[old] for i, old in enumerate(ids)}
+        self._records = 0
+        self._stale = False
+        self._remove_generations(keep=generation)
+        self.snapshots += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "slot": str(self.slot),
+            "generation": self.generation,
+            "journal_records": self._records,
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_records": self.flushed_records,
+            "last_flush_ms": self.last_flush_ms,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "snapshots": self.snapshots,
+            "recovered_sessions": self.recovered,
+            "recovery_ms": self.recovery_ms,
+        }
+
+
+def open_journal(sessions) -> Optional[SessionJournal]:
+    """Restore `sessions` from SESSION_JOURNAL_DIR and journal its changes from now on; None if off."""
+    if not SESSION_JOURNAL_DIR:
+        return None
+    if not hasattr(sessions, "restore"):
+        logger.warning("SESSION_JOURNAL_DIR is only supported by the memory session backend, ignoring it")
+        return None
+    journal = SessionJournal(SESSION_JOURNAL_DIR)
+    sessions.restore(journal.recover())
+    sessions.journal = journal
+    journal.start()
+    return journal
@@ -1,25 +1,79 @@
 """FastAPI application."""
 
+import logging
 import os
+import sys
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .router import router
-from .infer import classifier
+from .admin import admin_router
+from .infer import classifier, tracks
+from .batcher import batcher, BATCH_WINDOW_MS
+from .executor import executor
+from .journal import open_journal
+from .metrics import METRICS_ENABLED, MetricsMiddleware
+from .profiler import install_signal_handler, profiler
+from .registry import install_reload_handler
+from .rep_counter import SESSION_BACKEND, sessions
+
+
+def server_workers() -> int:
+    """Worker processes of this server: --workers/-w of the gunicorn or uvicorn command, else WEB_CONCURRENCY."""
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg in ("-w", "--workers") and i + 1 < len(args):
+            value = args[i + 1]
+        elif arg.startswith("--workers="):
+            value = arg.split("=", 1)[1]
+        elif arg.startswith("-w") and arg[2:].isdigit():
+            value = arg[2:]
+        else:
+            continue
+        return int(value) if value.isdigit() else 1
+    value = os.environ.get("WEB_CONCURRENCY", "1")
+    return int(value) if value.isdigit() else 1
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Before loading, so the model is published to the inference processes on activation
+    executor.start()
     # Try to load models, but don't fail if it doesn't work
     # Health endpoint will report loading status
     try:
         classifier.load()
     except Exception as e:
-        import logging
         logging.error(f"Model loading failed during startup: {e}")
         # Continue anyway - health endpoint will show "loading" status
+    workers = server_workers()
+    if SESSION_BACKEND == "shm" and workers > 1:
+        # Only rep counters are shared; consecutive frames of a session landing on different workers
+        # feed different feature windows, so the classifier's input depends on the worker
+        logging.warning(f"SESSION_BACKEND=shm with {workers} workers: rolling feature windows, the inference "
+                        "cache and calibration stay per worker, so classifications depend on which worker "
+                        "serves a frame. Run one worker (INFERENCE_PROCESSES for more cores) or route each "
+                        "session to one worker.")
+    # Rep counts of the worker this one replaces (SESSION_JOURNAL_DIR)
+    journal = open_journal(sessions)
+    if journal is not None:
+        # So a session-level /reset also finds restored /analyze_people tracks
+        tracks.add_sub_sessions(sessions.session_ids())
+    if hasattr(sessions, "start_sweeper"):
+        sessions.start_sweeper()
+    if BATCH_WINDOW_MS > 0:
+        batcher.start()
+    install_signal_handler()
+    install_reload_handler(classifier.models, classifier.serving_dir)
     yield
+    profiler.stop()
+    await batcher.stop()
+    executor.stop()
+    if hasattr(sessions, "stop_sweeper"):
+        sessions.stop_sweeper()
+    if journal is not None:
+        journal.close()
 
 
 app = FastAPI(title="Exercise Classifier", lifespan=lifespan)
@@ -35,4 +89,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(router)
+app.include_router(admin_router)
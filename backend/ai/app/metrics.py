@@ -0,0 +1,259 @@
+"""Hot-path latency histograms and Prometheus text exposition for /metrics.
+
+Observations go into per-thread shards (plain lists owned by one thread),
+so recording takes no lock; shards are only summed when /metrics is
+scraped. Values are per worker process: with several gunicorn workers each
+scrape reports the worker that served it, identified by the `pid` label.
+
+Set METRICS_ENABLED=0 to turn instrumentation off: `stage()` then returns a
+shared no-op context manager and no middleware is installed.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+
+PREFIX = "olympose"
+
+# Seconds: 10us .. 2.5s
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2,
+                   0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Stages of a request, in order (the stage label of STAGE_SECONDS)
+STAGES = ("parse", "decode", "batch_wait", "features", "windows", "predict_proba", "rep_count")
+
+_NULL = nullcontext()
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+class Histogram:
+    """Cumulative histogram with lock-free per-thread shards."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards: List[list] = []
+        self._lock = threading.Lock()  # Only taken the first time a thread observes
+
+    def _new_shard(self) -> list:
+        # Bucket counts, +Inf count, then the sum of observed values
+        shard = [0] * (len(self.buckets) + 1) + [0.0]
+        with self._lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    def observe(self, value: float):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """(cumulative bucket counts, total count, sum) over all threads."""
+        with self._lock:
+            shards = list(self._shards)
+        counts = [sum(s[i] for s in shards) for i in range(len(self.buckets) + 1)]
+        cumulative, running = [], 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative[:-1], running, sum(s[-1] for s in shards)
+
+
+class Counter:
+    """Monotonic counter with per-thread shards."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[list] = []
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = [0.0]
+            with self._lock:
+                self._shards.append(shard)
+        shard[0] += amount
+
+    def value(self) -> float:
+        with self._lock:
+            return sum(s[0] for s in self._shards)
+
+
+class Family:
+    """A named metric with one child per label set."""
+
+    def __init__(self, name: str, kind: str, help: str, factory: Callable[[], object]):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self._factory = factory
+        self._children: Dict[Tuple[Tuple[str, str], ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: str):
+        key = tuple(sorted(labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._factory())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        # Read at scrape time: workers forked from a preloading master share module state
+        pid = str(os.getpid())
+        for key, child in sorted(self._children.items()):
+            labels = {**dict(key), "pid": pid}
+            if isinstance(child, Info):
+                lines.append(f"{self.name}{{{_labels({**child.fn(), **labels})}}} 1")
+            elif isinstance(child, Histogram):
+                cumulative, count, total = child.snapshot()
+                for bound, c in zip(child.buckets, cumulative):
+                    lines.append(f'{self.name}_bucket{{{_labels({**labels, "le": repr(bound)})}}} {c}')
+                lines.append(f'{self.name}_bucket{{{_labels({**labels, "le": "+Inf"})}}} {count}')
+                lines.append(f"{self.name}_count{{{_labels(labels)}}} {count}")
+                lines.append(f"{self.name}_sum{{{_labels(labels)}}} {total!r}")
+            else:
+                lines.append(f"{self.name}{{{_labels(labels)}}} {child.value()!r}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+
+    def __init__(self, fn: Callable[[], float]):
+        self.fn = fn
+
+    def value(self) -> float:
+        return float(self.fn())
+
+
+class Info:
+    """Constant 1 whose labels are read from a callback at scrape time."""
+
+    def __init__(self, fn: Callable[[], Dict[str, str]]):
+        self.fn = fn
+
+
+class Registry:
+    def __init__(self):
+        self.families: List[Family] = []
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Family:
+        return self._add(Family(f"{PREFIX}_{name}", "histogram", help, lambda: Histogram(buckets)))
+
+    def counter(self, name: str, help: str) -> Family:
+        return self._add(Family(f"{PREFIX}_{name}", "counter", help, Counter))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge") -> Family:
+        """Scrape-time value; kind="counter" for totals kept elsewhere."""
+        family = self._add(Family(f"{PREFIX}_{name}", kind, help, lambda: Gauge(fn)))
+        family.labels()
+        return family
+
+    def info(self, name: str, help: str, fn: Callable[[], Dict[str, str]]) -> Family:
+        family = self._add(Family(f"{PREFIX}_{name}", "gauge", help, lambda: Info(fn)))
+        family.labels()
+        return family
+
+    def _add(self, family: Family) -> Family:
+        self.families.append(family)
+        return family
+
+    def render(self) -> str:
+        return "\n".join(line for family in self.families for line in family.render()) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram("request_seconds", "Time from request start to response start, by route")
+STAGE_SECONDS = registry.histogram("stage_seconds", "Time spent per pipeline stage (per call; batched stages per batch)")
+BATCH_SIZE = registry.histogram("batch_size", "Frames per predict_batch call", (1, 2, 4, 8, 16, 32, 64, 128, 256))
+ERRORS = registry.counter("errors_total", "Responses with status >= 400 and unhandled exceptions, by route and status")
+
+_stage_hists = {name: STAGE_SECONDS.labels(stage=name) for name in STAGES}
+
+
+class _StageTimer:
+    __slots__ = ("observe", "start")
+
+    def __init__(self, hist: Histogram):
+        self.observe = hist.observe
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.observe(perf_counter() - self.start)
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage (a no-op when metrics are off)."""
+    if not METRICS_ENABLED:
+        return _NULL
+    return _StageTimer(_stage_hists[name])
+
+
+def observe_stage(name: str, seconds: float):
+    if METRICS_ENABLED:
+        _stage_hists[name].observe(seconds)
+
+
+def observe_batch(size: int):
+    if METRICS_ENABLED:
+        BATCH_SIZE.labels().observe(size)
+
+
+def request_elapsed(scope: dict) -> Optional[float]:
+    """Seconds since MetricsMiddleware saw the request start, if it did."""
+    start = scope.get("state", {}).get("metrics_start")
+    return None if start is None else perf_counter() - start
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request latency and error counts per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = perf_counter()
+        scope.setdefault("state", {})["metrics_start"] = start
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                REQUEST_SECONDS.labels(route=self._route(scope)).observe(perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            ERRORS.labels(route=self._route(scope), status="500").inc()
+            raise
+        if status >= 400:
+            ERRORS.labels(route=self._route(scope), status=str(status)).inc()
+
+    @staticmethod
+    def _route(scope: dict) -> str:
+        # Route templates only, so unknown paths cannot grow label cardinality
+        route = scope.get("route")
+        return getattr(route, "path", "unmatched")
@@ -1,6 +1,7 @@
 """Landmark preprocessing."""
 
-from typing import Dict, List
+import math
+from typing import Dict, List, Sequence, Tuple
 import numpy as np
 
 from .schemas import Landmark
@@ -25,52 +26,98 @@ ANGLES = {
 }
 
 
-def _angle(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
-    v1, v2 = a - b, c - b
-    n1, n2 = np.linalg.norm(v1), np.linalg.norm(v2)
-    if n1 < 1e-6 or n2 < 1e-6:
-        return np.nan
-    return float(np.degrees(np.arccos(np.clip(np.dot(v1, v2) / (n1 * n2), -1, 1))))
+# Joint angle that drives rep counting for each exercise
+PRIMARY_ANGLE = {
+    'bicep_curls': 'l_elbow', 'pushups': 'l_elbow', 'tricep_extensions': 'l_elbow',
+    'squats': 'l_knee', 'lunges': 'l_knee',
+    'situps': 'l_hip', 'jumping_jacks': 'l_hip',
+    'dumbbell_rows': 'l_elbow', 'dumbbell_shoulder_press': 'l_elbow',
+    'lateral_shoulder_raises': 'l_elbow',
+}
 
+FEATURE_NAMES = tuple(ANGLES) + ('body_tilt', 'ratio_sh_hip', 'ratio_arm_torso')
 
-def extract_features(landmarks: List[Landmark]) -> Dict[str, float]:
-    """Extract features from 33 BlazePose landmarks."""
-    pts = np.array([[lm.x, lm.y] if lm.visibility > 0.5 else [np.nan, np.nan] for lm in landmarks])
-    feats = {}
+_PRIMARY_ANGLE_IDX = {ex: FEATURE_NAMES.index(name) for ex, name in PRIMARY_ANGLE.items()}
+_PRIMARY_ANGLE_DEFAULT = FEATURE_NAMES.index('l_elbow')
+# Right-side counterparts, for calibration's choice of side
+_PRIMARY_RIGHT_IDX = {ex: FEATURE_NAMES.index('r_' + name[2:]) for ex, name in PRIMARY_ANGLE.items()}
+_PRIMARY_RIGHT_DEFAULT = FEATURE_NAMES.index('r_elbow')
+
+# Landmark index triplets (a, b, c) for every entry in ANGLES, in FEATURE_NAMES order
+_ANGLE_IDX = np.array([[IDX[a], IDX[b], IDX[c]] for a, b, c in ANGLES.values()], dtype=np.intp)
+_PRIMARY_TRIPLETS = {ex: _ANGLE_IDX[i] for ex, i in _PRIMARY_ANGLE_IDX.items()}
+_PRIMARY_TRIPLET_DEFAULT = _ANGLE_IDX[_PRIMARY_ANGLE_DEFAULT]
+_PRIMARY_RIGHT_TRIPLETS = {ex: _ANGLE_IDX[i] for ex, i in _PRIMARY_RIGHT_IDX.items()}
+_PRIMARY_RIGHT_TRIPLET_DEFAULT = _ANGLE_IDX[_PRIMARY_RIGHT_DEFAULT]
+
+
+def _dot(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    # matmul over the trailing axis matches np.dot bit-for-bit, unlike (u * v).sum(-1)
+    return (u[..., None, :] @ v[..., :, None])[..., 0, 0]
+
+
+def _norm(u: np.ndarray) -> np.ndarray:
+    return np.sqrt(_dot(u, u))
+
+
+def landmarks_to_array(landmarks: List[Landmark]) -> np.ndarray:
+    """Pack 33 landmarks into a (33, 3) [x, y, visibility] array."""
+    return np.array([(lm.x, lm.y, lm.visibility) for lm in landmarks], dtype=np.float64)
+
+
+def people_to_array(people: Sequence[List[Landmark]]) -> np.ndarray:
+    """Pack the 33 landmarks of K people into a (K, 33, 3) array."""
+    return np.array([[(lm.x, lm.y, lm.visibility) for lm in landmarks] for landmarks in people], dtype=np.float64)
+
+
+def compute_features(pts: np.ndarray) -> np.ndarray:
+    """Vectorized feature extraction.
+
+    Takes a (33, 3) or (N, 33, 3) [x, y, visibility] array and returns a
+    (len(FEATURE_NAMES),) or (N, len(FEATURE_NAMES)) array. Landmarks with
+    visibility <= 0.5 are masked to NaN, which propagates into every feature
+    that depends on them.
+    """
+    pts = np.asarray(pts, dtype=np.float64)
+    single = pts.ndim == 2
+    if single:
+        pts = pts[None]
+    xy = np.where(pts[..., 2:3] > 0.5, pts[..., :2], np.nan)
+    out = np.empty((xy.shape[0], len(FEATURE_NAMES)))
     
-    for name, (a, b, c) in ANGLES.items():
-        feats[name] = _angle(pts[IDX[a]], pts[IDX[b]], pts[IDX[c]])
+    # Joint angles, all six at once
+    a, b, c = xy[:, _ANGLE_IDX[:, 0]], xy[:, _ANGLE_IDX[:, 1]], xy[:, _ANGLE_IDX[:, 2]]
+    v1, v2 = a - b, c - b
+    n1, n2 = _norm(v1), _norm(v2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos = np.clip(_dot(v1, v2) / (n1 * n2), -1, 1)
+        angles = np.degrees(np.arccos(cos))
+    angles[(n1 < 1e-6) | (n2 < 1e-6)] = np.nan
+    n_angles = len(ANGLES)
+    out[:, :n_angles] = angles
     
     # Body tilt
-    nose = pts[IDX['nose']]
-    lh, rh = pts[IDX['left_hip']], pts[IDX['right_hip']]
+    nose = xy[:, IDX['nose']]
+    ls, rs = xy[:, IDX['left_shoulder']], xy[:, IDX['right_shoulder']]
+    lh, rh = xy[:, IDX['left_hip']], xy[:, IDX['right_hip']]
     mid_hip = (lh + rh) / 2.0
-    if not (np.isnan(nose).any() or np.isnan(mid_hip).any()):
-        vec = nose - mid_hip
-        feats['body_tilt'] = float(np.degrees(np.arctan2(vec[1], vec[0])))
-    else:
-        feats['body_tilt'] = np.nan
+    vec = nose - mid_hip
+    out[:, n_angles] = np.degrees(np.arctan2(vec[:, 1], vec[:, 0]))
     
     # Ratios
-    def _dist(i, j):
-        p1, p2 = pts[IDX[i]], pts[IDX[j]]
-        if np.isnan(p1).any() or np.isnan(p2).any():
-            return np.nan
-        return float(np.linalg.norm(p1 - p2))
+    sh_w = _norm(ls - rs)
+    hip_w = _norm(lh - rh)
+    out[:, n_angles + 1] = sh_w / (hip_w + 1e-6)
+    arm_len = _norm(ls - xy[:, IDX['left_wrist']])
+    torso_len = _norm((ls + rs) / 2.0 - mid_hip)
+    out[:, n_angles + 2] = arm_len / (torso_len + 1e-6)
     
-    sh_w = _dist('left_shoulder', 'right_shoulder')
-    hip_w = _dist('left_hip', 'right_hip')
-    feats['ratio_sh_hip'] = sh_w / (hip_w + 1e-6) if not (np.isnan(sh_w) or np.isnan(hip_w)) else np.nan
-    
-    ls = pts[IDX['left_shoulder']]
-    lw = pts[IDX['left_wrist']]
-    arm_len = float(np.linalg.norm(ls - lw)) if not (np.isnan(ls).any() or np.isnan(lw).any()) else np.nan
-    rs = pts[IDX['right_shoulder']]
-    mid_sh = (ls + rs) / 2.0 if not (np.isnan(ls).any() or np.isnan(rs).any()) else np.array([np.nan, np.nan])
-    torso_len = float(np.linalg.norm(mid_sh - mid_hip)) if not np.isnan(mid_sh).any() else np.nan
-    feats['ratio_arm_torso'] = arm_len / (torso_len + 1e-6) if not (np.isnan(arm_len) or np.isnan(torso_len)) else np.nan
-    
-    return feats
+    return out[0] if single else out
+
+
+def extract_features(landmarks: List[Landmark]) -> Dict[str, float]:
+    """Extract features from 33 BlazePose landmarks."""
+    return dict(zip(FEATURE_NAMES, compute_features(landmarks_to_array(landmarks)).tolist()))
 
 
 def features_to_vector(feats: Dict[str, float], feature_cols: List[str]) -> List[float]:
@@ -85,14 +132,55 @@ def features_to_vector(feats: Dict[str, float], feature_cols: List[str]) -> List
     return result
 
 
-def get_primary_angle(landmarks: List[Landmark], exercise: str) -> float:
-    """Get primary angle for rep counting."""
-    angle_map = {
-        'bicep_curls': 'l_elbow', 'pushups': 'l_elbow', 'tricep_extensions': 'l_elbow',
-        'squats': 'l_knee', 'lunges': 'l_knee',
-        'situps': 'l_hip', 'jumping_jacks': 'l_hip',
-        'dumbbell_rows': 'l_elbow', 'dumbbell_shoulder_press': 'l_elbow',
-        'lateral_shoulder_raises': 'l_elbow',
-    }
-    feats = extract_features(landmarks)
-    return feats.get(angle_map.get(exercise, 'l_elbow'), np.nan)
+def feature_column_index(feature_cols: List[str]) -> np.ndarray:
+    """Map each model column onto a window statistics row (-1 for unknown columns).
+    
+    Window rows hold the means of FEATURE_NAMES followed by their standard
+    deviations (see `app.windows`); `<name>_std` columns point into the
+    second half, `<name>_mean` and bare `<name>` columns into the first.
+    """
+    n = len(FEATURE_NAMES)
+    index = {name: i for i, name in enumerate(FEATURE_NAMES)}
+    index.update({f'{name}_mean': i for i, name in enumerate(FEATURE_NAMES)})
+    index.update({f'{name}_std': n + i for i, name in enumerate(FEATURE_NAMES)})
+    return np.array([index.get(col, -1) for col in feature_cols], dtype=np.intp)
+
+
+def features_to_matrix(stats: np.ndarray, col_index: np.ndarray) -> np.ndarray:
+    """Select model columns from (N, 2 * len(FEATURE_NAMES)) window statistics rows."""
+    X = np.zeros((stats.shape[0], len(col_index)))
+    known = col_index >= 0
+    X[:, known] = stats[:, col_index[known]]
+    X[np.isnan(X)] = 0.0
+    return X
+
+
+def get_primary_angle(feats: np.ndarray, exercise: str) -> float:
+    """Get primary angle for rep counting from a compute_features row."""
+    return float(feats[_PRIMARY_ANGLE_IDX.get(exercise, _PRIMARY_ANGLE_DEFAULT)])
+
+
+def get_primary_angles(feats: np.ndarray, exercise: str) -> Tuple[float, float]:
+    """(left, right) primary angles from a compute_features row."""
+    return (float(feats[_PRIMARY_ANGLE_IDX.get(exercise, _PRIMARY_ANGLE_DEFAULT)]),
+            float(feats[_PRIMARY_RIGHT_IDX.get(exercise, _PRIMARY_RIGHT_DEFAULT)]))
+
+
+def primary_angle(pts: np.ndarray, exercise: str, right: bool = False) -> float:
+    """get_primary_angle for one (33, 3) frame, computed from the angle's three landmarks only.
+    
+    Matches the compute_features value to within 1e-9 degrees (NaN when a
+    landmark is not visible). `right` selects the right-side counterpart.
+    """
+    if right:
+        triplet = _PRIMARY_RIGHT_TRIPLETS.get(exercise, _PRIMARY_RIGHT_TRIPLET_DEFAULT)
+    else:
+        triplet = _PRIMARY_TRIPLETS.get(exercise, _PRIMARY_TRIPLET_DEFAULT)
+    (ax, ay, av), (bx, by, bv), (cx, cy, cv) = pts[triplet].tolist()
+    if av <= 0.5 or bv <= 0.5 or cv <= 0.5:
+        return math.nan
+    ux, uy, wx, wy = ax - bx, ay - by, cx - bx, cy - by
+    n1, n2 = math.sqrt(ux * ux + uy * uy), math.sqrt(wx * wx + wy * wy)
+    if n1 < 1e-6 or n2 < 1e-6:
+        return math.nan
+    return math.degrees(math.acos(min(1.0, max(-1.0, (ux * wx + uy * wy) / (n1 * n2)))))
@@ -0,0 +1,168 @@
+"""On-demand statistical stack sampler for live workers.
+
+A profile run starts a daemon thread that snapshots every other thread's
+Python stack (`sys._current_frames`) at a fixed interval, aggregates them
+into a bounded table of collapsed stacks and stops by itself after the
+requested duration. The result is written to PROFILE_DIR as
+`profile-<pid>-<timestamp>.collapsed`, one `frame;frame;... count` line per
+stack, ready for flamegraph.pl or speedscope.
+
+Nothing runs until a profile is requested, either through the
+/admin/profile endpoint (only served when ADMIN_TOKEN is set) or by sending
+the worker PROFILE_SIGNAL (e.g. `PROFILE_SIGNAL=SIGUSR2`, then
+`kill -USR2 <worker pid>`).
+"""
+
+import logging
+import os
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", Path(tempfile.gettempdir()) / "olympose-profiles"))
+PROFILE_SIGNAL = os.environ.get("PROFILE_SIGNAL", "")
+# Duration used for signal-triggered runs, and the cap for requested ones
+PROFILE_DEFAULT_SECONDS = float(os.environ.get("PROFILE_DEFAULT_SECONDS", "10"))
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+# Distinct stacks kept per run; later new stacks are counted under TRUNCATED
+PROFILE_MAX_STACKS = int(os.environ.get("PROFILE_MAX_STACKS", "5000"))
+MAX_DEPTH = 128
+MIN_INTERVAL = 0.001
+
+TRUNCATED = "[stack table full]"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    return f"{code.co_name} ({path.parent.name}/{path.name})".replace(";", ":")
+
+
+def _collapse(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """One profiling run at a time per process."""
+
+    def __init__(self, directory: Path = PROFILE_DIR, max_stacks: int = PROFILE_MAX_STACKS):
+        self.directory = Path(directory)
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._result: List[Optional[Path]] = [None]  # File written by the current or last run
+        self.last_path: Optional[Path] = None
+        self.last_samples = 0
+        self.last_error: Optional[str] = None
+        self.until = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float = PROFILE_DEFAULT_SECONDS, interval: float = 0.005) -> bool:
+        """Start a run; False if one is already in progress."""
+        seconds = min(max(seconds, 0.0), PROFILE_MAX_SECONDS)
+        interval = max(interval, MIN_INTERVAL)
+        # Non-blocking: start() also runs from a signal handler, which may interrupt a holder
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self.running:
+                return False
+            self._stop.clear()
+            self.until = time.time() + seconds
+            self._result = [None]
+            self._thread = threading.Thread(target=self._run, args=(seconds, interval, self._result),
+                                            name="olympose-profiler", daemon=True)
+            self._thread.start()
+        finally:
+            self._lock.release()
+        logger.info(f"Profiling pid {os.getpid()} for {seconds:.1f}s every {interval * 1000:.1f}ms")
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Path]:
+        """Wait for the current run; the file it wrote, or None if it is still running or could not write."""
+        thread, result = self._thread, self._result
+        if thread is None:
+            return None
+        thread.join(timeout)
+        return None if thread.is_alive() else result[0]
+
+    def _run(self, seconds: float, interval: float, result: List[Optional[Path]]):
+        stacks: Counter = Counter()
+        samples = 0
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not self._stop.is_set():
+            names = {t.ident: re.sub(r"\d+", "N", t.name) for t in threading.enumerate()}
+            frames = sys._current_frames()
+            frames.pop(me, None)
+            for ident, frame in frames.items():
+                stack = _collapse(frame, names.get(ident, "thread"))
+                if stack not in stacks and len(stacks) >= self.max_stacks:
+                    stack = TRUNCATED
+                stacks[stack] += 1
+            # Drop frame references so sampled threads' locals are not kept alive
+            frames = frame = None
+            samples += 1
+            self._stop.wait(interval)
+        try:
+            result[0] = self._write(stacks, samples)
+        except OSError as e:
+            self.last_error = f"Cannot write profile to {self.directory}: {e}"
+            logger.error(self.last_error)
+
+    def _write(self, stacks: Counter, samples: int) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"profile-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}.collapsed"
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.last_path = path
+        self.last_samples = samples
+        self.last_error = None
+        logger.info(f"Profile written to {path} ({samples} samples, {len(stacks)} distinct stacks)")
+        return path
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "pid": os.getpid(),
+            "running": self.running,
+            "until": self.until if self.running else None,
+            "last_profile": str(self.last_path) if self.last_path else None,
+            "last_samples": self.last_samples,
+            "last_error": self.last_error,
+        }
+
+
+profiler = StackSampler()
+
+
+def install_signal_handler():
+    """Start a PROFILE_DEFAULT_SECONDS run on PROFILE_SIGNAL, if configured (main thread only)."""
+    if not PROFILE_SIGNAL:
+        return
+    try:
+        signum = getattr(signal, PROFILE_SIGNAL if PROFILE_SIGNAL.startswith("SIG") else f"SIG{PROFILE_SIGNAL}")
+        signal.signal(signum, lambda *_: profiler.start())
+        logger.info(f"Profiler armed on {PROFILE_SIGNAL} (pid {os.getpid()})")
+    except (AttributeError, ValueError) as e:
+        logger.warning(f"Cannot install profiler signal handler for {PROFILE_SIGNAL}: {e}")
@@ -0,0 +1,258 @@
+"""Model versions: background loading, atomic activation, rollback and shadow scoring.
+
+The serving path reads `ModelRegistry.active` once per batch and uses that
+version for the whole batch, so activating a new version is a single
+reference assignment: in-flight batches finish on the version they started
+with and nothing waits on a lock.
+
+A candidate is loaded and validated in a background thread. It can then be
+activated, or first shadow-scored: a fraction of batches is re-scored by the
+candidate on a separate thread and latency and agreement with the active
+version are recorded. Every worker process has its own registry; send
+MODEL_RELOAD_SIGNAL (e.g. `MODEL_RELOAD_SIGNAL=SIGHUP`, then `kill -HUP` the
+workers) to reload and activate MODELS_DIR, or the variant LATENCY_BUDGET_MS
+selects, in each of them.
+"""
+
+import logging
+import os
+import queue
+import random
+import signal
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_RELOAD_SIGNAL = os.environ.get("MODEL_RELOAD_SIGNAL", "")
+# Batches waiting for the shadow scorer; more are dropped rather than queued
+SHADOW_QUEUE = int(os.environ.get("SHADOW_QUEUE", "64"))
+# Recent per-batch timings kept for latency percentiles
+LATENCY_SAMPLES = 2048
+
+
+class ModelValidationError(ValueError):
+    """A model version is not fit to serve."""
+
+
+class _Latency:
+    def __init__(self):
+        self.batches = 0
+        self.frames = 0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def add(self, seconds: float, frames: int):
+        self.batches += 1
+        self.frames += frames
+        self.samples.append(seconds / frames)
+
+    def stats(self) -> Dict[str, object]:
+        samples = np.array(self.samples) * 1e6
+        p50, p99 = np.percentile(samples, [50, 99]) if len(samples) else (0.0, 0.0)
+        return {"batches": self.batches, "frames": self.frames,
+                "us_per_frame_p50": float(p50), "us_per_frame_p99": float(p99)}
+
+
+class ShadowScorer:
+    """Re-scores sampled batches with a candidate on its own thread."""
+
+    def __init__(self, queue_size: int = SHADOW_QUEUE):
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self.reset()
+
+    def reset(self):
+        self.active = _Latency()
+        self.candidate = _Latency()
+        self.frames = 0
+        self.agree = 0
+        self.confidence_diff = 0.0
+        self.dropped = 0
+        self.errors = 0
+
+    def submit(self, active, candidate, X: np.ndarray, probs: np.ndarray, seconds: float):
+        """Queue a batch scored by `active` in `seconds`; dropped if the scorer is behind.
+
+        `X` is the candidate's input matrix, built with the candidate's own columns.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="olympose-shadow", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait((active, candidate, X, probs, seconds))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            active, candidate, X, probs, seconds = self._queue.get()
+            try:
+                t0 = time.perf_counter()
+                shadow = candidate.predictor.predict_proba(X)
+                elapsed = time.perf_counter() - t0
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Shadow scoring with {candidate.version} failed: {e}")
+                continue
+            self.active.add(seconds, len(X))
+            self.candidate.add(elapsed, len(X))
+            # Compare labels, not indices: the versions may order their classes differently
+            self.agree += int((active.classes[probs.argmax(axis=1)] == candidate.classes[shadow.argmax(axis=1)]).sum())
+            self.confidence_diff += float(np.abs(probs.max(axis=1) - shadow.max(axis=1)).sum())
+            self.frames += len(X)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "frames": self.frames,
+            "agreement": self.agree / self.frames if self.frames else None,
+            "mean_confidence_diff": self.confidence_diff / self.frames if self.frames else None,
+            "active": self.active.stats(),
+            "candidate": self.candidate.stats(),
+            "queue_depth": self._queue.qsize(),
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+class ModelRegistry:
+    """Active, previous and candidate model versions of one worker.
+
+    `loader(path)` returns a validated version or raises; `on_activate(version)`
+    adapts per-session state (windows, caches) to a version before it is served.
+    """
+
+    def __init__(self, loader: Callable[[Path], object], on_activate: Callable[[object], None]):
+        self.loader = loader
+        self.on_activate = on_activate
+        self.active = None
+        self.previous = None
+        self.candidate = None
+        self.state = "idle"  # Candidate loading: idle, loading, ready or failed
+        self.error: Optional[str] = None
+        self.shadow_fraction = 0.0
+        self.shadow = ShadowScorer()
+        self._lock = threading.Lock()  # Serializes loads and switches; never taken by requests
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loading(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def load_candidate(self, path: Path, activate: bool = False) -> bool:
+        """Load `path` as the candidate in the background; False if a load is in progress."""
+        # Non-blocking: also called from a signal handler
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self.loading:
+                return False
+            self.state, self.error = "loading", None
+            self._thread = threading.Thread(target=self._load, args=(Path(path), activate),
+                                            name="olympose-model-load", daemon=True)
+            self._thread.start()
+        finally:
+            self._lock.release()
+        return True
+
+    def wait(self, timeout: Optional[float] = None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _load(self, path: Path, activate: bool):
+        try:
+            version = self.loader(path)
+        except Exception as e:
+            self.state, self.error = "failed", f"{type(e).__name__}: {e}"
+            logger.error(f"Candidate model from {path} rejected: {self.error}")
+            return
+        with self._lock:
+            self.candidate = version
+            self.shadow_fraction = 0.0
+            self.shadow.reset()
+            self.state = "ready"
+        logger.info(f"Candidate model {version.version} ready")
+        if activate:
+            try:
+                self.activate()
+            except Exception:
+                pass  # Logged by activate; the candidate stays loaded
+
+    def activate(self, version=None):
+        """Serve `version` (default: the candidate) from the next batch on."""
+        with self._lock:
+            if version is None:
+                version = self.candidate
+                if version is None:
+                    raise LookupError("No candidate model is loaded")
+            # Windows, caches and the executor first: a request must not reach the new version with
+            # the old one's state, and a failed switch must leave the old version fully in place
+            try:
+                self.on_activate(version)
+            except Exception as e:
+                self.error = f"Activating {version.version} failed: {type(e).__name__}: {e}"
+                logger.error(self.error)
+                raise
+            if version is self.candidate:
+                self.candidate, self.state, self.shadow_fraction = None, "idle", 0.0
+            self.previous, self.active, self.error = self.active, version, None
+        logger.info(f"Serving model {version.version}"
+                    + (f" (was {self.previous.version})" if self.previous is not None else ""))
+
+    def rollback(self):
+        """Serve the previously active version again."""
+        if self.previous is None:
+            raise LookupError("No previous model version")
+        self.activate(self.previous)
+
+    def discard(self):
+        with self._lock:
+            self.candidate, self.state, self.shadow_fraction = None, "idle", 0.0
+
+    def set_shadow(self, fraction: float):
+        candidate, active = self.candidate, self.active
+        if fraction > 0 and candidate is None:
+            raise LookupError("No candidate model is loaded")
+        # Shadow inputs come from the active version's feature windows
+        if fraction > 0 and active is not None and \
+                (candidate.window_size, candidate.ddof) != (active.window_size, active.ddof):
+            raise ModelValidationError(
+                f"Candidate {candidate.version} uses a {candidate.window_size}-frame window (ddof {candidate.ddof}), "
+                f"the active version {active.window_size} (ddof {active.ddof}); it cannot be shadow-scored")
+        self.shadow.reset()
+        self.shadow_fraction = fraction
+
+    def shadow_sample(self):
+        """The candidate if this batch should be shadow-scored, else None."""
+        candidate = self.candidate
+        if candidate is None or not self.shadow_fraction or random.random() >= self.shadow_fraction:
+            return None
+        return candidate
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "active": self.active.describe() if self.active is not None else None,
+            "previous": self.previous.describe() if self.previous is not None else None,
+            "candidate": self.candidate.describe() if self.candidate is not None else None,
+            "state": self.state,
+            "error": self.error,
+            "shadow_fraction": self.shadow_fraction,
+            "shadow": self.shadow.stats(),
+        }
+
+
+def install_reload_handler(registry: ModelRegistry, locate: Callable[[], Path]):
+    """Load and activate the directory `locate()` returns on MODEL_RELOAD_SIGNAL, if configured (main thread only)."""
+    if not MODEL_RELOAD_SIGNAL:
+        return
+    try:
+        name = MODEL_RELOAD_SIGNAL if MODEL_RELOAD_SIGNAL.startswith("SIG") else f"SIG{MODEL_RELOAD_SIGNAL}"
+        signal.signal(getattr(signal, name), lambda *_: registry.load_candidate(locate(), activate=True))
+        logger.info(f"Model reload armed on {MODEL_RELOAD_SIGNAL} (pid {os.getpid()})")
+    except (AttributeError, ValueError) as e:
+        logger.warning(f"Cannot install model reload handler for {MODEL_RELOAD_SIGNAL}: {e}")
@@ -1,9 +1,14 @@
 """Repetition counter with smoothing."""
 
-from typing import Dict, List
-from collections import deque
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
 import numpy as np
 
+logger = logging.getLogger(__name__)
 
 # Thresholds: (down_angle, up_angle)
 # down_angle: angle must go BELOW this to count as "down" phase
@@ -24,33 +29,82 @@ THRESHOLDS = {
 # Smoothing window size
 SMOOTHING_WINDOW = 5
 
+# Where counters live: "memory" (per process) or "shm" (shared by all workers on the host)
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+
+# In-memory store bounds: sessions idle longer than the TTL are dropped, and
+# beyond SESSION_MAX the least recently used session is dropped
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "100000"))
+# Expired sessions dropped per update, so sweeping never stalls a request
+SWEEP_BATCH = 8
+# Interval of the background sweep that also frees sessions of an idle worker (0: only sweep on updates)
+SESSION_SWEEP_SECONDS = float(os.environ.get("SESSION_SWEEP_SECONDS", "60"))
+
 
 class RepCounter:
+    """Debounced up/down state machine over a moving-average smoothed angle.
+    
+    The smoothing window is a fixed ring buffer with a running sum, so each
+    frame costs O(1) regardless of SMOOTHING_WINDOW.
+    """
+    
+    __slots__ = ('count', 'phase', 'last_valid_angle', 'frames_in_phase', 'min_frames_for_transition',
+                 '_ring', '_pos', '_len', '_sum')
+    
     def __init__(self):
         self.count = 0
         self.phase = 'up'  # Start in "up" (extended) position
-        self.angle_history: deque = deque(maxlen=SMOOTHING_WINDOW)
         self.last_valid_angle = None
         self.frames_in_phase = 0  # Debounce: require multiple frames in phase
         self.min_frames_for_transition = 3  # Require 3 consecutive frames to transition
+        self._ring = [0.0] * SMOOTHING_WINDOW
+        self._pos = 0  # Next slot to overwrite (the oldest angle once the ring is full)
+        self._len = 0
+        self._sum = 0.0
+    
+    @property
+    def angle_history(self) -> List[float]:
+        """Angles in the smoothing window, oldest first."""
+        if self._len < SMOOTHING_WINDOW:
+            return self._ring[:self._len]
+        return self._ring[self._pos:] + self._ring[:self._pos]
+    
+    def set_history(self, angles: List[float]):
+        """Restore the smoothing window from oldest-first angles."""
+        angles = list(angles)[-SMOOTHING_WINDOW:]
+        self._ring = angles + [0.0] * (SMOOTHING_WINDOW - len(angles))
+        self._len = len(angles)
+        self._pos = self._len % SMOOTHING_WINDOW
+        self._sum = sum(angles)
     
     def _smooth_angle(self, angle: float) -> float:
         """Apply moving average smoothing to angle."""
-        if np.isnan(angle):
+        if angle != angle:  # NaN
             return self.last_valid_angle if self.last_valid_angle else np.nan
         
-        self.angle_history.append(angle)
+        ring, pos = self._ring, self._pos
+        if self._len == SMOOTHING_WINDOW:
+            self._sum += angle - ring[pos]
+        else:
+            self._sum += angle
+            self._len += 1
+        ring[pos] = angle
+        self._pos = pos = (pos + 1) % SMOOTHING_WINDOW
+        if pos == 0:
+            # The ring is in oldest-first order here: re-sum exactly to stop rounding drift
+            self._sum = sum(ring)
         self.last_valid_angle = angle
         
-        if len(self.angle_history) < 2:
+        if self._len < 2:
             return angle
         
-        return float(np.mean(self.angle_history))
+        return self._sum / self._len
     
     def update(self, angle: float, down_thresh: float, up_thresh: float) -> int:
         smoothed = self._smooth_angle(angle)
         
-        if np.isnan(smoothed):
+        if smoothed != smoothed:  # NaN
             return self.count
         
         # State machine for rep counting with debouncing
@@ -74,37 +128,281 @@ class RepCounter:
         
         return self.count
     
+    def credit(self, reps: int):
+        """Raise the count to `reps` completed reps, one of which may still be in progress here."""
+        floor = reps - (self.phase == 'down')
+        if self.count < floor:
+            self.count = floor
+    
+    def restart_smoothing(self):
+        """Empty the smoothing window and debounce, keeping count and phase (the angle source changed)."""
+        self.last_valid_angle = None
+        self.frames_in_phase = 0
+        self.set_history([])
+    
     def reset(self):
         self.count = 0
         self.phase = 'up'
-        self.angle_history.clear()
-        self.last_valid_angle = None
-        self.frames_in_phase = 0
+        self.restart_smoothing()
+
+
+class RepCounterBank:
+    """Struct-of-arrays RepCounters that advance many sessions in one vectorized step.
+    
+    Slot i holds the state of one counter; `step` applies one frame to each
+    of a set of distinct slots with exactly the same smoothing, debounce and
+    threshold logic as RepCounter.update.
+    """
+    
+    _FIELDS = ('count', 'down', 'frames_in_phase', 'last_valid_angle', 'ring', 'pos', 'length', 'sum')
+    
+    def __init__(self, capacity: int = 1024, min_frames_for_transition: int = 3):
+        self.min_frames_for_transition = min_frames_for_transition
+        self.size = 0
+        self._allocate(capacity)
+    
+    def _allocate(self, capacity: int):
+        old = {name: getattr(self, name) for name in self._FIELDS} if self.size else None
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.down = np.zeros(capacity, dtype=bool)  # phase: False = up, True = down
+        self.frames_in_phase = np.zeros(capacity, dtype=np.int64)
+        self.last_valid_angle = np.full(capacity, np.nan)  # NaN = None
+        self.ring = np.zeros((capacity, SMOOTHING_WINDOW))
+        self.pos = np.zeros(capacity, dtype=np.intp)
+        self.length = np.zeros(capacity, dtype=np.intp)
+        self.sum = np.zeros(capacity)
+        if old:
+            for name, values in old.items():
+                getattr(self, name)[:self.size] = values[:self.size]
+    
+    def add(self) -> int:
+        """Allocate a fresh counter and return its slot."""
+        if self.size == len(self.count):
+            self._allocate(2 * len(self.count))
+        self.size += 1
+        return self.size - 1
+    
+    def reset(self, slots):
+        self.count[slots] = 0
+        self.down[slots] = False
+        self.frames_in_phase[slots] = 0
+        self.last_valid_angle[slots] = np.nan
+        self.ring[slots] = 0.0
+        self.pos[slots] = 0
+        self.length[slots] = 0
+        self.sum[slots] = 0.0
+    
+    def step(self, slots: np.ndarray, angles: np.ndarray, down_thresh, up_thresh) -> np.ndarray:
+        """Feed one angle to each slot (slots must be distinct) and return their counts."""
+        slots = np.asarray(slots, dtype=np.intp)
+        angles = np.asarray(angles, dtype=np.float64)
+        valid = ~np.isnan(angles)
+        
+        # Fallback for missing angles: last valid angle, unless there is none (or it is 0.0, as in RepCounter)
+        last = self.last_valid_angle[slots]
+        smoothed = np.where((last == 0.0), np.nan, last)
+        
+        # Smoothing: push valid angles into the ring and update the running sum
+        vs, va = slots[valid], angles[valid]
+        pos, full = self.pos[vs], self.length[vs] == SMOOTHING_WINDOW
+        self.sum[vs] += np.where(full, va - self.ring[vs, pos], va)
+        self.ring[vs, pos] = va
+        self.length[vs] += ~full
+        self.pos[vs] = pos = (pos + 1) % SMOOTHING_WINDOW
+        wrapped = vs[pos == 0]
+        if len(wrapped):
+            # Same left-to-right summation order as RepCounter's sum(ring)
+            total = self.ring[wrapped, 0].copy()
+            for k in range(1, SMOOTHING_WINDOW):
+                total += self.ring[wrapped, k]
+            self.sum[wrapped] = total
+        self.last_valid_angle[vs] = va
+        length = self.length[vs]
+        smoothed[valid] = np.where(length < 2, va, self.sum[vs] / length)
+        
+        # Debounced state machine
+        ok = ~np.isnan(smoothed)
+        down = self.down[slots]
+        with np.errstate(invalid='ignore'):
+            beyond = np.where(down, smoothed > up_thresh, smoothed < down_thresh) & ok
+        frames = np.where(beyond, self.frames_in_phase[slots] + 1, np.where(ok, 0, self.frames_in_phase[slots]))
+        transition = beyond & (frames >= self.min_frames_for_transition)
+        self.count[slots] += transition & down
+        self.down[slots] = down ^ transition
+        self.frames_in_phase[slots] = np.where(transition, 0, frames)
+        return self.count[slots]
 
 
 class SessionManager:
-    def __init__(self):
-        self._sessions: Dict[str, Dict[str, RepCounter]] = {}
+    """Per-process counters with idle-TTL and LRU eviction.
+    
+    Sessions are kept in least-recently-used order, so touching one on
+    update is O(1) and expired sessions are always at the front, where an
+    amortized sweep of at most SWEEP_BATCH entries per new session removes
+    them; `start_sweeper` also sweeps every SESSION_SWEEP_SECONDS. Callables
+    in `on_evict` get the id of every evicted session, so the other
+    per-session stores drop it too.
+    The store itself is guarded by a lock, since requests run predict_batch
+    on several threads; a counter is only ever updated by its own session.
+    """
+    
+    def __init__(self, ttl: float = SESSION_TTL_SECONDS, max_sessions: int = SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, Dict[str, RepCounter]]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+        self.journal = None  # app.journal.SessionJournal, with SESSION_JOURNAL_DIR
+        self.on_evict: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
     
     def get_counter(self, session_id: str, exercise: str) -> RepCounter:
-        if session_id not in self._sessions:
-            self._sessions[session_id] = {}
-        if exercise not in self._sessions[session_id]:
-            self._sessions[session_id][exercise] = RepCounter()
-        return self._sessions[session_id][exercise]
+        now = time.monotonic()
+        evicted = ()
+        with self._lock:
+            counters = self._sessions.get(session_id)
+            if counters is None:
+                counters = self._sessions[session_id] = {}
+                evicted = self._sweep(now)
+            else:
+                self._sessions.move_to_end(session_id)
+            self._last_seen[session_id] = now
+            counter = counters.get(exercise)
+            if counter is None:
+                counter = counters[exercise] = RepCounter()
+        self._notify(evicted)
+        return counter
+    
+    def _sweep(self, now: float) -> List[str]:
+        """Drop up to SWEEP_BATCH expired sessions and any excess ones; caller holds the lock."""
+        evicted = []
+        for _ in range(SWEEP_BATCH):
+            if not self._sessions:
+                break
+            oldest = next(iter(self._sessions))
+            if now - self._last_seen.get(oldest, now) < self.ttl:
+                break
+            evicted.append(self._evict(oldest))
+        while len(self._sessions) > self.max_sessions:
+            evicted.append(self._evict(next(iter(self._sessions))))
+        return evicted
+    
+    def _evict(self, session_id: str) -> str:
+        counters = self._sessions.pop(session_id, None)
+        self._last_seen.pop(session_id, None)
+        if counters is not None:
+            self.evictions += 1
+            if self.journal is not None:
+                self.journal.drop(session_id, counters)
+        return session_id
+    
+    def _notify(self, evicted: Iterable[str]):
+        """Run the on_evict callables, outside the lock (they take the other stores' locks)."""
+        for session_id in evicted:
+            for callback in self.on_evict:
+                callback(session_id)
     
-    def update(self, session_id: str, exercise: str, angle: float) -> int:
-        down, up = THRESHOLDS.get(exercise, (55, 160))
-        return self.get_counter(session_id, exercise).update(angle, down, up)
+    def sweep(self) -> int:
+        """Drop every expired session, SWEEP_BATCH per lock hold; returns how many were dropped."""
+        dropped = 0
+        while True:
+            with self._lock:
+                evicted = self._sweep(time.monotonic())
+            self._notify(evicted)
+            dropped += len(evicted)
+            if len(evicted) < SWEEP_BATCH:
+                return dropped
+    
+    def start_sweeper(self, interval: float = SESSION_SWEEP_SECONDS):
+        """Sweep every `interval` seconds on a daemon thread, so sessions expire without new traffic."""
+        if interval <= 0 or self._sweeper is not None:
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, args=(interval,), name="session-sweeper",
+                                         daemon=True)
+        self._sweeper.start()
+    
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._stop.set()
+            self._sweeper.join()
+            self._sweeper = None
+    
+    def _sweep_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"Session sweep failed: {type(e).__name__}: {e}")
+    
+    def update(self, session_id: str, exercise: str, angle: float,
+               thresholds: Optional[Tuple[float, float]] = None, min_count: int = 0,
+               restart_smoothing: bool = False) -> int:
+        """Feed one angle; `thresholds` (down, up) overrides THRESHOLDS,
+        `min_count` reps are credited first and `restart_smoothing` empties
+        the smoothing window before (see app.calibration)."""
+        down, up = thresholds or THRESHOLDS.get(exercise, (55, 160))
+        counter = self.get_counter(session_id, exercise)
+        count, phase = counter.count, counter.phase
+        if restart_smoothing:
+            counter.restart_smoothing()
+        if min_count:
+            counter.credit(min_count)
+        new_count = counter.update(angle, down, up)
+        if self.journal is not None and (new_count != count or counter.phase != phase):
+            self.journal.record(session_id, exercise, new_count, counter.phase)
+        return new_count
     
     def get_count(self, session_id: str, exercise: str) -> int:
-        if session_id in self._sessions and exercise in self._sessions[session_id]:
-            return self._sessions[session_id][exercise].count
-        return 0
+        counter = self._sessions.get(session_id, {}).get(exercise)
+        return counter.count if counter is not None else 0
     
     def reset(self, session_id: str):
-        if session_id in self._sessions:
-            del self._sessions[session_id]
+        with self._lock:
+            counters = self._sessions.pop(session_id, None)
+            self._last_seen.pop(session_id, None)
+        if counters is not None and self.journal is not None:
+            self.journal.drop(session_id, counters)
+    
+    def restore(self, entries: Iterable[Tuple[str, str, int, str]]):
+        """Recreate counters from (session_id, exercise, count, phase), e.g. recovered by app.journal."""
+        now = time.monotonic()
+        sessions, last_seen = self._sessions, self._last_seen
+        with self._lock:
+            for session_id, exercise, count, phase in entries:
+                counters = sessions.get(session_id)
+                if counters is None:
+                    counters = sessions[session_id] = {}
+                    last_seen[session_id] = now
+                counter = counters[exercise] = RepCounter()
+                counter.count = count
+                counter.phase = phase
+            evicted = [self._evict(next(iter(self._sessions))) for _ in range(len(self._sessions) - self.max_sessions)]
+        self._notify(evicted)
+    
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def stats(self) -> Dict[str, object]:
+        stats = {"backend": "memory", "live_sessions": len(self), "evictions": self.evictions,
+                 "max_sessions": self.max_sessions, "ttl_seconds": self.ttl}
+        if self.journal is not None:
+            stats["journal"] = self.journal.stats()
+        return stats
+
+
+def create_session_manager():
+    """Build the session store selected by SESSION_BACKEND."""
+    if SESSION_BACKEND == "shm":
+        from .shm_sessions import SharedSessionStore
+        return SharedSessionStore()
+    return SessionManager()
 
 
-sessions = SessionManager()
+sessions = create_session_manager()
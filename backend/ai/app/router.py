@@ -1,29 +1,147 @@
 """API endpoints."""
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import Optional
 
-from .schemas import AnalyzeRequest, AnalyzeResponse, ResetRequest, ResetResponse, HealthResponse
-from .infer import classifier
+from fastapi import APIRouter, HTTPException, Request, Response, WebSocket
+
+from .schemas import (
+    AnalyzeRequest, AnalyzeResponse, AnalyzeBatchRequest, AnalyzeBatchResponse, AnalyzePeopleRequest,
+    AnalyzePeopleResponse, AnalyzeRepsRequest, AnalyzeRepsResponse, PersonResult, ResetRequest, ResetResponse, HealthResponse, StatsResponse,
+)
+from . import metrics
+from .batcher import analyze_frame, analyze_frames, batcher
+from .cache import inference_cache
+from .executor import executor
+from .infer import classifier, reset_session, track_session_id, tracks
+from .preprocess import landmarks_to_array, people_to_array
 from .rep_counter import sessions
+from .stream import FrameStream
+from .windows import windows
+from .wire import CONTENT_TYPE, WireFormatError, decode_frame
 
 router = APIRouter()
 
 
+def _observe_parse(request: Request):
+    # Body read, routing and pydantic validation all happen before the handler runs
+    elapsed = metrics.request_elapsed(request.scope)
+    if elapsed is not None:
+        metrics.observe_stage("parse", elapsed)
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
-def analyze(req: AnalyzeRequest) -> AnalyzeResponse:
+async def analyze(req: AnalyzeRequest, request: Request) -> AnalyzeResponse:
+    _observe_parse(request)
     if not classifier.is_loaded:
         raise HTTPException(503, "Model not loaded")
     
-    exercise, confidence, rep_count = classifier.predict(
-        req.landmarks, req.session_id, req.exercise
-    )
+    with metrics.stage("decode"):
+        pts = landmarks_to_array(req.landmarks)
+    exercise, confidence, rep_count = await analyze_frame((pts, req.session_id, req.exercise))
+    return AnalyzeResponse(exercise=exercise, confidence=confidence, rep_count=rep_count)
+
+
+@router.post("/analyze_bin", response_model=AnalyzeResponse)
+async def analyze_bin(request: Request) -> AnalyzeResponse:
+    """/analyze for one frame in the binary format of app.wire."""
+    if request.headers.get("content-type", "").split(";")[0].strip() != CONTENT_TYPE:
+        raise HTTPException(415, f"Content-Type must be {CONTENT_TYPE}")
+    if not classifier.is_loaded:
+        raise HTTPException(503, "Model not loaded")
+    
+    body = await request.body()
+    _observe_parse(request)
+    try:
+        with metrics.stage("decode"):
+            frame = decode_frame(body)
+    except WireFormatError as e:
+        raise HTTPException(422, str(e))
+    exercise, confidence, rep_count = await analyze_frame(frame)
     return AnalyzeResponse(exercise=exercise, confidence=confidence, rep_count=rep_count)
 
 
+@router.post("/analyze_reps", response_model=AnalyzeRepsResponse)
+async def analyze_reps(req: AnalyzeRepsRequest, request: Request) -> AnalyzeRepsResponse:
+    """Rep counting for a fixed exercise; the classifier only runs every REPS_CONFIDENCE_EVERY frames."""
+    _observe_parse(request)
+    if classifier.reps_confidence_every > 0 and not classifier.is_loaded:
+        raise HTTPException(503, "Model not loaded")
+    
+    with metrics.stage("decode"):
+        pts = landmarks_to_array(req.landmarks)
+    if classifier.confidence_due(req.session_id):
+        # A sampled frame runs the model: off the event loop, like every other model call
+        confidence, rep_count, age = await asyncio.to_thread(classifier.count_reps, pts, req.session_id,
+                                                             req.exercise)
+    else:
+        # Inline: these frames cost a few microseconds, less than a hop to the thread pool
+        confidence, rep_count, age = classifier.count_reps(pts, req.session_id, req.exercise)
+    return AnalyzeRepsResponse(exercise=req.exercise, confidence=confidence, rep_count=rep_count, confidence_age=age)
+
+
+@router.websocket("/ws/analyze")
+async def analyze_stream(websocket: WebSocket, session_id: str, exercise: Optional[str] = None):
+    """Stream frames of one session; each result is pushed as a StreamResponse."""
+    await websocket.accept()
+    if not classifier.is_loaded:
+        await websocket.close(code=1013, reason="Model not loaded")
+        return
+    
+    await FrameStream(websocket, session_id, exercise or None).run()
+
+
+@router.post("/analyze_batch", response_model=AnalyzeBatchResponse)
+def analyze_batch(req: AnalyzeBatchRequest, request: Request) -> AnalyzeBatchResponse:
+    """Analyze frames from one or many sessions with a single model call."""
+    _observe_parse(request)
+    if not classifier.is_loaded:
+        raise HTTPException(503, "Model not loaded")
+    
+    with metrics.stage("decode"):
+        frames = [(landmarks_to_array(frame.landmarks), frame.session_id, frame.exercise) for frame in req.frames]
+    results = classifier.predict_batch(frames)
+    return AnalyzeBatchResponse(results=[
+        AnalyzeResponse(exercise=exercise, confidence=confidence, rep_count=rep_count)
+        for exercise, confidence, rep_count in results
+    ])
+
+
+@router.post("/analyze_people", response_model=AnalyzePeopleResponse)
+async def analyze_people(req: AnalyzePeopleRequest, request: Request) -> AnalyzePeopleResponse:
+    """Analyze everyone in one camera frame: one feature pass and one model call for all people.
+    
+    Each track_id counts reps in its own sub-session of req.session_id.
+    """
+    _observe_parse(request)
+    if not classifier.is_loaded:
+        raise HTTPException(503, "Model not loaded")
+    
+    with metrics.stage("decode"):
+        pts = people_to_array([person.landmarks for person in req.people])
+    frames = [(pts[k], track_session_id(req.session_id, person.track_id), person.exercise or req.exercise)
+              for k, person in enumerate(req.people)]
+    tracks.add(req.session_id, [person.track_id for person in req.people])
+    results = await analyze_frames(frames)
+    return AnalyzePeopleResponse(results=[
+        PersonResult(track_id=person.track_id, exercise=exercise, confidence=confidence, rep_count=rep_count)
+        for person, (exercise, confidence, rep_count) in zip(req.people, results)
+    ])
+
+
 @router.post("/reset", response_model=ResetResponse)
 def reset(req: ResetRequest) -> ResetResponse:
-    sessions.reset(req.session_id)
-    return ResetResponse(session_id=req.session_id)
+    """Reset one session, with every /analyze_people track of it; or only `track_id`."""
+    if req.track_id is None:
+        track_ids = tracks.pop(req.session_id)
+        session_id = req.session_id
+    else:
+        tracks.discard(req.session_id, req.track_id)
+        track_ids = [req.track_id]
+        session_id = track_session_id(req.session_id, req.track_id)
+    for target in {session_id, *(track_session_id(req.session_id, t) for t in track_ids)}:
+        reset_session(target)
+    return ResetResponse(session_id=session_id, track_ids=track_ids)
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -35,3 +153,40 @@ def health() -> HealthResponse:
         model_loaded=classifier.is_loaded,
         model_status=model_status
     )
+
+
+@router.get("/stats", response_model=StatsResponse)
+def stats() -> StatsResponse:
+    """Runtime counters for tuning throughput against latency."""
+    return StatsResponse(batcher=batcher.stats(), sessions=sessions.stats(),
+                         inference_cache=inference_cache.stats(), executor=executor.stats())
+
+
+metrics.registry.gauge("live_sessions", "Rep counter sessions held by this worker (host-wide for shm)", lambda: len(sessions))
+metrics.registry.gauge("session_evictions_total", "Sessions evicted by TTL or capacity",
+                       lambda: sessions.stats()["evictions"], kind="counter")
+metrics.registry.gauge("session_journal_dropped_total", "Session journal changes dropped while writes kept failing",
+                       lambda: sessions.journal.dropped if getattr(sessions, "journal", None) is not None else 0,
+                       kind="counter")
+metrics.registry.gauge("feature_windows", "Sessions with a rolling feature window", lambda: len(windows))
+metrics.registry.gauge("inference_cache_hits_total", "Frames served cached class probabilities",
+                       lambda: inference_cache.hits, kind="counter")
+metrics.registry.gauge("inference_cache_misses_total", "Frames that ran predict_proba while the cache is on",
+                       lambda: inference_cache.misses, kind="counter")
+metrics.registry.gauge("executor_fallbacks_total", "Batches predicted in-process although the inference executor is on",
+                       lambda: executor.fallbacks, kind="counter")
+metrics.registry.gauge("batcher_queue_depth", "Frames waiting for the micro-batcher",
+                       lambda: batcher.stats()["queue_depth"])
+metrics.registry.info("model", "Loaded model version and backend", lambda: {
+    "backend": classifier.backend if classifier.is_loaded else "none",
+    "version": classifier.models.active.version if classifier.is_loaded else "none",
+    "loaded": str(classifier.is_loaded).lower(),
+})
+
+
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics() -> Response:
+    """Prometheus text exposition of this worker's metrics."""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(404, "Metrics are disabled (METRICS_ENABLED=0)")
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,7 +1,12 @@
 """Request/response schemas."""
 
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, field_validator
+
+# Upper bound on frames per /analyze_batch request
+MAX_BATCH_FRAMES = 256
+# Upper bound on people per /analyze_people request
+MAX_PEOPLE = 64
 
 
 class Landmark(BaseModel):
@@ -22,12 +27,78 @@ class AnalyzeResponse(BaseModel):
     rep_count: int
 
 
+class AnalyzeRepsRequest(BaseModel):
+    landmarks: List[Landmark] = Field(..., min_length=33, max_length=33)
+    session_id: str
+    exercise: str
+
+
+class AnalyzeRepsResponse(BaseModel):
+    exercise: str
+    confidence: Optional[float] = None  # From the last frame the classifier ran on
+    rep_count: int
+    confidence_age: Optional[int] = None  # Frames since that frame
+
+
+class StreamFrame(BaseModel):
+    # /ws/analyze text message; session and exercise are bound at connect time
+    landmarks: List[Landmark] = Field(..., min_length=33, max_length=33)
+
+
+class StreamResponse(AnalyzeResponse):
+    frame: int  # Sequence number (1-based) of the frame this result is for
+    dropped: int  # Frames skipped so far because newer ones arrived first
+
+
+class AnalyzeBatchRequest(BaseModel):
+    # Frames of the same session must be ordered oldest first
+    frames: List[AnalyzeRequest] = Field(..., min_length=1, max_length=MAX_BATCH_FRAMES)
+
+
+class AnalyzeBatchResponse(BaseModel):
+    results: List[AnalyzeResponse]
+
+
+class Person(BaseModel):
+    # Stable across frames for the same person; their reps are counted in session "<session_id>#<track_id>"
+    track_id: str = Field(..., min_length=1)
+    landmarks: List[Landmark] = Field(..., min_length=33, max_length=33)
+    exercise: Optional[str] = None  # Overrides the request's exercise for this person
+
+
+class AnalyzePeopleRequest(BaseModel):
+    # Everyone tracked in one camera frame
+    session_id: str
+    exercise: Optional[str] = None
+    people: List[Person] = Field(..., min_length=1, max_length=MAX_PEOPLE)
+
+    @field_validator("people")
+    @classmethod
+    def unique_tracks(cls, people: List[Person]) -> List[Person]:
+        seen = set()
+        for person in people:
+            if person.track_id in seen:
+                raise ValueError(f"track_id {person.track_id!r} appears more than once")
+            seen.add(person.track_id)
+        return people
+
+
+class PersonResult(AnalyzeResponse):
+    track_id: str
+
+
+class AnalyzePeopleResponse(BaseModel):
+    results: List[PersonResult]  # In request order
+
+
 class ResetRequest(BaseModel):
     session_id: str
+    track_id: Optional[str] = None  # Reset only this person of an /analyze_people session
 
 
 class ResetResponse(BaseModel):
     session_id: str
+    track_ids: List[str] = []  # /analyze_people tracks reset along with a session-level reset
     status: str = "reset"
 
 
@@ -35,3 +106,29 @@ class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     model_status: Optional[str] = None  # "loaded", "not_loaded", "loading"
+
+
+class StatsResponse(BaseModel):
+    batcher: Dict[str, Any]
+    sessions: Dict[str, Any]
+    inference_cache: Dict[str, Any]
+    executor: Dict[str, Any]
+
+
+class ProfileStatus(BaseModel):
+    pid: int
+    running: bool
+    until: Optional[float] = None  # Unix time the current run stops
+    last_profile: Optional[str] = None  # Collapsed-stack file of the last finished run
+    last_samples: int = 0
+    last_error: Optional[str] = None  # Why the last run wrote no file
+
+
+class ModelsStatus(BaseModel):
+    active: Optional[Dict[str, Any]] = None
+    previous: Optional[Dict[str, Any]] = None  # Target of /admin/models/rollback
+    candidate: Optional[Dict[str, Any]] = None
+    state: str  # Candidate loading: idle, loading, ready or failed
+    error: Optional[str] = None
+    shadow_fraction: float
+    shadow: Dict[str, Any]  # Latency of both versions and agreement on shadow-scored batches
@@ -0,0 +1,213 @@
+"""Rep counter state shared between worker processes.
+
+Gunicorn runs several workers, and consecutive frames of one session can
+land on different processes. `SharedSessionStore` keeps every counter in
+a fixed-size table of records in a memory-mapped file (on /dev/shm by
+default), so all workers on a host see the same state.
+
+Each record is keyed by a 64-bit hash of (session_id, exercise) and placed
+by open addressing within a short probe window. Record updates take a
+POSIX byte-range lock on the slot (across processes) plus a striped thread
+lock (fcntl locks are per process, not per thread).
+"""
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .rep_counter import SMOOTHING_WINDOW, THRESHOLDS, RepCounter
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", os.path.join(_DEFAULT_DIR, "olympose-sessions"))
+SESSION_STORE_SLOTS = int(os.environ.get("SESSION_STORE_SLOTS", "65536"))
+
+# Slots searched for a key before the least recently used one is evicted
+PROBE_WINDOW = 16
+
+EMPTY = 0
+DELETED = 1
+
+RECORD = np.dtype([
+    ("key", "<u8"),
+    ("session", "<u8"),
+    ("last_seen", "<f8"),
+    ("last_valid_angle", "<f8"),  # NaN when the counter has no valid angle yet
+    ("history", "<f8", (SMOOTHING_WINDOW,)),  # oldest first
+    ("count", "<i4"),
+    ("frames_in_phase", "<i4"),
+    ("history_len", "<i1"),
+    ("phase", "<i1"),  # 0 = up, 1 = down
+], align=True)
+
+_MAGIC = b"OPSESS01"
+_HEADER = np.dtype([("magic", "S8"), ("slots", "<u8"), ("record_size", "<u8")])
+_HEADER_SIZE = 64
+_PHASES = ("up", "down")
+_THREAD_STRIPES = 64
+
+
+def _hash(*parts: str) -> int:
+    digest = hashlib.blake2b("\0".join(parts).encode(), digest_size=8).digest()
+    # Values below 2 are reserved for EMPTY / DELETED
+    return max(int.from_bytes(digest, "little"), 2)
+
+
+class SharedSessionStore:
+    """Drop-in replacement for SessionManager backed by a shared memory-mapped table."""
+
+    def __init__(self, path: str = SESSION_STORE_PATH, slots: int = SESSION_STORE_SLOTS):
+        self.path = Path(path)
+        self.slots = slots
+        self.evictions = 0
+        size = _HEADER_SIZE + slots * RECORD.itemsize
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        # Whole-file flock serializes initialization; independent of the lockf slot locks below
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._mmap = mmap.mmap(self._fd, size)
+            header = np.frombuffer(self._mmap, dtype=_HEADER, count=1)
+            if header["magic"][0] == b"":
+                header[0] = (_MAGIC, slots, RECORD.itemsize)
+            elif header["magic"][0] != _MAGIC or header["slots"][0] != slots \
+                    or header["record_size"][0] != RECORD.itemsize:
+                raise RuntimeError(f"Session store {self.path} has an incompatible layout; remove it or change SESSION_STORE_PATH")
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self._table = np.frombuffer(self._mmap, dtype=RECORD, count=slots, offset=_HEADER_SIZE)
+        self._keys = self._table["key"]
+        self._slot_locks = [threading.Lock() for _ in range(_THREAD_STRIPES)]
+        self._chain_locks = [threading.Lock() for _ in range(_THREAD_STRIPES)]
+        logger.info(f"Shared session store at {self.path} ({slots} slots, {size / 1e6:.1f} MB)")
+
+    @contextmanager
+    def _locked(self, slot: int, chain: bool = False):
+        """Lock a record, or with chain=True the probe chain starting at slot (for insertion).
+        
+        Chain locks are always taken before record locks, never the other way round.
+        """
+        # Byte offsets [0, slots) lock records, [slots, 2 * slots) lock probe chains
+        offset = slot + self.slots if chain else slot
+        stripes = self._chain_locks if chain else self._slot_locks
+        with stripes[slot % _THREAD_STRIPES]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, offset)
+
+    def _window(self, key: int) -> np.ndarray:
+        home = key % self.slots
+        return (home + np.arange(PROBE_WINDOW)) % self.slots
+
+    def _find(self, key: int) -> Optional[int]:
+        window = self._window(key)
+        hits = window[self._keys[window] == key]
+        return int(hits[0]) if len(hits) else None
+
+    def _claim(self, key: int, session: int) -> int:
+        """Return the slot holding key, inserting a fresh record if needed."""
+        window = self._window(key)
+        with self._locked(int(window[0]), chain=True):
+            while True:
+                slot = self._find(key)
+                if slot is not None:
+                    return slot
+                keys = self._keys[window]
+                free = window[keys <= DELETED]
+                slot = int(free[0]) if len(free) else int(window[np.argmin(self._table["last_seen"][window])])
+                seen = self._keys[slot]
+                with self._locked(slot):
+                    # Overlapping chains may race for the same slot
+                    if self._keys[slot] != seen:
+                        continue
+                    if seen > DELETED:
+                        self.evictions += 1
+                    self._table[slot] = (key, session, time.time(), np.nan, np.zeros(SMOOTHING_WINDOW), 0, 0, 0, 0)
+                    return slot
+
+    def _load(self, slot: int) -> RepCounter:
+        rec = self._table[slot]
+        counter = RepCounter()
+        counter.count = int(rec["count"])
+        counter.phase = _PHASES[rec["phase"]]
+        counter.frames_in_phase = int(rec["frames_in_phase"])
+        counter.last_valid_angle = None if np.isnan(rec["last_valid_angle"]) else float(rec["last_valid_angle"])
+        counter.set_history(rec["history"][:rec["history_len"]].tolist())
+        return counter
+
+    def _store(self, slot: int, counter: RepCounter):
+        rec = self._table[slot]
+        history = counter.angle_history
+        rec["count"] = counter.count
+        rec["phase"] = _PHASES.index(counter.phase)
+        rec["frames_in_phase"] = counter.frames_in_phase
+        rec["last_valid_angle"] = np.nan if counter.last_valid_angle is None else counter.last_valid_angle
+        rec["history"][:len(history)] = history
+        rec["history_len"] = len(history)
+        rec["last_seen"] = time.time()
+
+    def update(self, session_id: str, exercise: str, angle: float,
+               thresholds: Optional[Tuple[float, float]] = None, min_count: int = 0,
+               restart_smoothing: bool = False) -> int:
+        """Feed one angle; `thresholds` (down, up) overrides THRESHOLDS,
+        `min_count` reps are credited first and `restart_smoothing` empties
+        the smoothing window before (see app.calibration)."""
+        down, up = thresholds or THRESHOLDS.get(exercise, (55, 160))
+        key = _hash(session_id, exercise)
+        while True:
+            slot = self._find(key)
+            if slot is None:
+                slot = self._claim(key, _hash(session_id))
+            with self._locked(slot):
+                # Another process may have evicted or reset the slot since we found it
+                if self._keys[slot] != key:
+                    continue
+                counter = self._load(slot)
+                if restart_smoothing:
+                    counter.restart_smoothing()
+                if min_count:
+                    counter.credit(min_count)
+                count = counter.update(angle, down, up)
+                self._store(slot, counter)
+                return count
+
+    def get_count(self, session_id: str, exercise: str) -> int:
+        slot = self._find(_hash(session_id, exercise))
+        return int(self._table["count"][slot]) if slot is not None else 0
+
+    def reset(self, session_id: str):
+        session = _hash(session_id)
+        for slot in np.flatnonzero(self._table["session"] == session):
+            with self._locked(int(slot)):
+                if self._table["session"][slot] == session:
+                    self._keys[slot] = DELETED
+                    self._table["session"][slot] = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._keys > DELETED))
+
+    def stats(self) -> Dict[str, object]:
+        # Counts (session, exercise) records host-wide; evictions are this worker's only
+        return {"backend": "shm", "live_sessions": len(self), "evictions": self.evictions,
+                "max_sessions": self.slots}
+
+    def close(self):
+        self._table = self._keys = None
+        self._mmap.close()
+        os.close(self._fd)
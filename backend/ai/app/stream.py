@@ -0,0 +1,130 @@
+"""Continuous pose analysis over a WebSocket (/ws/analyze).
+
+The session and exercise are bound when the socket connects; after that
+each message is just one frame of landmarks, either a JSON `StreamFrame`
+or headerless float32/float16 values (see `app.wire`). A reader task keeps
+only the newest unprocessed frame, so when inference falls behind the
+camera, stale frames are dropped instead of queueing up latency.
+"""
+
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from .batcher import analyze_frame
+from .preprocess import landmarks_to_array
+from .schemas import StreamFrame, StreamResponse
+from .wire import WireFormatError, decode_landmarks, landmarks_dtype
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrame:
+    """Single-slot mailbox: put() overwrites a frame nobody has taken yet."""
+
+    def __init__(self):
+        self._item: Optional[Tuple[np.ndarray, int]] = None
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, pts: np.ndarray, seq: int):
+        if self._item is not None:
+            self.dropped += 1
+        self._item = (pts, seq)
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self) -> Optional[Tuple[np.ndarray, int]]:
+        """Next frame, or None once closed."""
+        while self._item is None:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        item, self._item = self._item, None
+        return item
+
+
+def parse_message(message: dict) -> np.ndarray:
+    if message.get("bytes") is not None:
+        payload = message["bytes"]
+        return decode_landmarks(payload, landmarks_dtype(len(payload)))
+    return landmarks_to_array(StreamFrame.model_validate_json(message["text"]).landmarks)
+
+
+class FrameStream:
+    """One /ws/analyze connection."""
+
+    def __init__(self, websocket: WebSocket, session_id: str, exercise: Optional[str]):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.exercise = exercise
+        self.frames = LatestFrame()
+        self._send_lock = asyncio.Lock()
+
+    async def _send(self, data: dict):
+        # Errors from the reader and results from the processor share the socket
+        async with self._send_lock:
+            await self.websocket.send_json(data)
+
+    async def _read(self):
+        seq = 0
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                seq += 1
+                try:
+                    self.frames.put(parse_message(message), seq)
+                except (WireFormatError, ValidationError, ValueError) as e:
+                    await self._send({"frame": seq, "error": str(e)})
+        finally:
+            self.frames.close()
+
+    async def _process(self):
+        while True:
+            item = await self.frames.get()
+            if item is None:
+                return
+            pts, seq = item
+            try:
+                exercise, confidence, rep_count = await analyze_frame((pts, self.session_id, self.exercise))
+            except Exception as e:
+                # Report it and keep streaming: later frames can succeed (e.g. once a model is loaded)
+                logger.warning(f"Stream frame {seq} of session {self.session_id} failed: {e}")
+                await self._send({"frame": seq, "error": f"Analysis failed: {e}"})
+                continue
+            await self._send(StreamResponse(
+                exercise=exercise, confidence=confidence, rep_count=rep_count,
+                frame=seq, dropped=self.frames.dropped,
+            ).model_dump())
+
+    async def run(self):
+        reader = asyncio.create_task(self._read())
+        processor = asyncio.create_task(self._process())
+        try:
+            done, _ = await asyncio.wait((reader, processor), return_when=asyncio.FIRST_COMPLETED)
+            if processor not in done:
+                # The client hung up: the mailbox is closed, so this only finishes the frame in hand
+                await asyncio.wait((processor,))
+        finally:
+            reader.cancel()
+            processor.cancel()
+            read_error, process_error = await asyncio.gather(reader, processor, return_exceptions=True)
+        for error in (read_error, process_error):
+            if isinstance(error, Exception) and not isinstance(error, WebSocketDisconnect):
+                logger.warning(f"Stream for session {self.session_id} ended with error: {error}")
+        if isinstance(process_error, Exception) and not isinstance(process_error, WebSocketDisconnect):
+            try:
+                await self.websocket.close(code=1011, reason="Internal error")
+            except Exception:
+                pass  # Already closed by the client
@@ -0,0 +1,178 @@
+"""Per-session rolling-window feature statistics.
+
+The models were trained on windowed `<feature>_mean` / `<feature>_std`
+columns. `FeatureWindows` keeps the last `window_size` frames of features
+for every session and maintains their mean and variance incrementally
+(sliding Welford update), so each frame costs O(features) no matter how
+long the window is.
+
+Windows live in each worker process's memory, also with SESSION_BACKEND=shm;
+app.main warns when that store is used with several workers.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+from .preprocess import FEATURE_NAMES
+from .rep_counter import SESSION_MAX, SESSION_TTL_SECONDS, SWEEP_BATCH
+
+# Used when feature_metadata.json does not record the training window ("window_size", "std_ddof")
+FEATURE_WINDOW = int(os.environ.get("FEATURE_WINDOW", "30"))
+# pandas' default: sample standard deviation
+FEATURE_STD_DDOF = int(os.environ.get("FEATURE_STD_DDOF", "1"))
+
+N_FEATURES = len(FEATURE_NAMES)
+
+
+class RollingWindow:
+    """Fixed-size ring of feature rows with running mean and sum of squared deviations."""
+
+    __slots__ = ("ring", "pos", "n", "mean", "m2", "last_seen")
+
+    def __init__(self, window_size: int):
+        self.ring = np.zeros((window_size, N_FEATURES))
+        self.pos = 0
+        self.n = 0
+        self.mean = np.zeros(N_FEATURES)
+        self.m2 = np.zeros(N_FEATURES)
+        self.last_seen = 0.0
+
+    def push(self, row: np.ndarray):
+        size = len(self.ring)
+        if self.n < size:
+            self.n += 1
+            delta = row - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (row - self.mean)
+        else:
+            old = self.ring[self.pos]
+            new_mean = self.mean + (row - old) / size
+            self.m2 += (row - old) * (row - new_mean + old - self.mean)
+            self.mean = new_mean
+        self.ring[self.pos] = row
+        self.pos = (self.pos + 1) % size
+        if self.pos == 0:
+            # Recompute from the ring once per wrap (amortized O(1)) so rounding cannot drift
+            self.mean = self.ring.mean(axis=0)
+            self.m2 = ((self.ring - self.mean) ** 2).sum(axis=0)
+
+    def std(self, ddof: int) -> np.ndarray:
+        if self.n <= ddof:
+            return np.zeros(N_FEATURES)
+        return np.sqrt(np.maximum(self.m2, 0.0) / (self.n - ddof))
+
+    def rows(self) -> np.ndarray:
+        """Rows in the window, oldest first."""
+        if self.n < len(self.ring):
+            return self.ring[:self.n]
+        return np.roll(self.ring, -self.pos, axis=0)
+
+    def load(self, rows: np.ndarray):
+        """Replace the window with the last window_size of `rows` (oldest first)."""
+        rows = rows[-len(self.ring):]
+        self.n = len(rows)
+        self.ring[:self.n] = rows
+        self.pos = self.n % len(self.ring)
+        self.mean = rows.mean(axis=0) if self.n else np.zeros(N_FEATURES)
+        self.m2 = ((rows - self.mean) ** 2).sum(axis=0)
+
+
+class FeatureWindows:
+    """Rolling windows for all sessions, bounded like SessionManager (idle TTL + LRU).
+
+    The session map is guarded by a lock (requests push from several
+    threads); a window's own arithmetic runs outside it.
+    """
+
+    def __init__(self, window_size: int = FEATURE_WINDOW, ddof: int = FEATURE_STD_DDOF,
+                 ttl: float = SESSION_TTL_SECONDS, max_sessions: int = SESSION_MAX):
+        self.window_size = window_size
+        self.ddof = ddof
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self.evictions = 0
+        self._windows: "OrderedDict[str, RollingWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, window_size: int, ddof: int):
+        """Set the window to match training; drops existing windows if it changes."""
+        with self._lock:
+            if (window_size, ddof) != (self.window_size, self.ddof):
+                self._windows.clear()
+            self.window_size = window_size
+            self.ddof = ddof
+
+    def _get(self, session_id: str, now: float) -> RollingWindow:
+        with self._lock:
+            window = self._windows.get(session_id)
+            if window is None:
+                window = self._windows[session_id] = RollingWindow(self.window_size)
+                self._sweep(now)
+            else:
+                self._windows.move_to_end(session_id)
+            window.last_seen = now
+            return window
+
+    def push(self, session_id: str, feats: np.ndarray) -> np.ndarray:
+        """Add one compute_features row and return the session's [means..., stds...] row.
+
+        NaN features (landmarks not visible) enter the window as 0.0, the
+        same value the model saw for them before windowing.
+        """
+        window = self._get(session_id, time.monotonic())
+        window.push(np.where(np.isnan(feats), 0.0, feats))
+        return np.concatenate([window.mean, window.std(self.ddof)])
+
+    def push_many(self, session_id: str, feats: np.ndarray) -> np.ndarray:
+        """`push` for (N, features) consecutive rows of one session, vectorized over the rows.
+
+        Returns (N, 2 * features) statistics rows; equal to N push calls up
+        to floating-point rounding.
+        """
+        window = self._get(session_id, time.monotonic())
+        if not len(feats):
+            return np.empty((0, 2 * N_FEATURES))
+
+        size = len(window.ring)
+        history = window.rows()
+        rows = np.concatenate([history, np.where(np.isnan(feats), 0.0, feats)])
+        # NaN padding marks window slots before the session's first frame
+        padded = np.concatenate([np.full((size - 1, N_FEATURES), np.nan), rows])
+        views = np.lib.stride_tricks.sliding_window_view(padded, size, axis=0)[len(history):]
+        count = np.minimum(np.arange(len(history), len(rows)) + 1, size)[:, None]
+        mean = np.nansum(views, axis=2) / count
+        m2 = np.nansum((views - mean[:, :, None]) ** 2, axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.where(count > self.ddof, np.sqrt(m2 / (count - self.ddof)), 0.0)
+        window.load(rows)
+        return np.concatenate([mean, std], axis=1)
+
+    def _sweep(self, now: float):
+        """Drop expired and excess windows; caller holds the lock."""
+        for _ in range(SWEEP_BATCH):
+            oldest = next(iter(self._windows.values()))
+            if now - oldest.last_seen < self.ttl or oldest.last_seen == 0.0:
+                break
+            self._windows.popitem(last=False)
+            self.evictions += 1
+        while len(self._windows) > self.max_sessions:
+            self._windows.popitem(last=False)
+            self.evictions += 1
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._windows.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def stats(self) -> Dict[str, object]:
+        return {"window_size": self.window_size, "live_sessions": len(self), "evictions": self.evictions}
+
+
+windows = FeatureWindows()
@@ -0,0 +1,92 @@
+"""Compact binary landmark format for /analyze_bin.
+
+One frame per request body (little-endian):
+
+    offset  size  field
+    0       4     magic b"OPLM"
+    4       1     version (1)
+    5       1     dtype: 0 = float32, 1 = float16
+    6       2     session_id length in bytes (uint16)
+    8       2     exercise length in bytes (uint16, 0 = auto-detect)
+    10      ...   session_id, then exercise (UTF-8)
+    ...     ...   33 x 3 values, [x, y, visibility] per landmark
+
+A float32 frame with a 36-character session id is 442 bytes, against about
+2.5 kB of JSON. Bounds are the same as the `Landmark` schema: every value in
+[0, 1].
+
+On /ws/analyze the session is bound at connect time, so binary messages
+carry only the values: 396 bytes of float32 or 198 bytes of float16.
+"""
+
+import struct
+from typing import Optional
+
+import numpy as np
+
+from .infer import Frame
+
+MAGIC = b"OPLM"
+VERSION = 1
+CONTENT_TYPE = "application/octet-stream"
+
+N_LANDMARKS = 33
+DTYPES = (np.dtype("<f4"), np.dtype("<f2"))
+
+_HEADER = struct.Struct("<4sBBHH")
+
+
+class WireFormatError(ValueError):
+    """Malformed or out-of-range binary frame."""
+
+
+def encode_frame(pts: np.ndarray, session_id: str, exercise: Optional[str] = None,
+                 dtype: np.dtype = DTYPES[0]) -> bytes:
+    """Pack a (33, 3) [x, y, visibility] array into a binary frame."""
+    dtype = np.dtype(dtype).newbyteorder("<")
+    session = session_id.encode()
+    ex = (exercise or "").encode()
+    header = _HEADER.pack(MAGIC, VERSION, DTYPES.index(dtype), len(session), len(ex))
+    return header + session + ex + np.ascontiguousarray(pts, dtype=dtype).tobytes()
+
+
+def decode_landmarks(payload: bytes, dtype: np.dtype, offset: int = 0) -> np.ndarray:
+    """View 33 x 3 values at offset as a (33, 3) array after checking their bounds."""
+    pts = np.frombuffer(payload, dtype=dtype, count=N_LANDMARKS * 3, offset=offset).reshape(N_LANDMARKS, 3)
+    # One pass covers x, y and visibility; NaN fails both comparisons
+    if not ((pts >= 0.0) & (pts <= 1.0)).all():
+        raise WireFormatError("Landmark values must be within [0, 1]")
+    return pts
+
+
+def landmarks_dtype(size: int) -> np.dtype:
+    """Dtype of a headerless message of `size` bytes."""
+    for dtype in DTYPES:
+        if size == N_LANDMARKS * 3 * dtype.itemsize:
+            return dtype
+    raise WireFormatError(f"Expected {N_LANDMARKS} x 3 float32 or float16 values, got {size} bytes")
+
+
+def decode_frame(payload: bytes) -> Frame:
+    """Unpack a binary frame into (landmarks, session_id, exercise) without copying the values."""
+    if len(payload) < _HEADER.size:
+        raise WireFormatError("Frame shorter than header")
+    magic, version, dtype_code, session_len, exercise_len = _HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise WireFormatError("Unknown frame format or version")
+    if dtype_code >= len(DTYPES):
+        raise WireFormatError(f"Unknown dtype code {dtype_code}")
+    dtype = DTYPES[dtype_code]
+
+    offset = _HEADER.size + session_len + exercise_len
+    if len(payload) != offset + N_LANDMARKS * 3 * dtype.itemsize:
+        raise WireFormatError(f"Expected {N_LANDMARKS} x 3 {dtype.name} values after the header")
+    try:
+        session_id = payload[_HEADER.size:_HEADER.size + session_len].decode()
+        exercise = payload[_HEADER.size + session_len:offset].decode() or None
+    except UnicodeDecodeError as e:
+        raise WireFormatError(f"Invalid UTF-8 in header: {e}") from e
+    if not session_id:
+        raise WireFormatError("Empty session_id")
+
+    return decode_landmarks(payload, dtype, offset), session_id, exercise
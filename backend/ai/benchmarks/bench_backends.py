@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Inference backend benchmark.
+
+For every model file in MODELS_DIR, compiles it into a CompiledEnsemble,
+checks probability parity against the library model (on the probe rows and
+on a 4096-row batch, which the compiled model scores in dense blocks) and
+compares predict_proba latency at batch sizes 1, 32, 256, 1024 and 4096,
+also for the default MODEL_BACKEND=auto (compiled up to one dense block,
+library model above).
+
+Fails when parity is off, or when one predict_proba call on the largest
+batch is more than LARGE_BATCH_TOL times slower than scoring it in dense
+blocks of DENSE_SPLIT_LIMIT // nodes rows, i.e. when large batches fall off
+the fast path.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_backends.py
+"""
+
+import joblib
+import numpy as np
+
+from common import timeit
+
+from app.compiled import DENSE_SPLIT_LIMIT, HybridPredictor, compile_model, parity_error, probe_inputs
+from app.infer import COMPILED_PARITY_TOL, MODELS_DIR
+
+MODEL_FILES = ["xgb_enhanced.pkl", "rf_enhanced.pkl", "rf_baseline.pkl"]
+BATCH_SIZES = (1, 32, 256, 1024, 4096)
+LARGE_BATCH_TOL = 1.25
+
+
+def best_interleaved(a, b, repeat: int = 10):
+    """Best wall times of a and b, alternating the two calls so load changes hit both alike."""
+    best_a = best_b = float("inf")
+    for _ in range(repeat):
+        best_a = min(best_a, timeit(a, repeat=1))
+        best_b = min(best_b, timeit(b, repeat=1))
+    return best_a, best_b
+
+
+def main():
+    failed = False
+    print(f"{'model':<18}{'batch':>7}{'library us/row':>16}{'compiled us/row':>17}{'speedup':>9}{'auto us/row':>13}")
+    for name in MODEL_FILES:
+        path = MODELS_DIR / name
+        if not path.exists():
+            continue
+        model = joblib.load(path)
+        compiled = compile_model(model)
+        n_features = model.n_features_in_
+        X = probe_inputs(compiled, n_features, n=max(BATCH_SIZES))
+        error = max(parity_error(model, compiled, n_features),
+                    float(np.abs(model.predict_proba(X) - compiled.predict_proba(X)).max()))
+        failed |= error > COMPILED_PARITY_TOL
+        print(f"{name}: {compiled.n_trees} trees, {compiled.n_nodes} nodes, depth {compiled.max_depth}, "
+              f"max |dp| = {error:.2e}")
+
+        hybrid = HybridPredictor(compiled, model)
+
+        def per_row(predict_proba, size):
+            batch = X[:size]
+            return timeit(lambda: predict_proba(batch), number=max(1, 200 // size)) / size
+
+        for size in BATCH_SIZES:
+            lib, comp = per_row(model.predict_proba, size), per_row(compiled.predict_proba, size)
+            auto = per_row(hybrid.predict_proba, size)
+            print(f"{'':<18}{size:>7}{lib * 1e6:>16.1f}{comp * 1e6:>17.1f}{lib / comp:>8.1f}x{auto * 1e6:>13.1f}")
+
+        # Large batches must not be slower than scoring them one dense block at a time
+        block = max(1, DENSE_SPLIT_LIMIT // compiled.n_nodes)
+        large = X[:max(BATCH_SIZES)]
+        one_call, by_block = best_interleaved(
+            lambda: compiled.predict_proba(large),
+            lambda: [compiled.predict_proba(large[i:i + block]) for i in range(0, len(large), block)],
+        )
+        ok = one_call <= LARGE_BATCH_TOL * by_block
+        failed |= not ok
+        print(f"{'':<18}{len(large)} rows: {one_call / len(large) * 1e6:.1f} us/row in one call, "
+              f"{by_block / len(large) * 1e6:.1f} in {block}-row dense blocks ({'ok' if ok else 'FAIL'}, "
+              f"limit {LARGE_BATCH_TOL}x)")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
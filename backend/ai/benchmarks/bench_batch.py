@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Batched inference benchmark.
+
+Checks that `Classifier.predict_batch` returns the same per-frame results
+as one `Classifier.predict` call per frame (the /analyze path), then
+compares per-frame cost for batches of interleaved sessions.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_batch.py
+"""
+
+import numpy as np
+
+from common import load_classifier, synthetic_frames, timeit, to_landmarks
+
+from app.preprocess import landmarks_to_array
+from app.rep_counter import sessions
+
+N_SESSIONS = 8
+
+
+def make_frames(frames: np.ndarray, prefix: str):
+    """Interleave frames round-robin across N_SESSIONS sessions."""
+    return [(frame, f"{prefix}_{i % N_SESSIONS}", None if i % 2 else "squats") for i, frame in enumerate(frames)]
+
+
+def check_parity(classifier, frames: np.ndarray) -> int:
+    single = [
+        classifier.predict(to_landmarks(pts), session_id, exercise)
+        for pts, session_id, exercise in make_frames(frames, "single")
+    ]
+    batched = classifier.predict_batch([
+        (landmarks_to_array(to_landmarks(pts)), session_id, exercise)
+        for pts, session_id, exercise in make_frames(frames, "batched")
+    ])
+    return sum(a != b for a, b in zip(single, batched))
+
+
+def main():
+    classifier = load_classifier()
+    frames = synthetic_frames(1024, seed=1)
+
+    mismatches = check_parity(classifier, frames[:256])
+    print(f"parity: {mismatches} mismatching results over 256 frames")
+
+    print(f"{'batch size':>10}{'us/frame':>12}")
+    for size in (1, 8, 32, 128, 256):
+        batch = make_frames(frames[:size], f"bench_{size}")
+        secs = timeit(lambda: classifier.predict_batch(batch), number=max(1, 256 // size))
+        print(f"{size:>10}{secs / size * 1e6:>12.1f}")
+
+    for i in range(N_SESSIONS):
+        for prefix in ("single", "batched"):
+            sessions.reset(f"{prefix}_{i}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
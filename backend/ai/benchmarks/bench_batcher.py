@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Micro-batching load test.
+
+Drives /analyze in-process through the ASGI app with many concurrent
+clients, once with micro-batching off and once per window size, and
+reports throughput, p50/p99 latency and the batcher's own counters.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_batcher.py [--clients 64] [--frames 20]
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from common import load_classifier, synthetic_frames
+
+from app.batcher import batcher
+from app.main import app
+
+
+async def client_loop(client: httpx.AsyncClient, session_id: str, payloads, latencies):
+    for landmarks in payloads:
+        t0 = time.perf_counter()
+        resp = await client.post("/analyze", json={"landmarks": landmarks, "session_id": session_id})
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - t0)
+
+
+async def run(window_ms: float, clients: int, frames_per_client: int, payloads):
+    batcher.__init__(window_ms=window_ms)
+    if window_ms > 0:
+        batcher.start()
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*[
+            client_loop(client, f"bench_{window_ms}_{c}", payloads[:frames_per_client], latencies)
+            for c in range(clients)
+        ])
+        elapsed = time.perf_counter() - t0
+    stats = batcher.stats()
+    await batcher.stop()
+    lat = np.array(latencies) * 1000.0
+    label = "off" if window_ms <= 0 else f"{window_ms:g}ms"
+    avg_batch = stats["frames"] / stats["batches"] if stats["batches"] else 1.0
+    print(f"{label:>8}{len(lat) / elapsed:>12.0f}{np.percentile(lat, 50):>10.1f}{np.percentile(lat, 99):>10.1f}"
+          f"{avg_batch:>11.1f}{stats['wait_ms_avg']:>11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--frames", type=int, default=20)
+    args = parser.parse_args()
+
+    load_classifier()
+    frames = synthetic_frames(args.frames)
+    payloads = [[{"x": x, "y": y, "visibility": v} for x, y, v in frame] for frame in frames.tolist()]
+
+    print(f"{'window':>8}{'frames/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'avg batch':>11}{'wait ms':>11}")
+    for window_ms in (0, 2, 5):
+        asyncio.run(run(window_ms, args.clients, args.frames, payloads))
+
+
+if __name__ == "__main__":
+    main()
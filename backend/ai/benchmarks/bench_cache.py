@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Inference cache benchmark.
+
+Streams workout-like clips (sets of reps separated by rests where the user
+holds still, with camera jitter and limb occlusion) through
+`Classifier.predict_batch` one frame at a time, as /analyze does, with the
+per-session inference cache off and at several tolerances. Reports the hit
+rate, CPU time per frame, CPU saved, and how far results drift from the
+uncached run: rep counts, largest confidence difference and (auto-detect
+mode) frames whose predicted exercise changes.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_cache.py [--clips 4] [--refresh 10] [--rest 90]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from common import load_classifier, pose_sequence
+
+from app.cache import inference_cache
+from app.rep_counter import sessions
+from app.windows import windows
+
+CONFIGS = [(0.0, "linf"), (0.5, "linf"), (1.0, "linf"), (2.0, "linf"), (4.0, "linf"), (2.0, "l2"), (4.0, "l2")]
+
+
+def workout(seed: int, sets: int = 3, reps: int = 8, rest: int = 90, period: float = 45.0) -> np.ndarray:
+    """Sets of `reps` reps, each followed by `rest` frames of holding the last pose."""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for s in range(sets):
+        active = pose_sequence(int(reps * period), seed=seed * 100 + s, period=period)
+        hold = np.repeat(active[-1:], rest, axis=0)
+        hold[..., :2] += rng.normal(0, 0.002, hold[..., :2].shape)
+        parts += [active, hold]
+    return np.concatenate(parts)
+
+
+def run(classifier, clips, exercise, tol: float, norm: str, refresh: int, repeat: int):
+    """(per-clip results, best-of-`repeat` CPU seconds per frame, hit rate)"""
+    inference_cache.tol, inference_cache.norm, inference_cache.refresh = tol, norm, refresh
+    best = float("inf")
+    for _ in range(repeat):
+        inference_cache.hits = inference_cache.misses = inference_cache.forced = 0
+        results, cpu = [], 0.0
+        for c, clip in enumerate(clips):
+            session_id = f"bench_cache_{c}"
+            for reset in (sessions.reset, windows.reset, inference_cache.reset):
+                reset(session_id)
+            t0 = time.process_time()
+            results.append([classifier.predict_batch([(pts, session_id, exercise)])[0] for pts in clip])
+            cpu += time.process_time() - t0
+        best = min(best, cpu)
+    frames = sum(len(clip) for clip in clips)
+    return results, best / frames, inference_cache.stats()["hit_rate"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clips", type=int, default=4)
+    parser.add_argument("--refresh", type=int, default=10)
+    parser.add_argument("--rest", type=int, default=90, help="frames held still after each set")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    classifier = load_classifier()
+    clips = [workout(seed, rest=args.rest) for seed in range(args.clips)]
+    print(f"{args.clips} clips, {sum(map(len, clips))} frames ({args.rest}-frame rests), "
+          f"refresh every {args.refresh} frames")
+    run(classifier, clips[:1], "squats", 0.0, "linf", args.refresh, 1)  # warm-up
+
+    for exercise in ("squats", None):
+        print(f"\nexercise={exercise or 'auto'}")
+        print(f"{'tolerance':>10}{'norm':>6}{'hit rate':>10}{'cpu us/frame':>14}{'cpu saved':>11}"
+              f"{'reps':>8}{'max dconf':>11}{'label diff':>12}")
+        reference = base_cpu = None
+        for tol, norm in CONFIGS:
+            results, cpu, hit_rate = run(classifier, clips, exercise, tol, norm, args.refresh, args.repeat)
+            if reference is None:
+                reference, base_cpu = results, cpu
+            pairs = [(a, b) for ra, rb in zip(reference, results) for a, b in zip(ra, rb)]
+            reps = "same" if all(ra[-1][2] == rb[-1][2] for ra, rb in zip(reference, results)) else "DIFF"
+            dconf = max(abs(a[1] - b[1]) for a, b in pairs)
+            labels = sum(a[0] != b[0] for a, b in pairs)
+            print(f"{tol if tol else 'off':>10}{norm:>6}{hit_rate:>10.1%}{cpu * 1e6:>14.1f}"
+                  f"{1 - cpu / base_cpu:>11.1%}{reps:>8}{dconf:>11.4f}{labels:>12}")
+
+    inference_cache.tol = 0.0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Inference executor vs multiple server workers.
+
+For each N, starts the service twice: with N server workers (gunicorn
+`--workers N` with uvicorn workers if gunicorn is installed, else
+`uvicorn --workers N`), each holding its own model, and as one worker with
+INFERENCE_PROCESSES=N sharing one published copy of the model. Concurrent
+clients then stream /analyze frames for a fixed time. Reports throughput,
+p50/p99 latency, and the RSS and PSS (proportional set size: shared pages
+split between the processes mapping them) summed over the whole process
+tree, also per core.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_executor.py [--cores 1,2,4] [--clients 16] [--seconds 10]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from common import pose_sequence
+
+AI_DIR = Path(__file__).parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_command(port: int, workers: int) -> list:
+    if importlib.util.find_spec("gunicorn") is not None:
+        return [sys.executable, "-m", "gunicorn", "app.main:app", "--bind", f"127.0.0.1:{port}",
+                "--workers", str(workers), "--worker-class", "uvicorn.workers.UvicornWorker", "--log-level", "warning"]
+    return [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+            "--log-level", "warning"]
+
+
+def start_server(port: int, workers: int, processes: int) -> subprocess.Popen:
+    env = dict(os.environ, INFERENCE_PROCESSES=str(processes))
+    proc = subprocess.Popen(server_command(port, workers), cwd=AI_DIR, env=env)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").json()["model_loaded"]:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("Service did not load a model - set MODELS_DIR to a directory with the trained models")
+
+
+def process_tree(pid: int) -> list:
+    children = {}
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                ppid = int((entry / "stat").read_text().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry.name))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo.extend(children.get(p, []))
+    return tree
+
+
+def memory_mb(pid: int) -> tuple:
+    """(RSS, PSS) in MB summed over `pid` and its descendants."""
+    rss = pss = 0
+    for p in process_tree(pid):
+        try:
+            for line in Path(f"/proc/{p}/smaps_rollup").read_text().splitlines():
+                if line.startswith("Rss:"):
+                    rss += int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss += int(line.split()[1])
+        except OSError:
+            pass
+    return rss / 1024, pss / 1024
+
+
+async def load(base: str, payloads, clients: int, seconds: float, warmup: float = 2.0):
+    latencies = []
+
+    async def client(c: int, until: float, record: bool):
+        async with httpx.AsyncClient(base_url=base, timeout=30) as http:
+            i = 0
+            while time.perf_counter() < until:
+                t0 = time.perf_counter()
+                r = await http.post("/analyze", content=payloads[c][i % len(payloads[c])],
+                                    headers={"content-type": "application/json"})
+                r.raise_for_status()
+                if record:
+                    latencies.append(time.perf_counter() - t0)
+                i += 1
+
+    # Warm-up: every server worker loads and every inference process maps the model
+    await asyncio.gather(*(client(c, time.perf_counter() + warmup, False) for c in range(clients)))
+    await asyncio.gather(*(client(c, time.perf_counter() + seconds, True) for c in range(clients)))
+    lat = np.array(latencies) * 1e3
+    return len(lat) / seconds, np.percentile(lat, 50), np.percentile(lat, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cores", default=",".join(str(n) for n in (1, 2, 4) if n <= (os.cpu_count() or 1)) or "1",
+                        help="Comma-separated worker / process counts")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    clips = [pose_sequence(300, seed=c) for c in range(args.clients)]
+    payloads = [[json.dumps({
+        "landmarks": [{"x": x, "y": y, "visibility": v} for x, y, v in pts.tolist()],
+        "session_id": f"bench_executor_{c}", "exercise": "squats",
+    }).encode() for pts in clip] for c, clip in enumerate(clips)]
+
+    print(f"{args.clients} clients, {args.seconds:.0f}s per run, {os.cpu_count()} CPUs")
+    print(f"{'setup':>28}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}{'PSS MB':>9}"
+          f"{'req/s/core':>12}{'PSS/core':>10}")
+    for n in [int(c) for c in args.cores.split(",")]:
+        for label, workers, processes in ((f"{n} server workers", n, 0), (f"1 worker + {n} inference procs", 1, n)):
+            port = free_port()
+            proc = start_server(port, workers, processes)
+            try:
+                rps, p50, p99 = asyncio.run(load(f"http://127.0.0.1:{port}", payloads, args.clients, args.seconds))
+                rss, pss = memory_mb(proc.pid)
+            finally:
+                proc.terminate()
+                proc.wait(30)
+            print(f"{label:>28}{rps:>9.0f}{p50:>9.2f}{p99:>9.2f}{rss:>9.0f}{pss:>9.0f}{rps / n:>12.0f}{pss / n:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
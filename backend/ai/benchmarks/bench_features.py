@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Feature extraction micro-benchmark.
+
+Compares the original per-landmark scalar implementation against the
+vectorized `compute_features` engine, checks that both produce identical
+features, and reports the per-frame cost at N=1 and N=1024.
+
+Usage:
+    python benchmarks/bench_features.py
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from common import synthetic_frames, timeit, to_landmarks
+
+from app.preprocess import ANGLES, FEATURE_NAMES, IDX, compute_features, extract_features
+from app.schemas import Landmark
+
+
+def _angle_scalar(a, b, c) -> float:
+    v1, v2 = a - b, c - b
+    n1, n2 = np.linalg.norm(v1), np.linalg.norm(v2)
+    if n1 < 1e-6 or n2 < 1e-6:
+        return np.nan
+    return float(np.degrees(np.arccos(np.clip(np.dot(v1, v2) / (n1 * n2), -1, 1))))
+
+
+def extract_features_scalar(landmarks: List[Landmark]) -> Dict[str, float]:
+    """Reference: the pre-vectorization implementation of extract_features."""
+    pts = np.array([[lm.x, lm.y] if lm.visibility > 0.5 else [np.nan, np.nan] for lm in landmarks])
+    feats = {}
+    for name, (a, b, c) in ANGLES.items():
+        feats[name] = _angle_scalar(pts[IDX[a]], pts[IDX[b]], pts[IDX[c]])
+    nose = pts[IDX['nose']]
+    lh, rh = pts[IDX['left_hip']], pts[IDX['right_hip']]
+    mid_hip = (lh + rh) / 2.0
+    if not (np.isnan(nose).any() or np.isnan(mid_hip).any()):
+        vec = nose - mid_hip
+        feats['body_tilt'] = float(np.degrees(np.arctan2(vec[1], vec[0])))
+    else:
+        feats['body_tilt'] = np.nan
+
+    def _dist(i, j):
+        p1, p2 = pts[IDX[i]], pts[IDX[j]]
+        if np.isnan(p1).any() or np.isnan(p2).any():
+            return np.nan
+        return float(np.linalg.norm(p1 - p2))
+
+    sh_w = _dist('left_shoulder', 'right_shoulder')
+    hip_w = _dist('left_hip', 'right_hip')
+    feats['ratio_sh_hip'] = sh_w / (hip_w + 1e-6) if not (np.isnan(sh_w) or np.isnan(hip_w)) else np.nan
+    ls = pts[IDX['left_shoulder']]
+    lw = pts[IDX['left_wrist']]
+    arm_len = float(np.linalg.norm(ls - lw)) if not (np.isnan(ls).any() or np.isnan(lw).any()) else np.nan
+    rs = pts[IDX['right_shoulder']]
+    mid_sh = (ls + rs) / 2.0 if not (np.isnan(ls).any() or np.isnan(rs).any()) else np.array([np.nan, np.nan])
+    torso_len = float(np.linalg.norm(mid_sh - mid_hip)) if not np.isnan(mid_sh).any() else np.nan
+    feats['ratio_arm_torso'] = arm_len / (torso_len + 1e-6) if not (np.isnan(arm_len) or np.isnan(torso_len)) else np.nan
+    return feats
+
+
+def check_parity(frames: np.ndarray) -> int:
+    """Return the number of feature values that differ between the two implementations."""
+    batch = compute_features(frames)
+    mismatches = 0
+    for i, frame in enumerate(frames):
+        ref = extract_features_scalar(to_landmarks(frame))
+        ref_row = np.array([ref[name] for name in FEATURE_NAMES])
+        same = (ref_row == batch[i]) | (np.isnan(ref_row) & np.isnan(batch[i]))
+        mismatches += int((~same).sum())
+        assert extract_features(to_landmarks(frame)).keys() == ref.keys()
+    return mismatches
+
+
+def main():
+    frames = synthetic_frames(2048, dropout=0.1)
+    mismatches = check_parity(frames)
+    print(f"parity: {mismatches} mismatching values over {frames.size // 99} frames")
+    if mismatches:
+        raise SystemExit(1)
+
+    landmarks = to_landmarks(frames[0])
+    print(f"{'path':<40}{'us/frame':>12}")
+    rows = [
+        ("scalar extract_features (N=1)", timeit(lambda: extract_features_scalar(landmarks), number=200)),
+        ("vectorized extract_features (N=1)", timeit(lambda: extract_features(landmarks), number=200)),
+        ("compute_features array (N=1)", timeit(lambda: compute_features(frames[0]), number=200)),
+        ("compute_features array (N=1024)", timeit(lambda: compute_features(frames[:1024]), number=20) / 1024),
+    ]
+    for name, secs in rows:
+        print(f"{name:<40}{secs * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Session journal benchmark.
+
+Write overhead: streams clips for many sessions through
+`Classifier.predict_batch` one frame per call (the work of one /analyze),
+alternating rounds with the journal detached and attached to the session
+store. Reports the best round's wall time and process CPU per frame (the
+CPU figure includes the flusher thread), journal records and bytes per
+frame, and the same comparison for `SessionManager.update` alone.
+
+Recovery: writes the counters of N sessions (default 100k) with R reps each
+through `SessionJournal`, then times a fresh journal rebuilding them, once
+with everything still in the journal and once from a compacted snapshot
+plus a tail of changes to 1% of the sessions. Recovery is split into the
+file scan (`recover`) and recreating the counters (`SessionManager.restore`);
+every recovered count is checked.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_journal.py [--sessions 100000] [--reps 10] [--frames 2000]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import load_classifier, pose_sequence, timeit
+
+from app.journal import RECORD, SessionJournal
+from app.rep_counter import SessionManager, sessions
+from app.windows import windows
+
+
+def overhead(classifier, clips, rounds: int, directory: Path):
+    """{mode: (wall us/frame, CPU us/frame)}, records and bytes per frame."""
+    journal = SessionJournal(str(directory), flush_ms=50)
+    journal.recover()
+    journal.start()
+    frames = sum(len(clip) for clip in clips)
+    results = {"off": [], "on": []}
+    for r in range(rounds):
+        for mode in ("off", "on") if r % 2 == 0 else ("on", "off"):
+            for s in range(len(clips)):
+                sessions.reset(f"bench_journal_{s}")
+                windows.reset(f"bench_journal_{s}")
+            sessions.journal = journal if mode == "on" else None
+            w0, c0 = time.perf_counter(), time.process_time()
+            for t in range(len(clips[0])):
+                for s, clip in enumerate(clips):
+                    classifier.predict_batch([(clip[t], f"bench_journal_{s}", "squats")])
+            # Let the flusher write this round's records inside the measured window
+            idle = 2 * journal.flush_interval
+            time.sleep(idle)
+            results[mode].append(((time.perf_counter() - w0 - idle) / frames, (time.process_time() - c0) / frames))
+    sessions.journal = None
+    journal.close()
+    per_frame_records = journal.flushed_records / (rounds * frames)
+    return ({mode: np.min(np.array(v), axis=0) * 1e6 for mode, v in results.items()},
+            per_frame_records, per_frame_records * RECORD.itemsize)
+
+
+def update_cost(directory: Path, repeat: int):
+    """Best ns per `SessionManager.update` with the journal off and on."""
+    angles = np.tile(np.concatenate([np.linspace(170, 70, 15), np.linspace(70, 170, 15)]), 20).tolist()
+    journal = SessionJournal(str(directory))
+    journal.recover()
+    journal.start()
+    cost = {}
+    for mode in ("off", "on"):
+        store = SessionManager()
+        store.journal = journal if mode == "on" else None
+
+        def run():
+            for s in range(16):
+                for angle in angles:
+                    store.update(f"s{s}", "squats", angle)
+
+        cost[mode] = timeit(run, repeat=repeat) / (16 * len(angles)) * 1e9
+    journal.close()
+    return cost
+
+
+def populate(directory: Path, n: int, reps: int, snapshot: bool):
+    """Journal n sessions of `reps` reps; returns {session: count} as the store would hold it."""
+    rng = np.random.default_rng(0)
+    counts = rng.integers(1, reps + 1, n)
+    journal = SessionJournal(str(directory), snapshot_records=1 << 62)
+    journal.recover()
+    for s in range(n):
+        session_id = f"user-{s:06d}-session"
+        for c in range(int(counts[s])):
+            journal.record(session_id, "squats", c, "down")
+            journal.record(session_id, "squats", c + 1, "up")
+        if s % 10000 == 9999:
+            journal._flush()
+    journal._flush()
+    compact_ms = 0.0
+    if snapshot:
+        t0 = time.perf_counter()
+        journal.compact()
+        compact_ms = (time.perf_counter() - t0) * 1e3
+        # Short tail: 1% of the sessions do one more rep
+        for s in rng.choice(n, n // 100, replace=False):
+            session_id = f"user-{s:06d}-session"
+            journal.record(session_id, "squats", int(counts[s]), "down")
+            journal.record(session_id, "squats", int(counts[s]) + 1, "up")
+            counts[s] += 1
+        journal._flush()
+    journal.close()
+    return {f"user-{s:06d}-session": int(c) for s, c in enumerate(counts)}, compact_ms
+
+
+def recovery(directory: Path, expected: dict, repeat: int):
+    best_scan = best_restore = float("inf")
+    for _ in range(repeat):
+        journal = SessionJournal(str(directory))
+        store = SessionManager(max_sessions=len(expected))
+        t0 = time.perf_counter()
+        entries = journal.recover()
+        t1 = time.perf_counter()
+        store.restore(entries)
+        t2 = time.perf_counter()
+        journal.close()
+        best_scan, best_restore = min(best_scan, t1 - t0), min(best_restore, t2 - t1)
+    wrong = sum(store.get_count(session_id, "squats") != count for session_id, count in expected.items())
+    if wrong or len(store) != len(expected):
+        raise SystemExit(f"recovered {len(store)} sessions, {wrong} with the wrong count")
+    slot = directory / "slot-0"
+    sizes = {kind: sum(p.stat().st_size for p in slot.glob(f"{kind}-*.bin")) / 2**20
+             for kind in ("snapshot", "journal", "names")}
+    return best_scan * 1e3, best_restore * 1e3, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--reps", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=2000, help="Frames per overhead round, over 16 sessions")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_journal_"))
+    try:
+        classifier = load_classifier()
+        clips = [pose_sequence(args.frames // 16, seed=s, period=30.0 + s) for s in range(16)]
+        per_frame, records, nbytes = overhead(classifier, clips, args.rounds, root / "overhead")
+        print(f"Write overhead per /analyze frame ({records:.3f} records, {nbytes:.2f} bytes journaled per frame)")
+        print(f"{'journal':>9}{'wall us':>10}{'CPU us':>10}")
+        for mode in ("off", "on"):
+            print(f"{mode:>9}{per_frame[mode][0]:>10.1f}{per_frame[mode][1]:>10.1f}")
+        delta = per_frame["on"] - per_frame["off"]
+        print(f"{'delta':>9}{delta[0]:>+10.2f}{delta[1]:>+10.2f}")
+        cost = update_cost(root / "update", 5 * args.repeat)
+        print(f"SessionManager.update: {cost['off']:.0f} ns off, {cost['on']:.0f} ns on "
+              f"({cost['on'] - cost['off']:+.0f} ns)")
+
+        print(f"\nRecovery of {args.sessions} sessions, up to {args.reps} reps each (best of {args.repeat})")
+        print(f"{'layout':>18}{'scan ms':>10}{'restore ms':>12}{'total ms':>10}{'snapshot MB':>13}"
+              f"{'journal MB':>12}{'names MB':>10}")
+        for label, snapshot in (("journal only", False), ("snapshot + 1% tail", True)):
+            directory = root / label.replace(" ", "_")
+            expected, compact_ms = populate(directory, args.sessions, args.reps, snapshot)
+            scan, restore, sizes = recovery(directory, expected, args.repeat)
+            print(f"{label:>18}{scan:>10.1f}{restore:>12.1f}{scan + restore:>10.1f}{sizes['snapshot']:>13.2f}"
+                  f"{sizes['journal']:>12.2f}{sizes['names']:>10.2f}")
+            if snapshot:
+                print(f"{'':>18}compaction of {args.sessions} sessions: {compact_ms:.1f} ms (flusher thread)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
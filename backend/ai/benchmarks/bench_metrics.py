@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Metrics overhead benchmark.
+
+Runs the same sequential in-process /analyze load in fresh subprocesses with
+METRICS_ENABLED=1 and =0 (alternating, several rounds, so drift hits both
+equally) and reports the median per-request time of each and the relative
+overhead. Also reports the cost of one stage timer and one histogram
+observation.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_metrics.py [--rounds 5] [--requests 1500]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import pose_sequence, timeit
+
+
+def child(requests: int):
+    import httpx
+
+    from common import load_classifier
+    from app.main import app
+
+    load_classifier()
+    frames = pose_sequence(64)
+    payloads = [json.dumps({
+        "landmarks": [{"x": x, "y": y, "visibility": v} for x, y, v in frame.tolist()],
+        "session_id": "bench_metrics", "exercise": "squats",
+    }).encode() for frame in frames]
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for i in range(100):  # warm-up
+                await client.post("/analyze", content=payloads[i % 64], headers={"content-type": "application/json"})
+            t0 = time.perf_counter()
+            for i in range(requests):
+                await client.post("/analyze", content=payloads[i % 64], headers={"content-type": "application/json"})
+            return (time.perf_counter() - t0) / requests
+
+    print(json.dumps({"us_per_request": asyncio.run(run()) * 1e6}))
+
+
+def measure(enabled: bool, requests: int) -> float:
+    env = dict(os.environ, METRICS_ENABLED="1" if enabled else "0")
+    out = subprocess.run([sys.executable, __file__, "--child", "--requests", str(requests)],
+                         env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])["us_per_request"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=1500)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.requests)
+
+    from app import metrics
+
+    hist = metrics.STAGE_SECONDS.labels(stage="features")
+    observe = timeit(lambda: hist.observe(3e-5), number=20000) * 1e9
+
+    def timed():
+        with metrics.stage("features"):
+            pass
+
+    timer = timeit(timed, number=20000) * 1e9
+    print(f"histogram observe: {observe:.0f} ns, stage timer: {timer:.0f} ns")
+
+    on, off = [], []
+    for _ in range(args.rounds):
+        on.append(measure(True, args.requests))
+        off.append(measure(False, args.requests))
+    on_us, off_us = statistics.median(on), statistics.median(off)
+    print(f"metrics on:  {on_us:.1f} us/request (runs: {', '.join(f'{v:.0f}' for v in on)})")
+    print(f"metrics off: {off_us:.1f} us/request (runs: {', '.join(f'{v:.0f}' for v in off)})")
+    print(f"overhead: {(on_us / off_us - 1) * 100:+.2f}%")
+    # Instrumentation per /analyze: middleware (2 clock reads + 1 observe), parse observe, 6 stage timers
+    modelled = (observe * 2 + timer * 6) / 1e3
+    print(f"modelled instrumentation cost: {modelled:.1f} us/request ({modelled / off_us * 100:.2f}%)")
+
+
+if __name__ == "__main__":
+    main()
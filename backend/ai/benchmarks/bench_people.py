@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Multi-person frame benchmark.
+
+Streams clips of K people (K = 1..16), each with its own track, two ways:
+one single-person request per person per frame (as before /analyze_people),
+and one request carrying all K skeletons. Measured first on
+`Classifier.predict_batch` alone (K one-frame calls vs one K-frame call),
+then end to end through in-process /analyze and /analyze_people requests.
+Reports per-person cost and speed-up, and checks that every track ends
+with the same label and rep count either way.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_people.py [--people 1,2,4,8,16] [--frames 120]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from common import load_classifier, pose_sequence
+
+from app.infer import track_session_id
+from app.rep_counter import sessions
+from app.windows import windows
+
+
+def reset(session_id: str, k: int):
+    for track in range(k):
+        sessions.reset(track_session_id(session_id, str(track)))
+        windows.reset(track_session_id(session_id, str(track)))
+
+
+def direct(classifier, clips, session_id: str, together: bool):
+    """(seconds per person-frame, last result per track)"""
+    k, n = len(clips), len(clips[0])
+    reset(session_id, k)
+    last = None
+    t0 = time.perf_counter()
+    for t in range(n):
+        frames = [(clips[track][t], track_session_id(session_id, str(track)), "squats") for track in range(k)]
+        if together:
+            last = classifier.predict_batch(frames)
+        else:
+            last = [classifier.predict_batch([frame])[0] for frame in frames]
+    return (time.perf_counter() - t0) / (k * n), last
+
+
+def http(clips, session_id: str, together: bool):
+    import httpx
+
+    from app.main import app
+
+    k, n = len(clips), len(clips[0])
+    landmarks = [[[{"x": x, "y": y, "visibility": v} for x, y, v in pts.tolist()] for pts in clip] for clip in clips]
+    if together:
+        bodies = [[json.dumps({"session_id": session_id, "exercise": "squats", "people": [
+            {"track_id": str(track), "landmarks": landmarks[track][t]} for track in range(k)]}).encode()]
+            for t in range(n)]
+    else:
+        bodies = [[json.dumps({"session_id": track_session_id(session_id, str(track)), "exercise": "squats",
+                               "landmarks": landmarks[track][t]}).encode() for track in range(k)] for t in range(n)]
+    path = "/analyze_people" if together else "/analyze"
+
+    async def run():
+        reset(session_id, k)
+        last = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            t0 = time.perf_counter()
+            for frame in bodies:
+                last = [await client.post(path, content=body, headers={"content-type": "application/json"})
+                        for body in frame]
+            elapsed = time.perf_counter() - t0
+        if together:
+            results = [(r["exercise"], r["rep_count"]) for r in last[0].json()["results"]]
+        else:
+            results = [(r.json()["exercise"], r.json()["rep_count"]) for r in last]
+        return elapsed / (k * n), results
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--people", default="1,2,4,8,16")
+    parser.add_argument("--frames", type=int, default=120)
+    args = parser.parse_args()
+
+    classifier = load_classifier()
+    counts = [int(k) for k in args.people.split(",")]
+    clips = [pose_sequence(args.frames, seed=seed, period=35.0 + 3 * seed) for seed in range(max(counts))]
+    direct(classifier, clips[:2], "bench_people_warmup", True)
+
+    mismatch = False
+    for name, run in (("predict_batch", lambda c, s, t: direct(classifier, c, s, t)), ("HTTP", http)):
+        print(f"\n{name}: us per person-frame")
+        print(f"{'K':>4}{'separate':>11}{'together':>11}{'speed-up':>10}")
+        for k in counts:
+            separate, a = run(clips[:k], f"bench_people_{name}_{k}_sep", False)
+            together, b = run(clips[:k], f"bench_people_{name}_{k}_tog", True)
+            a = [(r[0], r[-1]) for r in a]
+            b = [(r[0], r[-1]) for r in b]
+            mismatch |= a != b
+            print(f"{k:>4}{separate * 1e6:>11.1f}{together * 1e6:>11.1f}{separate / together:>9.1f}x"
+                  + ("" if a == b else "  results differ"))
+    if mismatch:
+        raise SystemExit("per-track results differ between separate and multi-person requests")
+
+
+if __name__ == "__main__":
+    main()
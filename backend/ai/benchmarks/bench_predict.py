@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Per-request feature extraction regression benchmark.
+
+Counts how many times the feature engine runs per `Classifier.predict`
+call (must be exactly one) and compares request latency against the old
+flow, which extracted features again inside get_primary_angle.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_predict.py
+"""
+
+import numpy as np
+
+from common import load_classifier, synthetic_frames, timeit, to_landmarks
+
+import app.infer as infer
+from app.preprocess import PRIMARY_ANGLE, extract_features, features_to_vector
+from app.rep_counter import sessions
+
+
+def count_extractions(classifier, landmarks) -> int:
+    calls = 0
+    original = infer.compute_features
+
+    def counting(pts):
+        nonlocal calls
+        calls += 1
+        return original(pts)
+
+    infer.compute_features = counting
+    try:
+        classifier.predict(landmarks, "bench_count")
+    finally:
+        infer.compute_features = original
+        sessions.reset("bench_count")
+    return calls
+
+
+def predict_double_extraction(classifier, landmarks, session_id):
+    """Reference: the old request flow with a second extraction for the rep counter."""
+    feats = extract_features(landmarks)
+    X = np.array([features_to_vector(feats, classifier.feature_cols)])
+    probs = classifier.predictor.predict_proba(X)[0]
+    idx = int(np.argmax(probs))
+    target = classifier.classes[idx]
+    angle = extract_features(landmarks).get(PRIMARY_ANGLE.get(target, 'l_elbow'), np.nan)
+    return target, float(probs[idx]), sessions.update(session_id, target, angle)
+
+
+def main():
+    classifier = load_classifier()
+    landmarks = to_landmarks(synthetic_frames(1)[0])
+
+    calls = count_extractions(classifier, landmarks)
+    print(f"feature extractions per request: {calls} (was 2)")
+
+    old = timeit(lambda: predict_double_extraction(classifier, landmarks, "bench_old"), number=200)
+    new = timeit(lambda: classifier.predict(landmarks, "bench_new"), number=200)
+    print(f"old flow: {old * 1e6:8.1f} us/request")
+    print(f"new flow: {new * 1e6:8.1f} us/request ({(1 - new / old) * 100:.1f}% faster)")
+
+    if calls != 1:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
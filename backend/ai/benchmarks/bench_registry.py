@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Model registry benchmark.
+
+Runs a fixed-duration in-process /analyze load (concurrent clients, each
+streaming its own session) in four phases:
+
+- steady: no model changes
+- reload: a new version is loaded, validated and activated in the background
+  every `--swap-every` seconds, alternating between MODELS_DIR and a second
+  version built from its rf_enhanced.pkl
+- shadow 10% / shadow 100%: the other version is a candidate and that
+  fraction of batches is re-scored by it
+
+Reports throughput, p50/p99/max latency and failed requests per phase,
+checks that rep counts never go backwards across swaps (sessions survive),
+and prints the load/activation times and the shadow latency/agreement
+statistics of both versions.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_registry.py [--clients 8] [--seconds 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import load_classifier, pose_sequence
+
+from app.infer import MODELS_DIR
+
+
+def candidate_dir(directory: Path) -> Path:
+    """A second version: MODELS_DIR's metadata and encoder with rf_enhanced.pkl as the only model."""
+    for name in ("feature_metadata.json", "label_encoder.pkl", "rf_enhanced.pkl"):
+        if not (MODELS_DIR / name).exists():
+            raise SystemExit(f"{name} not found in MODELS_DIR")
+        os.symlink((MODELS_DIR / name).resolve(), directory / name)
+    return directory
+
+
+async def load_phase(client, payloads, clients: int, seconds: float, counts: dict, swapper=None):
+    latencies, failures = [], 0
+
+    async def run_client(c: int):
+        nonlocal failures
+        i = 0
+        while time.perf_counter() < deadline:
+            body = payloads[c][i % len(payloads[c])]
+            t0 = time.perf_counter()
+            r = await client.post("/analyze", content=body, headers={"content-type": "application/json"})
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                failures += 1
+            else:
+                rep_count = r.json()["rep_count"]
+                if rep_count < counts.get(c, 0):
+                    raise SystemExit(f"session {c}: rep count went from {counts[c]} to {rep_count}")
+                counts[c] = rep_count
+            i += 1
+
+    deadline = time.perf_counter() + seconds
+    tasks = [run_client(c) for c in range(clients)] + ([swapper(deadline)] if swapper else [])
+    await asyncio.gather(*tasks)
+    lat = np.array(latencies) * 1e3
+    return len(lat) / seconds, np.percentile(lat, 50), np.percentile(lat, 99), lat.max(), failures
+
+
+async def main_async(args):
+    import httpx
+
+    from app.infer import classifier
+    from app.main import app
+
+    load_classifier()
+    models = classifier.models
+    tmp = tempfile.TemporaryDirectory()
+    versions = [MODELS_DIR, candidate_dir(Path(tmp.name))]
+    clips = [pose_sequence(450, seed=c) for c in range(args.clients)]
+    payloads = [[json.dumps({
+        "landmarks": [{"x": x, "y": y, "visibility": v} for x, y, v in pts.tolist()],
+        "session_id": f"bench_registry_{c}", "exercise": "squats",
+    }).encode() for pts in clip] for c, clip in enumerate(clips)]
+    load_times, activations = [], []
+
+    async def swapper(deadline):
+        n = 0
+        while time.perf_counter() + args.swap_every < deadline:
+            await asyncio.sleep(args.swap_every)
+            n += 1
+            t0 = time.perf_counter()
+            models.load_candidate(versions[n % 2])
+            await asyncio.to_thread(models.wait)
+            load_times.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            models.activate()
+            activations.append(time.perf_counter() - t0)
+
+    transport = httpx.ASGITransport(app=app)
+    counts = {}
+    print(f"{args.clients} clients, {args.seconds:.0f}s per phase")
+    print(f"{'phase':>12}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'failed':>8}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        phases = [("steady", None, 0.0), ("reload", swapper, 0.0), ("shadow 10%", None, 0.1),
+                  ("shadow 100%", None, 1.0)]
+        for name, swap, fraction in phases:
+            if fraction:
+                if models.candidate is None:
+                    active = models.active.source.parent
+                    models.load_candidate(versions[1] if active == MODELS_DIR else versions[0])
+                    await asyncio.to_thread(models.wait)
+                models.set_shadow(fraction)
+            rps, p50, p99, worst, failed = await load_phase(client, payloads, args.clients, args.seconds, counts, swap)
+            print(f"{name:>12}{rps:>9.0f}{p50:>9.2f}{p99:>9.2f}{worst:>9.1f}{failed:>8}")
+            if fraction:
+                await asyncio.sleep(0.5)  # Let the shadow scorer drain
+                shadow = models.shadow.stats()
+                print(f"{'':>12}agreement {shadow['agreement']:.1%} over {shadow['frames']} frames, "
+                      f"mean |dconf| {shadow['mean_confidence_diff']:.3f}, dropped {shadow['dropped']}")
+                for role in ("active", "candidate"):
+                    s = shadow[role]
+                    version = (models.active if role == "active" else models.candidate).version
+                    print(f"{'':>12}{role:>9} {version:<30} p50 {s['us_per_frame_p50']:7.1f} us/frame, "
+                          f"p99 {s['us_per_frame_p99']:7.1f}")
+    models.discard()
+    tmp.cleanup()
+    if load_times:
+        print(f"\n{len(load_times)} swaps: background load + validation {np.mean(load_times) * 1e3:.0f} ms, "
+              f"activation {np.max(activations) * 1e6:.0f} us max")
+    print(f"rep counts kept across swaps: {sorted(counts.values())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--swap-every", type=float, default=1.0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
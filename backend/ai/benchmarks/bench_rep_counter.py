@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Rep counter benchmark.
+
+Replays noisy synthetic angle streams (with dropped frames) through the
+original deque-based counter, the slotted RepCounter and RepCounterBank,
+checks that all three agree on count, phase and debounce state frame for
+frame, and reports per-frame cost and per-counter memory.
+
+Usage:
+    python benchmarks/bench_rep_counter.py [--sessions 256] [--frames 2000]
+"""
+
+import argparse
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+
+import common  # noqa: F401 - puts backend/ai on sys.path
+
+from app.rep_counter import SMOOTHING_WINDOW, THRESHOLDS, RepCounter, RepCounterBank
+
+DOWN, UP = THRESHOLDS['squats']
+
+
+class LegacyRepCounter:
+    """Reference: the pre-slots implementation with a deque and np.mean."""
+
+    def __init__(self):
+        self.count = 0
+        self.phase = 'up'
+        self.angle_history = deque(maxlen=SMOOTHING_WINDOW)
+        self.last_valid_angle = None
+        self.frames_in_phase = 0
+        self.min_frames_for_transition = 3
+
+    def _smooth_angle(self, angle):
+        if np.isnan(angle):
+            return self.last_valid_angle if self.last_valid_angle else np.nan
+        self.angle_history.append(angle)
+        self.last_valid_angle = angle
+        if len(self.angle_history) < 2:
+            return angle
+        return float(np.mean(self.angle_history))
+
+    def update(self, angle, down_thresh, up_thresh):
+        smoothed = self._smooth_angle(angle)
+        if np.isnan(smoothed):
+            return self.count
+        if self.phase == 'up':
+            if smoothed < down_thresh:
+                self.frames_in_phase += 1
+                if self.frames_in_phase >= self.min_frames_for_transition:
+                    self.phase = 'down'
+                    self.frames_in_phase = 0
+            else:
+                self.frames_in_phase = 0
+        elif self.phase == 'down':
+            if smoothed > up_thresh:
+                self.frames_in_phase += 1
+                if self.frames_in_phase >= self.min_frames_for_transition:
+                    self.phase = 'up'
+                    self.count += 1
+                    self.frames_in_phase = 0
+            else:
+                self.frames_in_phase = 0
+        return self.count
+
+
+def angle_streams(sessions: int, frames: int, seed: int = 0) -> np.ndarray:
+    """(frames, sessions) squat-like knee angles with noise, dropouts and a few exact zeros."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames)[:, None]
+    period = rng.uniform(15, 60, sessions)
+    angles = 125 + 45 * np.sin(2 * np.pi * t / period) + rng.normal(0, 6, (frames, sessions))
+    angles[rng.random((frames, sessions)) < 0.08] = np.nan
+    angles[rng.random((frames, sessions)) < 0.002] = 0.0
+    return angles
+
+
+def state(counter) -> tuple:
+    return counter.count, counter.phase, counter.frames_in_phase
+
+
+def check_parity(angles: np.ndarray) -> int:
+    n_frames, n_sessions = angles.shape
+    legacy = [LegacyRepCounter() for _ in range(n_sessions)]
+    slotted = [RepCounter() for _ in range(n_sessions)]
+    bank = RepCounterBank(capacity=n_sessions)
+    slots = np.array([bank.add() for _ in range(n_sessions)])
+    mismatches = 0
+    for f in range(n_frames):
+        bank.step(slots, angles[f], DOWN, UP)
+        for s in range(n_sessions):
+            angle = float(angles[f, s])
+            legacy[s].update(angle, DOWN, UP)
+            slotted[s].update(angle, DOWN, UP)
+            expected = state(legacy[s])
+            in_bank = (int(bank.count[s]), 'down' if bank.down[s] else 'up', int(bank.frames_in_phase[s]))
+            mismatches += (state(slotted[s]) != expected) + (in_bank != expected)
+    return mismatches
+
+
+def per_frame_cost(cls, angles: np.ndarray) -> float:
+    counters = [cls() for _ in range(angles.shape[1])]
+    rows = angles.tolist()
+    t0 = time.perf_counter()
+    for row in rows:
+        for counter, angle in zip(counters, row):
+            counter.update(angle, DOWN, UP)
+    return (time.perf_counter() - t0) / angles.size
+
+
+def bank_cost(angles: np.ndarray) -> float:
+    bank = RepCounterBank(capacity=angles.shape[1])
+    slots = np.array([bank.add() for _ in range(angles.shape[1])])
+    t0 = time.perf_counter()
+    for row in angles:
+        bank.step(slots, row, DOWN, UP)
+    return (time.perf_counter() - t0) / angles.size
+
+
+def bytes_per_counter(cls, n: int = 10000) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    counters = [cls() for _ in range(n)]
+    for c in counters:
+        for angle in (100.0, 101.0, 102.0, 103.0, 104.0, 105.0):
+            c.update(angle, DOWN, UP)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=256)
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    angles = angle_streams(args.sessions, args.frames)
+    mismatches = check_parity(angles)
+    print(f"parity: {mismatches} mismatching states over {angles.size} frames")
+
+    bank_bytes = sum(getattr(RepCounterBank(1), name).nbytes for name in RepCounterBank._FIELDS)
+    print(f"{'counter':<22}{'ns/frame':>10}{'bytes/counter':>15}")
+    print(f"{'legacy deque':<22}{per_frame_cost(LegacyRepCounter, angles) * 1e9:>10.0f}"
+          f"{bytes_per_counter(LegacyRepCounter):>15.0f}")
+    print(f"{'RepCounter (slots)':<22}{per_frame_cost(RepCounter, angles) * 1e9:>10.0f}"
+          f"{bytes_per_counter(RepCounter):>15.0f}")
+    print(f"{'RepCounterBank':<22}{bank_cost(angles) * 1e9:>10.0f}{bank_bytes:>15.0f}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
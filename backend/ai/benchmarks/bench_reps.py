@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Reps-only fast path benchmark.
+
+Streams exercise-like clips one frame at a time through the full path
+(`Classifier.predict_batch`, as /analyze) and the reps-only path
+(`Classifier.count_reps`, as /analyze_reps) with the classifier sampled
+every 1, 10 and 30 frames or never. Reports per-frame cost, final rep
+counts vs the full path and the primary angle error of the reduced
+computation, then the same comparison end to end through in-process
+/analyze and /analyze_reps requests.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_reps.py [--clips 4] [--frames 900]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from common import load_classifier, pose_sequence
+
+from app.preprocess import compute_features, get_primary_angle, primary_angle
+from app.rep_counter import sessions
+from app.windows import windows
+
+EXERCISES = ("squats", "bicep_curls", "situps")
+SAMPLING = (1, 10, 30, 0)
+
+
+def reset(classifier, session_id: str):
+    sessions.reset(session_id)
+    windows.reset(session_id)
+    classifier.reset_reps(session_id)
+
+
+def full_path(classifier, clip, session_id, exercise):
+    return [classifier.predict_batch([(pts, session_id, exercise)])[0][2] for pts in clip]
+
+
+def reps_path(classifier, clip, session_id, exercise):
+    return [classifier.count_reps(pts, session_id, exercise)[1] for pts in clip]
+
+
+def stream(classifier, clips, path) -> tuple:
+    """(CPU seconds per frame, final rep count per clip)"""
+    counts, cpu = [], 0.0
+    for c, clip in enumerate(clips):
+        exercise = EXERCISES[c % len(EXERCISES)]
+        session_id = f"bench_reps_{c}"
+        reset(classifier, session_id)
+        t0 = time.process_time()
+        counts.append(path(classifier, clip, session_id, exercise)[-1])
+        cpu += time.process_time() - t0
+    return cpu / sum(map(len, clips)), counts
+
+
+def http_compare(clips, requests: int):
+    import httpx
+
+    from app.main import app
+
+    frames = [(clip[i], EXERCISES[c % len(EXERCISES)]) for c, clip in enumerate(clips) for i in range(64)]
+    payloads = [json.dumps({
+        "landmarks": [{"x": x, "y": y, "visibility": v} for x, y, v in pts.tolist()],
+        "session_id": "bench_reps_http", "exercise": exercise,
+    }).encode() for pts, exercise in frames]
+
+    async def run(path):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for i in range(100):  # warm-up
+                await client.post(path, content=payloads[i % len(payloads)], headers={"content-type": "application/json"})
+            t0 = time.perf_counter()
+            for i in range(requests):
+                await client.post(path, content=payloads[i % len(payloads)], headers={"content-type": "application/json"})
+            return (time.perf_counter() - t0) / requests
+
+    for path in ("/analyze", "/analyze_reps"):
+        print(f"{path:>14}{asyncio.run(run(path)) * 1e6:>12.1f} us/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clips", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=900)
+    parser.add_argument("--requests", type=int, default=1500)
+    args = parser.parse_args()
+
+    classifier = load_classifier()
+    clips = [pose_sequence(args.frames, seed=seed) for seed in range(args.clips)]
+    stream(classifier, clips[:1], reps_path)  # warm-up
+
+    feats = compute_features(np.concatenate(clips))
+    errors = [abs(primary_angle(pts, ex) - get_primary_angle(row, ex))
+              for pts, row in zip(np.concatenate(clips), feats) for ex in EXERCISES]
+    print(f"primary angle vs compute_features: max error {np.nanmax(errors):.1e} degrees")
+
+    print(f"\n{'path':>22}{'us/frame':>10}{'speed-up':>10}  rep counts")
+    full_cpu, full_counts = stream(classifier, clips, full_path)
+    print(f"{'full':>22}{full_cpu * 1e6:>10.1f}{1.0:>9.1f}x  {full_counts}")
+    mismatch = False
+    for every in SAMPLING:
+        classifier.reps_confidence_every = every
+        cpu, counts = stream(classifier, clips, reps_path)
+        mismatch |= counts != full_counts
+        label = f"reps, model 1/{every}" if every else "reps, no model"
+        print(f"{label:>22}{cpu * 1e6:>10.1f}{full_cpu / cpu:>9.1f}x  {counts}")
+
+    print("\nin-process HTTP (model every 10 frames):")
+    classifier.reps_confidence_every = 10
+    http_compare(clips, args.requests)
+    if mismatch:
+        raise SystemExit("rep counts differ from the full path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Session store soak test.
+
+Drives a stream of synthetic session IDs (1M by default, each sending a
+few frames, like short-lived browser tabs) through SessionManager and
+samples RSS along the way. Fails if RSS keeps growing once the store has
+reached its bound.
+
+Usage:
+    python benchmarks/bench_session_soak.py [--sessions 1000000] [--max-sessions 50000] [--ttl 2]
+"""
+
+import argparse
+import os
+import resource
+import time
+
+import numpy as np
+
+import common  # noqa: F401 - puts backend/ai on sys.path
+
+from app.rep_counter import SessionManager
+
+FRAMES_PER_SESSION = 3
+# Sessions active at once; each new frame goes to one of the most recent ones
+ACTIVE = 200
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        # macOS reports bytes, Linux KiB; this is the peak, which is still a useful bound
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument("--max-sessions", type=int, default=50_000)
+    parser.add_argument("--ttl", type=float, default=2.0)
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed RSS growth after warm-up")
+    args = parser.parse_args()
+
+    store = SessionManager(ttl=args.ttl, max_sessions=args.max_sessions)
+    rng = np.random.default_rng(0)
+    angles = (110 + 60 * np.sin(np.arange(4096) / 9)).tolist()
+    offsets = rng.integers(0, ACTIVE, 4096).tolist()
+
+    total_updates = args.sessions * FRAMES_PER_SESSION
+    sample_every = total_updates // 10
+    samples = []
+    t0 = time.perf_counter()
+    print(f"{'sessions seen':>14}{'live':>9}{'evictions':>11}{'RSS MB':>9}")
+    for i in range(total_updates):
+        newest = i // FRAMES_PER_SESSION
+        session = max(0, newest - offsets[i % 4096])
+        store.update(f"soak_{session}", "squats", angles[i % 4096])
+        if (i + 1) % sample_every == 0:
+            samples.append(rss_mb())
+            print(f"{newest + 1:>14}{len(store):>9}{store.evictions:>11}{samples[-1]:>9.1f}")
+    elapsed = time.perf_counter() - t0
+    print(f"{total_updates / elapsed:.0f} updates/s")
+
+    # Compare against RSS once the store has filled up (after the first 30% of the run)
+    warm = samples[2]
+    growth = (samples[-1] - warm) / warm
+    print(f"RSS growth after warm-up: {growth * 100:.1f}%")
+    if growth > args.tolerance:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Session store benchmark.
+
+Checks that the shared-memory store counts reps exactly like the
+in-process SessionManager when a session's frames alternate between two
+workers, then measures aggregate update throughput with N worker
+processes for both backends.
+
+Usage:
+    python benchmarks/bench_sessions.py [--updates 20000] [--sessions 500]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import common  # noqa: F401 - puts backend/ai on sys.path
+
+from app.rep_counter import SessionManager
+from app.shm_sessions import SharedSessionStore
+
+SLOTS = 1 << 16
+
+
+def angle_sequence(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    angles = 110 + 60 * np.sin(t / 9) + rng.normal(0, 5, n)
+    angles[rng.random(n) < 0.05] = np.nan
+    return angles
+
+
+def check_parity(path: str, frames: int = 2000) -> int:
+    """Alternate frames between two store handles (two 'workers') and compare with one in-process manager."""
+    workers = [SharedSessionStore(path, SLOTS), SharedSessionStore(path, SLOTS)]
+    reference = SessionManager()
+    mismatches = 0
+    for i, angle in enumerate(angle_sequence(frames)):
+        for session in ("parity_a", "parity_b"):
+            mismatches += workers[i % 2].update(session, "squats", angle) != reference.update(session, "squats", angle)
+    for store in workers:
+        store.close()
+    return mismatches
+
+
+def worker(backend: str, path: str, worker_id: int, updates: int, n_sessions: int, start, results):
+    store = SharedSessionStore(path, SLOTS) if backend == "shm" else SessionManager()
+    angles = angle_sequence(updates, seed=worker_id).tolist()
+    # Half the sessions are shared by all workers, as with load-balanced requests
+    session_ids = [f"s{i}" if i % 2 else f"w{worker_id}_s{i}" for i in range(n_sessions)]
+    start.wait()
+    t0 = time.perf_counter()
+    for i, angle in enumerate(angles):
+        store.update(session_ids[i % n_sessions], "squats", angle)
+    results.put(time.perf_counter() - t0)
+
+
+def run(backend: str, path: str, n_workers: int, updates: int, n_sessions: int) -> float:
+    ctx = mp.get_context("fork")
+    start, results = ctx.Barrier(n_workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(backend, path, w, updates, n_sessions, start, results))
+             for w in range(n_workers)]
+    for p in procs:
+        p.start()
+    elapsed = max(results.get() for _ in procs)
+    for p in procs:
+        p.join()
+    return n_workers * updates / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--updates", type=int, default=20000, help="updates per worker")
+    parser.add_argument("--sessions", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions")
+        mismatches = check_parity(path)
+        print(f"parity: {mismatches} mismatching rep counts")
+
+        print(f"{'workers':>8}{'memory upd/s':>15}{'shm upd/s':>12}")
+        for n_workers in (1, 2, 4, 8):
+            memory = run("memory", path, n_workers, args.updates, args.sessions)
+            shm = run("shm", path, n_workers, args.updates, args.sessions)
+            print(f"{n_workers:>8}{memory:>15.0f}{shm:>12.0f}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Worker cold-start benchmark.
+
+Measures time-to-first-prediction in fresh interpreters: importing the
+service, loading models and classifying one frame. Compares the pickle
+path (MODEL_BACKEND=library), the default that unpickles the model and maps
+its bundle for small batches (auto), and the bundle alone (compiled). The
+bundle is exported to a temporary directory first.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_startup.py [--runs 5]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import common  # noqa: F401 - puts backend/ai on sys.path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from app.infer import MODELS_DIR  # noqa: E402
+from regenerate_models import export_compiled_model  # noqa: E402
+
+CHILD = """
+import time
+t0 = time.perf_counter()
+import numpy as np
+from app.infer import classifier
+classifier.load()
+classifier.predict_batch([(np.full((33, 3), 0.7), "startup", None)])
+print(time.perf_counter() - t0, classifier.backend)
+"""
+
+
+def first_prediction(env) -> tuple:
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, cwd=Path(__file__).parent.parent,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return time.perf_counter() - t0, float(out[0]), out[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bundle_dir:
+        logging.disable(logging.INFO)
+        if not export_compiled_model(MODELS_DIR, Path(bundle_dir)):
+            raise SystemExit("Could not export the compiled bundle - check MODELS_DIR")
+
+        base = {**os.environ, "MODELS_DIR": str(MODELS_DIR), "COMPILED_MODEL_DIR": bundle_dir}
+        modes = [("pickle", {**base, "MODEL_BACKEND": "library"}), ("auto", {**base, "MODEL_BACKEND": "auto"}),
+                 ("bundle", {**base, "MODEL_BACKEND": "compiled"})]
+        print(f"{'mode':<8}{'backend':<10}{'process s':>11}{'in-process s':>14}")
+        for label, env in modes:
+            runs = [first_prediction(env) for _ in range(args.runs)]
+            wall = statistics.median(r[0] for r in runs)
+            inproc = statistics.median(r[1] for r in runs)
+            print(f"{label:<8}{runs[0][2]:<10}{wall:>11.3f}{inproc:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+WebSocket vs REST load test.
+
+Starts the service under uvicorn, then simulates N browser sessions, each
+producing frames at a fixed camera rate. In REST mode every frame is its
+own POST /analyze (as the frontend does today); in WebSocket mode each
+session keeps one /ws/analyze connection and sends float32 frames.
+Reports sustained processed frames/s, p50/p99 latency from sending a frame
+to receiving its result, and frames dropped as stale by the server.
+
+Usage:
+    MODELS_DIR=models python benchmarks/bench_stream.py [--clients 32] [--fps 30] [--seconds 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import websockets
+
+from common import synthetic_frames
+
+AI_DIR = Path(__file__).parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=AI_DIR, env=dict(os.environ),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").json()["model_loaded"]:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("Service did not load a model - set MODELS_DIR to a directory with the trained models")
+
+
+async def rest_client(base: str, session_id: str, payloads, fps: float, seconds: float, latencies):
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        async def send(body):
+            t0 = time.perf_counter()
+            (await client.post("/analyze", content=body, headers={"content-type": "application/json"})).raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+        tasks, i = [], 0
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            tasks.append(asyncio.create_task(send(payloads[i % len(payloads)].replace(b"SESSION", session_id.encode()))))
+            i += 1
+            await asyncio.sleep(1.0 / fps)
+        await asyncio.gather(*tasks)
+        return 0
+
+
+async def ws_client(base: str, session_id: str, frames, fps: float, seconds: float, latencies):
+    url = f"{base.replace('http', 'ws')}/ws/analyze?session_id={session_id}&exercise=squats"
+    async with websockets.connect(url) as ws:
+        sent = {}
+
+        async def sender():
+            seq = 0
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                seq += 1
+                sent[seq] = time.perf_counter()
+                await ws.send(frames[seq % len(frames)])
+                await asyncio.sleep(1.0 / fps)
+            return seq
+
+        task = asyncio.create_task(sender())
+        dropped = 0
+        while True:
+            try:
+                result = json.loads(await asyncio.wait_for(ws.recv(), timeout=5.0))
+            except asyncio.TimeoutError:
+                break
+            latencies.append(time.perf_counter() - sent[result["frame"]])
+            dropped = result["dropped"]
+            if task.done() and result["frame"] + dropped >= task.result():
+                break
+        await task
+        return dropped
+
+
+async def run(mode: str, base: str, args, frames):
+    latencies = []
+    if mode == "rest":
+        payloads = [json.dumps({
+            "landmarks": [{"x": x, "y": y, "visibility": v} for x, y, v in frame.tolist()],
+            "session_id": "SESSION", "exercise": "squats",
+        }).encode() for frame in frames]
+        client, data = rest_client, payloads
+    else:
+        client, data = ws_client, [frame.astype("<f4").tobytes() for frame in frames]
+    t0 = time.perf_counter()
+    dropped = await asyncio.gather(*[
+        client(base, f"bench_{mode}_{c}", data, args.fps, args.seconds, latencies) for c in range(args.clients)
+    ])
+    elapsed = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000.0
+    print(f"{mode:>6}{len(lat) / elapsed:>12.0f}{np.percentile(lat, 50):>10.1f}{np.percentile(lat, 99):>10.1f}"
+          f"{sum(dropped):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(port)
+    try:
+        frames = synthetic_frames(64)
+        print(f"{args.clients} clients x {args.fps:g} fps offered ({args.clients * args.fps:g} frames/s)")
+        print(f"{'mode':>6}{'frames/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'dropped':>10}")
+        for mode in ("rest", "ws"):
+            asyncio.run(run(mode, f"http://127.0.0.1:{port}", args, frames))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
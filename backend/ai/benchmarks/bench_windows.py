@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Rolling-window feature benchmark.
+
+Streams synthetic frames through `FeatureWindows` and checks the returned
+mean/std rows against a full recomputation over the last `window` frames
+(pandas-style rolling mean/std), then compares the per-frame cost of the
+incremental update with that recomputation for several window sizes and
+reports memory per session.
+
+Usage:
+    python benchmarks/bench_windows.py [--frames 5000] [--sessions 1000]
+"""
+
+import argparse
+import tracemalloc
+from collections import deque
+
+import numpy as np
+
+from common import synthetic_frames, timeit
+
+from app.preprocess import compute_features
+from app.windows import FeatureWindows
+
+
+def recompute(history: deque, ddof: int) -> np.ndarray:
+    rows = np.array(history)
+    std = rows.std(axis=0, ddof=ddof) if len(rows) > ddof else np.zeros(rows.shape[1])
+    return np.concatenate([rows.mean(axis=0), std])
+
+
+def check_parity(feats: np.ndarray, window: int, ddof: int) -> float:
+    windows = FeatureWindows(window, ddof)
+    history = deque(maxlen=window)
+    worst = 0.0
+    for row in feats:
+        got = windows.push("s", row)
+        history.append(np.where(np.isnan(row), 0.0, row))
+        worst = max(worst, float(np.abs(got - recompute(history, ddof)).max()))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    args = parser.parse_args()
+
+    feats = compute_features(synthetic_frames(args.frames, dropout=0.05))
+    print(f"{'window':>8}{'max abs err':>14}{'incremental us':>16}{'recompute us':>14}")
+    for window in (10, 30, 120):
+        error = check_parity(feats, window, ddof=1)
+
+        windows = FeatureWindows(window, ddof=1)
+        rows = iter(np.tile(feats, (50, 1)))
+        incremental = timeit(lambda: windows.push("s", next(rows)), number=2000)
+
+        history = deque(np.nan_to_num(feats[:window]), maxlen=window)
+        rows = iter(np.tile(feats, (50, 1)))
+
+        def naive():
+            history.append(np.nan_to_num(next(rows)))
+            return recompute(history, 1)
+
+        full = timeit(naive, number=2000)
+        print(f"{window:>8}{error:>14.2e}{incremental * 1e6:>16.1f}{full * 1e6:>14.1f}")
+
+    windows = FeatureWindows(30)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(args.sessions):
+        windows.push(f"session_{i}", feats[i % len(feats)])
+    per_session = (tracemalloc.get_traced_memory()[0] - before) / args.sessions
+    tracemalloc.stop()
+    print(f"\nmemory per session (window=30): {per_session:.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
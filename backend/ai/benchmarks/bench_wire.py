@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Wire format benchmark.
+
+Compares the per-frame cost of turning a request body into the (33, 3)
+landmark array the classifier consumes: JSON parsing + pydantic validation
+of `AnalyzeRequest` + `landmarks_to_array`, against `app.wire.decode_frame`
+for float32 and float16 frames. Also reports payload sizes and the largest
+feature difference caused by the narrower dtypes.
+
+Usage:
+    python benchmarks/bench_wire.py [--frames 200]
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from common import synthetic_frames, timeit
+
+from app.preprocess import compute_features, landmarks_to_array
+from app.schemas import AnalyzeRequest
+from app.wire import decode_frame, encode_frame
+
+SESSION_ID = "3f2b8c1e-5d4a-4f6b-9c2d-7e8a1b0c9d4e"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.frames)
+    bodies = {
+        "json": [json.dumps({
+            "landmarks": [{"x": x, "y": y, "visibility": v} for x, y, v in frame.tolist()],
+            "session_id": SESSION_ID, "exercise": "squats",
+        }).encode() for frame in frames],
+        "float32": [encode_frame(frame, SESSION_ID, "squats", np.float32) for frame in frames],
+        "float16": [encode_frame(frame, SESSION_ID, "squats", np.float16) for frame in frames],
+    }
+
+    def decode_json(body):
+        req = AnalyzeRequest.model_validate_json(body)
+        return landmarks_to_array(req.landmarks), req.session_id, req.exercise
+
+    decoders = {"json": decode_json, "float32": decode_frame, "float16": decode_frame}
+    reference = compute_features(frames)
+
+    print(f"{'format':>8}{'bytes':>8}{'us/frame':>10}{'max feature err':>17}")
+    base = None
+    for name, body_list in bodies.items():
+        decode = decoders[name]
+        decoded = np.stack([decode(body)[0] for body in body_list])
+        error = np.nanmax(np.abs(compute_features(decoded) - reference))
+        t = timeit(lambda: [decode(body) for body in body_list], repeat=5) / len(body_list)
+        base = base or t
+        speedup = "" if name == "json" else f"  ({base / t:.0f}x)"
+        print(f"{name:>8}{len(body_list[0]):>8}{t * 1e6:>10.1f}{error:>17.2e}{speedup}")
+
+
+if __name__ == "__main__":
+    main()
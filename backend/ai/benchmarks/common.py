@@ -0,0 +1,115 @@
+"""Shared helpers for the AI service benchmarks."""
+
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+# Make `app` importable when running `python benchmarks/<script>.py` from backend/ai
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.schemas import Landmark  # noqa: E402
+
+
+def synthetic_frames(n: int, seed: int = 0, dropout: float = 0.05) -> np.ndarray:
+    """Random (n, 33, 3) [x, y, visibility] frames with some landmarks below the visibility cutoff."""
+    rng = np.random.default_rng(seed)
+    frames = np.empty((n, 33, 3))
+    frames[..., :2] = rng.uniform(0.05, 0.95, (n, 33, 2))
+    frames[..., 2] = rng.uniform(0.6, 1.0, (n, 33))
+    frames[..., 2][rng.random((n, 33)) < dropout] = rng.uniform(0.0, 0.5)
+    return frames
+
+
+# Standing pose, image coordinates, for the landmarks the features use
+_POSE = {
+    0: (0.50, 0.18), 11: (0.42, 0.30), 12: (0.58, 0.30), 13: (0.40, 0.43), 14: (0.60, 0.43),
+    15: (0.40, 0.55), 16: (0.60, 0.55), 23: (0.45, 0.56), 24: (0.55, 0.56), 25: (0.45, 0.73),
+    26: (0.55, 0.73), 27: (0.45, 0.90), 28: (0.55, 0.90),
+}
+# Limbs whose landmarks are occluded together: (joint, moving end) chains
+_LIMBS = {'left_arm': (13, 15, 17, 19, 21), 'right_arm': (14, 16, 18, 20, 22),
+          'left_leg': (25, 27, 29, 31), 'right_leg': (26, 28, 30, 32)}
+# Remaining BlazePose landmarks sit next to the nearest modelled one
+_ANCHOR = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0, 8: 0, 9: 0, 10: 0, 17: 15, 18: 16, 19: 15, 20: 16,
+           21: 15, 22: 16, 29: 27, 30: 28, 31: 27, 32: 28}
+
+
+def _rotate(v: np.ndarray, degrees: np.ndarray) -> np.ndarray:
+    r = np.radians(degrees)
+    c, s = np.cos(r), np.sin(r)
+    return np.stack([c * v[..., 0] - s * v[..., 1], s * v[..., 0] + c * v[..., 1]], axis=-1)
+
+
+def pose_sequence(n: int, seed: int = 0, period: float = 45.0, dropout: float = 0.05,
+                  burst: int = 8, jitter: float = 0.004, low: float = 40.0, high: float = 170.0,
+                  occluded_limbs: Sequence[str] = (), return_angle: bool = False):
+    """A (n, 33, 3) exercise-like clip: elbows and knees flex between `low` and `high` degrees.
+
+    Visibility drops like a real camera feed: whole limbs go below the 0.5
+    cutoff for bursts of about `burst` frames (a fraction `dropout` of limb
+    frames overall, 0.7 for limbs in `occluded_limbs`, e.g. "left_leg"), on
+    top of sparse single-landmark flicker. With `return_angle`, returns
+    (frames, noise-free joint angle per frame).
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    phase = rng.uniform(0, 2 * np.pi)
+    # Joint angle at each frame (degrees); both sides move together with a small lag
+    angle = (low + high) / 2 + (high - low) / 2 * np.sin(2 * np.pi * t / period + phase)
+
+    xy = np.zeros((n, 33, 2))
+    for i, p in _POSE.items():
+        xy[:, i] = p
+    for (upper, joint, end), sign in (((11, 13, 15), 1), ((12, 14, 16), -1), ((23, 25, 27), -1), ((24, 26, 28), 1)):
+        bone = xy[:, upper] - xy[:, joint]
+        length = np.linalg.norm(xy[0, end] - xy[0, joint])
+        unit = bone / np.linalg.norm(bone, axis=-1, keepdims=True)
+        xy[:, end] = xy[:, joint] + length * _rotate(unit, sign * angle)
+    for i, anchor in _ANCHOR.items():
+        xy[:, i] = xy[:, anchor] + rng.normal(0, 0.01, 2)
+    xy += rng.normal(0, jitter, xy.shape)
+
+    vis = rng.uniform(0.75, 1.0, (n, 33))
+    vis[rng.random((n, 33)) < dropout / 10] = 0.3
+    for name, limb in _LIMBS.items():
+        # Two-state (visible / occluded) Markov chain per limb
+        p = 0.7 if name in occluded_limbs else dropout
+        start, stop = p / (burst * (1 - p)), 1.0 / burst
+        hidden, occluded = False, np.zeros(n, dtype=bool)
+        for k, u in enumerate(rng.random(n)):
+            hidden = u >= stop if hidden else u < start
+            occluded[k] = hidden
+        vis[np.ix_(occluded, limb)] = rng.uniform(0.05, 0.45, (occluded.sum(), len(limb)))
+
+    frames = np.empty((n, 33, 3))
+    frames[..., :2] = np.clip(xy, 0.0, 1.0)
+    frames[..., 2] = vis
+    return (frames, angle) if return_angle else frames
+
+
+def to_landmarks(frame: np.ndarray) -> List[Landmark]:
+    return [Landmark(x=x, y=y, visibility=v) for x, y, v in frame]
+
+
+def timeit(fn: Callable[[], object], repeat: int = 5, number: int = 1) -> float:
+    """Best-of-`repeat` wall time in seconds for `number` calls of fn."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return best / number
+
+
+def load_classifier():
+    """Load the service classifier from MODELS_DIR, exiting if no model is available."""
+    from app.infer import classifier
+
+    classifier.load()
+    if not classifier.is_loaded:
+        raise SystemExit("Model not loaded - set MODELS_DIR to a directory with the trained models")
+    return classifier
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Rep-counting accuracy of fixed vs calibrated thresholds.
+
+Counts reps in every sequence twice from the same compute_features rows:
+with `rep_counter.THRESHOLDS` on the left-side angle (the default service
+behaviour), and with `app.calibration` choosing thresholds and side online
+(REP_CALIBRATION=1). Reports each sequence's true and counted reps, then
+exact-match rate, mean absolute error and per-frame counting cost of both.
+
+Recorded sequences are read with `app.batch.read_chunks` and need a labels
+file, one JSON object per line: {"sequence_id": ..., "exercise": ...,
+"reps": ...} (sequence ids as app.batch reports them). Without inputs,
+synthetic workouts are generated: full, shallow and offset ranges of
+motion, and clips where the left limb is mostly occluded.
+
+Usage:
+    python benchmarks/eval_calibration.py [--seeds 3]
+    python benchmarks/eval_calibration.py recordings/*.npy --labels labels.jsonl
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import pose_sequence
+
+from app import rep_counter
+from app.batch import read_chunks
+from app.calibration import Calibrator
+from app.preprocess import compute_features, get_primary_angle, get_primary_angles
+from app.rep_counter import RepCounter
+
+# name: (exercise, low angle, high angle, occluded limbs)
+SCENARIOS = {
+    "squat full": ("squats", 40.0, 170.0, ()),
+    "squat shallow": ("squats", 100.0, 165.0, ()),
+    "squat offset": ("squats", 70.0, 150.0, ()),
+    "squat left hidden": ("squats", 60.0, 165.0, ("left_leg",)),
+    "curl full": ("bicep_curls", 40.0, 170.0, ()),
+    "curl partial": ("bicep_curls", 70.0, 135.0, ()),
+    "curl left hidden": ("bicep_curls", 45.0, 160.0, ("left_arm",)),
+}
+
+
+def true_reps(angle: np.ndarray) -> int:
+    """Down-then-up cycles through the outer quarters of the clip's own range."""
+    lo, hi = angle.min(), angle.max()
+    down_at, up_at = lo + 0.25 * (hi - lo), hi - 0.25 * (hi - lo)
+    reps, down = 0, False
+    for a in angle:
+        if not down and a < down_at:
+            down = True
+        elif down and a > up_at:
+            reps, down = reps + 1, False
+    return reps
+
+
+def synthetic(seeds: int, frames: int):
+    for name, (exercise, low, high, occluded) in SCENARIOS.items():
+        for seed in range(seeds):
+            period = 35.0 + 10 * seed
+            pts, angle = pose_sequence(frames, seed=seed, period=period, low=low, high=high,
+                                       occluded_limbs=occluded, return_angle=True)
+            yield f"{name} #{seed}", exercise, pts, true_reps(angle)
+
+
+def recorded(paths, labels_path: Path):
+    labels = {}
+    for line in labels_path.read_text().splitlines():
+        if line.strip():
+            rec = json.loads(line)
+            labels[str(rec["sequence_id"])] = rec
+    for path in paths:
+        sequences = {}
+        for sequence_id, exercise, pts in read_chunks(path):
+            sequences.setdefault(sequence_id, []).append(pts)
+        for sequence_id, chunks in sequences.items():
+            label = labels.get(sequence_id)
+            if label is None:
+                print(f"  (skipped {sequence_id}: no label)")
+                continue
+            yield sequence_id, label["exercise"], np.concatenate(chunks), int(label["reps"])
+
+
+def count_fixed(feats: np.ndarray, exercise: str):
+    counter = RepCounter()
+    down, up = rep_counter.THRESHOLDS.get(exercise, (55, 160))
+    angles = [get_primary_angle(row, exercise) for row in feats]
+    t0 = time.perf_counter()
+    for angle in angles:
+        counter.update(angle, down, up)
+    return counter.count, time.perf_counter() - t0
+
+
+def count_calibrated(feats: np.ndarray, exercise: str):
+    counter, calibrator = RepCounter(), Calibrator()
+    down, up = rep_counter.THRESHOLDS.get(exercise, (55, 160))
+    angles = [get_primary_angles(row, exercise) for row in feats]
+    t0 = time.perf_counter()
+    for left, right in angles:
+        angle, thresholds, min_count, switched = calibrator.update(left, right)
+        if switched:
+            counter.restart_smoothing()
+        counter.credit(min_count)
+        counter.update(angle, *(thresholds or (down, up)))
+    return counter.count, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("inputs", nargs="*", type=Path, help="Recorded .npy/.csv/.jsonl sequences")
+    parser.add_argument("--labels", type=Path, help="JSONL {sequence_id, exercise, reps} for the inputs")
+    parser.add_argument("--seeds", type=int, default=3, help="Synthetic clips per scenario")
+    parser.add_argument("--frames", type=int, default=600, help="Frames per synthetic clip")
+    args = parser.parse_args()
+    if args.inputs and not args.labels:
+        parser.error("recorded inputs need --labels")
+
+    sequences = recorded(args.inputs, args.labels) if args.inputs else synthetic(args.seeds, args.frames)
+    print(f"{'sequence':<24}{'true':>6}{'fixed':>7}{'calibrated':>12}")
+    rows, frames, cost = [], 0, np.zeros(2)
+    for name, exercise, pts, reps in sequences:
+        feats = compute_features(pts)
+        fixed, t_fixed = count_fixed(feats, exercise)
+        calibrated, t_cal = count_calibrated(feats, exercise)
+        rows.append((reps, fixed, calibrated))
+        frames += len(feats)
+        cost += (t_fixed, t_cal)
+        print(f"{name:<24}{reps:>6}{fixed:>7}{calibrated:>12}")
+
+    truth, fixed, calibrated = np.array(rows).T
+    print(f"\n{len(rows)} sequences, {frames} frames")
+    for label, counts, seconds in (("fixed", fixed, cost[0]), ("calibrated", calibrated, cost[1])):
+        print(f"{label:>10}: exact {np.mean(counts == truth):6.1%}  MAE {np.mean(np.abs(counts - truth)):5.2f} reps  "
+              f"{seconds / frames * 1e6:5.1f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite runner.
+
+Times every hot-path stage of preprocess.py, windows.py, infer.py and
+rep_counter.py on synthetic exercise clips with burst visibility dropouts
+(`common.pose_sequence`), then load-tests /analyze in-process through the
+ASGI app over a grid of concurrency x distinct sessions. Results are
+written as JSON; with --baseline the run fails (exit 1) when any metric is
+worse than the baseline by more than --threshold.
+
+Usage:
+    MODELS_DIR=models python benchmarks/run.py --output bench.json
+    MODELS_DIR=models python benchmarks/run.py --baseline bench.json --threshold 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import httpx
+import numpy as np
+
+from common import pose_sequence, timeit, to_landmarks
+
+from app.preprocess import (
+    FEATURE_NAMES, compute_features, extract_features, feature_column_index, features_to_matrix, landmarks_to_array,
+)
+from app.rep_counter import RepCounter, RepCounterBank, SessionManager, THRESHOLDS
+from app.windows import FeatureWindows
+
+DOWN, UP = THRESHOLDS['squats']
+
+# Concurrency x distinct sessions for the ASGI load test
+LOAD_GRID = [(1, 1), (8, 8), (32, 32), (32, 1024)]
+
+
+class Suite:
+    def __init__(self, only: List[str], scale: float):
+        self.only = only
+        self.scale = scale
+        self.results: Dict[str, dict] = {}
+
+    def wanted(self, name: str) -> bool:
+        return not self.only or any(name.startswith(prefix) for prefix in self.only)
+
+    def record(self, name: str, value: float, unit: str, better: str = "lower"):
+        self.results[name] = {"value": value, "unit": unit, "better": better}
+        print(f"  {name:<48}{value:>12.2f} {unit}")
+
+    def micro(self, name: str, fn: Callable[[], object], per: int = 1, number: int = 200):
+        """Best-of-5 time per call of fn, divided by `per` items handled per call."""
+        if self.wanted(name):
+            number = max(1, int(number * self.scale))
+            self.record(name, timeit(fn, repeat=5, number=number) / per * 1e6, "us")
+
+
+def bench_preprocess(suite: Suite, frames: np.ndarray):
+    print("preprocess")
+    landmarks = to_landmarks(frames[0])
+    suite.micro("preprocess.landmarks_to_array", lambda: landmarks_to_array(landmarks), number=2000)
+    suite.micro("preprocess.extract_features", lambda: extract_features(landmarks), number=1000)
+    suite.micro("preprocess.compute_features[1]", lambda: compute_features(frames[0]), number=2000)
+    suite.micro("preprocess.compute_features[256]", lambda: compute_features(frames[:256]), per=256, number=100)
+    col_index = feature_column_index([f"{n}_{s}" for s in ("mean", "std") for n in FEATURE_NAMES])
+    stats = np.random.default_rng(0).normal(size=(256, 2 * len(FEATURE_NAMES)))
+    suite.micro("preprocess.features_to_matrix[256]", lambda: features_to_matrix(stats, col_index), per=256, number=500)
+
+
+def bench_windows(suite: Suite, feats: np.ndarray):
+    print("windows")
+    windows = FeatureWindows(30)
+    rows = iter(np.tile(feats, (20, 1)))
+    suite.micro("windows.push", lambda: windows.push("s", next(rows)), number=2000)
+    many = FeatureWindows(30)
+    suite.micro("windows.push_many[256]", lambda: many.push_many("s", feats[:256]), per=256, number=50)
+
+
+def bench_rep_counter(suite: Suite, feats: np.ndarray):
+    print("rep_counter")
+    angles = feats[:, 2]
+    counter = RepCounter()
+    stream = iter(np.tile(angles, 20))
+    suite.micro("rep_counter.RepCounter.update", lambda: counter.update(next(stream), DOWN, UP), number=5000)
+
+    manager = SessionManager()
+    stream = iter(np.tile(angles, 20))
+    ids = [f"session_{i}" for i in range(1024)]
+    k = iter(range(10 ** 9))
+    suite.micro("rep_counter.SessionManager.update[1024 sessions]",
+                lambda: manager.update(ids[next(k) % 1024], "squats", next(stream)), number=5000)
+
+    bank = RepCounterBank(256)
+    slots = np.array([bank.add() for _ in range(256)])
+    # Frame k of the 256 counters: 256 consecutive angles of the clip starting at k
+    rows = iter(np.tile(np.lib.stride_tricks.sliding_window_view(angles, 256), (5, 1)))
+    suite.micro("rep_counter.RepCounterBank.step[256]",
+                lambda: bank.step(slots, next(rows), DOWN, UP), per=256, number=500)
+
+
+def bench_infer(suite: Suite, frames: np.ndarray):
+    print("infer")
+    from app.infer import classifier
+
+    classifier.load()
+    if not classifier.is_loaded:
+        print("  (skipped: no model - set MODELS_DIR)")
+        return
+    landmarks = to_landmarks(frames[0])
+    suite.micro("infer.Classifier.predict", lambda: classifier.predict(landmarks, "bench_predict"), number=300)
+    batch = [(pts, f"bench_batch_{i}", None) for i, pts in enumerate(frames[:64])]
+    suite.micro("infer.Classifier.predict_batch[64]", lambda: classifier.predict_batch(batch), per=64, number=30)
+    stats = FeatureWindows(30).push_many("s", compute_features(frames[:256]))
+    suite.micro("infer.Classifier.predict_stats[256]", lambda: classifier.predict_stats(stats), per=256, number=30)
+
+
+async def _load(concurrency: int, n_sessions: int, requests: int, payloads: List[bytes]):
+    from app.main import app
+
+    latencies = []
+    counter = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            body = payloads[i % len(payloads)].replace(b"SESSION", f"load_{n_sessions}_{i % n_sessions}".encode())
+            t0 = time.perf_counter()
+            resp = await client.post("/analyze", content=body, headers={"content-type": "application/json"})
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - t0
+    return requests / elapsed, float(np.percentile(np.array(latencies) * 1000.0, 99))
+
+
+def bench_load(suite: Suite, frames: np.ndarray):
+    print("load (in-process ASGI /analyze)")
+    from app.infer import classifier
+
+    if not classifier.is_loaded:
+        print("  (skipped: no model - set MODELS_DIR)")
+        return
+    payloads = [json.dumps({
+        "landmarks": [{"x": x, "y": y, "visibility": v} for x, y, v in frame.tolist()],
+        "session_id": "SESSION", "exercise": "squats",
+    }).encode() for frame in frames[:64]]
+    requests = max(50, int(600 * suite.scale))
+    for concurrency, n_sessions in LOAD_GRID:
+        name = f"load.analyze[c={concurrency},s={n_sessions}]"
+        if not suite.wanted(name):
+            continue
+        throughput, p99 = asyncio.run(_load(concurrency, n_sessions, requests, payloads))
+        suite.record(f"{name}.frames_per_s", throughput, "frames/s", better="higher")
+        suite.record(f"{name}.p99_ms", p99, "ms")
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Names of metrics that are worse than the baseline by more than threshold (relative)."""
+    regressions = []
+    print(f"\n{'metric':<56}{'baseline':>12}{'now':>12}{'change':>9}")
+    for name, now in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if now["better"] == "lower":
+            worse = now["value"] / base["value"] - 1.0
+        else:
+            worse = base["value"] / now["value"] - 1.0
+        flag = "  REGRESSION" if worse > threshold else ""
+        print(f"{name:<56}{base['value']:>12.2f}{now['value']:>12.2f}{-worse:>+9.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative slowdown per metric before failing (default: 0.25)")
+    parser.add_argument("--only", nargs="*", default=[], help="Run only metrics starting with these prefixes")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations (noisier)")
+    parser.add_argument("--skip-load", action="store_true", help="Skip the ASGI load test")
+    args = parser.parse_args()
+
+    suite = Suite(args.only, 0.2 if args.quick else 1.0)
+    frames = pose_sequence(2048, seed=0)
+    feats = compute_features(frames)
+    bench_preprocess(suite, frames)
+    bench_windows(suite, feats)
+    bench_rep_counter(suite, feats)
+    bench_infer(suite, frames)
+    if not args.skip_load:
+        bench_load(suite, frames)
+
+    from app.infer import classifier
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_backend": classifier.backend if classifier.is_loaded else None,
+        },
+        "results": suite.results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(suite.results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Build smaller, faster variants of the served tree ensemble and keep the Pareto-optimal ones.
+
+Starting from the model the service would load (or --model), candidates are
+made by:
+
+- truncating the ensemble to its first trees (boosting rounds for XGBoost)
+- retraining with a lower max_depth
+- retraining on the most important features only
+- distilling xgb_enhanced.pkl into shallow random forests, trained on its
+  predicted labels for the training rows and jittered copies of them
+
+Every candidate is compiled (app.compiled) and measured on the held-out rows
+of train_test_split.json: accuracy, macro F1, size, and single-row and batch
+predict_proba latency as the service runs it with the default backend (the
+compiled model, or the library model for batches past one dense block).
+Candidates that another one matches or beats on accuracy and both latencies
+are dropped. The rest are written to models/variants/<name>/, each laid out
+like MODELS_DIR (model pickle, label encoder, feature metadata and compiled
+bundle), with models/variants/manifest.json listing their measurements. With
+LATENCY_BUDGET_MS set, the service serves the most accurate variant whose
+single-row latency fits the budget.
+
+The training table is not part of the repository: --data is a CSV with one
+row per feature window, the enhanced feature columns, a label column (class
+names) and optionally a video column. Held-out rows are the test videos'
+when the video column is present, else the rows at test_indices.
+
+Latencies are measured on the machine running this script; run it on the
+serving hardware.
+
+Usage:
+    python scripts/prune_models.py --data windows.csv [--output models/variants]
+"""
+
+import argparse
+import copy
+import csv
+import json
+import logging
+import os
+import pickle
+import platform
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import f1_score
+
+from app.compiled import HybridPredictor, compile_model, file_sha256, parity_error, save_artifact
+from app.infer import COMPILED_PARITY_TOL
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+# Same priority order as Classifier.load
+MODEL_FILES = ["xgb_enhanced.pkl", "rf_enhanced.pkl", "rf_baseline.pkl"]
+# Jittered copies of the training rows labelled by the teacher, and their noise in column standard deviations
+DISTILL_COPIES = 2
+DISTILL_NOISE = 0.1
+
+
+def load_table(path: Path, feature_cols, label_column: str, video_column: str):
+    """(X, labels, videos or None) from a CSV with a header row; empty cells are NaN."""
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = [col for col in list(feature_cols) + [label_column] if col not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} has no column(s) {missing}")
+        has_video = video_column in reader.fieldnames
+        rows, labels, videos = [], [], []
+        for record in reader:
+            rows.append([float(record[col]) if record[col] not in ("", None) else np.nan for col in feature_cols])
+            labels.append(record[label_column])
+            if has_video:
+                videos.append(record[video_column])
+    return np.array(rows, dtype=np.float64), np.array(labels), np.array(videos) if has_video else None
+
+
+def held_out_mask(n: int, videos, split: dict) -> np.ndarray:
+    test = np.zeros(n, dtype=bool)
+    if videos is not None and split.get("test_videos"):
+        test[np.isin(videos, split["test_videos"])] = True
+    else:
+        indices = np.asarray(split.get("test_indices", []), dtype=np.intp)
+        if len(indices) and indices.max() >= n:
+            raise ValueError(f"test_indices go up to {indices.max()} but the data has {n} rows")
+        test[indices] = True
+    if not test.any() or test.all():
+        raise ValueError("The split leaves no held-out or no training rows")
+    return test
+
+
+def load_source(models_dir: Path, name: str = None):
+    for model_file in [name] if name else MODEL_FILES:
+        path = models_dir / model_file
+        if not path.exists():
+            continue
+        try:
+            return path, joblib.load(path)
+        except Exception as e:
+            logger.warning(f"Could not load {model_file}: {e}, trying next model...")
+    raise RuntimeError("No model file could be loaded")
+
+
+def max_depth(model) -> int:
+    return compile_model(model).max_depth
+
+
+def truncate(model, fraction: float):
+    """The model's first trees (boosting rounds); None if that leaves it unchanged."""
+    if hasattr(model, "get_booster"):
+        from xgboost import XGBClassifier
+
+        booster = model.get_booster()
+        rounds = max(1, int(booster.num_boosted_rounds() * fraction))
+        if rounds >= booster.num_boosted_rounds():
+            return None
+        truncated = XGBClassifier()
+        truncated.load_model(bytearray(booster[:rounds].save_raw("ubj")))
+        return truncated, {"rounds": rounds}
+    trees = max(1, int(len(model.estimators_) * fraction))
+    if trees >= len(model.estimators_):
+        return None
+    truncated = copy.deepcopy(model)
+    truncated.estimators_ = truncated.estimators_[:trees]
+    truncated.n_estimators = trees
+    return truncated, {"trees": trees}
+
+
+def fit(model, X: np.ndarray, y: np.ndarray, what: str):
+    """model.fit(X, y), or None (logged) if this estimator cannot be fitted on the data, e.g. NaNs."""
+    logger.info(f"{what}...")
+    try:
+        return model.fit(X, y)
+    except Exception as e:
+        logger.warning(f"{what} failed: {e}, skipping")
+        return None
+
+
+def candidates(source, teacher, feature_cols, X_train, y_train, args):
+    """(name, kind, params, fitted model, feature columns) for every candidate."""
+    all_cols = list(feature_cols)
+    yield "source", "source", {}, source, all_cols
+
+    for fraction in args.tree_fractions:
+        result = truncate(source, fraction)
+        if result is not None:
+            model, params = result
+            (unit, count), = params.items()
+            yield f"{unit}-{count}", "truncated", params, model, all_cols
+
+    depth = max_depth(source)
+    for d in args.depths:
+        if d < depth:
+            model = fit(clone(source).set_params(max_depth=d), X_train, y_train, f"Retraining with max_depth={d}")
+            if model is not None:
+                yield f"depth-{d}", "depth", {"max_depth": d}, model, all_cols
+
+    importances = np.asarray(getattr(source, "feature_importances_", []))
+    for k in args.feature_counts:
+        if len(importances) == len(all_cols) and k < len(all_cols):
+            keep = np.sort(np.argsort(importances)[::-1][:k])
+            model = fit(clone(source), X_train[:, keep], y_train, f"Retraining on the {k} most important features")
+            if model is not None:
+                yield f"features-{k}", "features", {"features": k}, model, [all_cols[i] for i in keep]
+
+    if teacher is not None:
+        rng = np.random.default_rng(0)
+        noise = DISTILL_NOISE * np.nanstd(X_train, axis=0)
+        X_aug = np.concatenate([X_train] + [X_train + rng.normal(0.0, 1.0, X_train.shape) * noise
+                                            for _ in range(DISTILL_COPIES)])
+        y_aug = teacher.predict(X_aug)
+        if len(np.unique(y_aug)) < len(np.unique(y_train)):
+            logger.warning("The teacher never predicts some classes, skipping distillation")
+            return
+        for spec in args.distill:
+            n_trees, d = (int(v) for v in spec.split("x"))
+            model = fit(RandomForestClassifier(n_estimators=n_trees, max_depth=d, random_state=0, n_jobs=-1),
+                        X_aug, y_aug, f"Distilling {type(teacher).__name__} into {n_trees} trees of depth {d}")
+            if model is not None:
+                yield f"distilled-{n_trees}x{d}", "distilled", {"trees": n_trees, "max_depth": d}, model, all_cols
+
+
+def latency_ms(predict, X: np.ndarray, batch: int, repeat: int):
+    """(median, p99) milliseconds of predict on `batch` rows at a time."""
+    rows = np.resize(X, (max(batch, len(X)), X.shape[1]))
+    times = []
+    for i in range(repeat):
+        start = (i * batch) % (len(rows) - batch + 1)
+        chunk = rows[start:start + batch]
+        t0 = time.perf_counter()
+        predict(chunk)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e3), float(np.percentile(times, 99) * 1e3)
+
+
+def measure(model, cols, feature_cols, X_test, y_test, args):
+    """Metrics of a candidate as the service would serve it (MODEL_BACKEND=auto), or None if it cannot be compiled."""
+    keep = [list(feature_cols).index(col) for col in cols]
+    X = X_test[:, keep]
+    compiled = compile_model(model)
+    error = parity_error(model, compiled, len(cols))
+    if error > COMPILED_PARITY_TOL:
+        logger.warning(f"Compiled model differs from the original by {error:.2e}, skipping")
+        return None
+    predicted = compiled.predict_proba(X).argmax(axis=1)
+    served = HybridPredictor(compiled, model)
+    single, single_p99 = latency_ms(served.predict_proba, X, 1, args.repeat)
+    batch, _ = latency_ms(served.predict_proba, X, args.batch, max(5, args.repeat // 20))
+    return compiled, error, {
+        "accuracy": float(np.mean(predicted == y_test)),
+        "macro_f1": float(f1_score(y_test, predicted, average="macro")),
+        "features": len(cols),
+        "trees": compiled.n_trees,
+        "nodes": compiled.n_nodes,
+        "max_depth": compiled.max_depth,
+        "compiled_bytes": int(sum(a.nbytes for a in compiled.arrays().values())),
+        "pickle_bytes": len(pickle.dumps(model, protocol=4)),
+        "latency_ms": {"single": single, "single_p99": single_p99, "batch": batch,
+                       "batch_per_row": batch / args.batch},
+    }
+
+
+def pareto(results):
+    """Results no other result matches or beats on accuracy and both latencies (strictly on one)."""
+    def key(r):
+        return r["accuracy"], -r["latency_ms"]["single"], -r["latency_ms"]["batch_per_row"]
+
+    front = []
+    for r in results:
+        a = key(r)
+        if not any(all(x >= y for x, y in zip(key(o), a)) and key(o) != a for o in results if o is not r):
+            front.append(r)
+    # Of identical candidates keep the first
+    unique = {}
+    for r in front:
+        unique.setdefault(key(r), r)
+    return sorted(unique.values(), key=lambda r: r["latency_ms"]["single"])
+
+
+def write_variant(directory: Path, result, meta: dict, encoder_path: Path):
+    directory.mkdir(parents=True, exist_ok=True)
+    model_file = "xgb_enhanced.pkl" if hasattr(result["model"], "get_booster") else "rf_enhanced.pkl"
+    joblib.dump(result["model"], directory / model_file, protocol=4)
+    shutil.copy(encoder_path, directory / "label_encoder.pkl")
+    variant_meta = {**meta, "enhanced_feature_columns": result["columns"], "variant": result["name"]}
+    (directory / "feature_metadata.json").write_text(json.dumps(variant_meta, indent=2))
+    save_artifact(directory / "compiled", result["compiled"], result["classes"], result["columns"],
+                  directory / model_file, result["parity_error"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build latency/accuracy variants of the served model")
+    parser.add_argument("--data", type=Path, required=True, help="CSV of feature windows with labels")
+    parser.add_argument("--models-dir", type=Path, default=MODELS_DIR)
+    parser.add_argument("--model", help="Model file to start from (default: the one the service loads)")
+    parser.add_argument("--output", type=Path, help="Variants directory (default: <models-dir>/variants)")
+    parser.add_argument("--label-column", default="label")
+    parser.add_argument("--video-column", default="video")
+    parser.add_argument("--tree-fractions", type=float, nargs="*", default=[0.5, 0.25, 0.125])
+    parser.add_argument("--depths", type=int, nargs="*", default=[3, 4, 6])
+    parser.add_argument("--feature-counts", type=int, nargs="*", default=[6, 9, 12])
+    parser.add_argument("--distill", nargs="*", default=["16x4", "32x6"], help="Student forests, TREESxDEPTH")
+    parser.add_argument("--batch", type=int, default=256, help="Rows per call for the batch latency")
+    parser.add_argument("--repeat", type=int, default=500, help="Timed single-row calls per candidate")
+    args = parser.parse_args()
+    output = args.output or args.models_dir / "variants"
+
+    meta = json.loads((args.models_dir / "feature_metadata.json").read_text())
+    feature_cols = meta.get("enhanced_feature_columns", [])
+    split = json.loads((args.models_dir / "train_test_split.json").read_text())
+    encoder_path = args.models_dir / "label_encoder.pkl"
+    encoder = joblib.load(encoder_path)
+
+    X, labels, videos = load_table(args.data, feature_cols, args.label_column, args.video_column)
+    y = encoder.transform(labels)
+    test = held_out_mask(len(X), videos, split)
+    logger.info(f"{len(X)} rows: {int((~test).sum())} for training, {int(test.sum())} held out")
+
+    source_path, source = load_source(args.models_dir, args.model)
+    if getattr(source, "n_features_in_", len(feature_cols)) != len(feature_cols):
+        logger.error(f"{source_path.name} does not use the {len(feature_cols)} enhanced feature columns")
+        return 1
+    teacher = source if hasattr(source, "get_booster") else None
+    if teacher is None and (args.models_dir / "xgb_enhanced.pkl").exists() and args.distill:
+        teacher = joblib.load(args.models_dir / "xgb_enhanced.pkl")
+    logger.info(f"Source model: {source_path.name} ({type(source).__name__})")
+
+    results = []
+    for name, kind, params, model, cols in candidates(source, teacher, feature_cols, X[~test], y[~test], args):
+        measured = measure(model, cols, feature_cols, X[test], y[test], args)
+        if measured is None:
+            continue
+        compiled, error, metrics = measured
+        results.append({"name": name, "kind": kind, "params": params, **metrics, "model": model,
+                        "columns": cols, "compiled": compiled, "parity_error": error,
+                        "classes": encoder.classes_})
+    front = pareto(results)
+
+    print(f"\n{'variant':<18}{'acc':>7}{'F1':>7}{'trees':>7}{'nodes':>8}{'KB':>8}{'1 row ms':>10}"
+          f"{'batch us/row':>14}  pareto")
+    for r in sorted(results, key=lambda r: r["latency_ms"]["single"]):
+        lat = r["latency_ms"]
+        print(f"{r['name']:<18}{r['accuracy']:>7.3f}{r['macro_f1']:>7.3f}{r['trees']:>7}{r['nodes']:>8}"
+              f"{r['compiled_bytes'] / 1024:>8.0f}{lat['single']:>10.3f}{lat['batch_per_row'] * 1e3:>14.2f}"
+              f"  {'*' if any(r is f for f in front) else ''}")
+
+    # Replace the variants of a previous run
+    old_manifest = output / "manifest.json"
+    if old_manifest.exists():
+        for old in json.loads(old_manifest.read_text()).get("variants", []):
+            shutil.rmtree(output / old["directory"], ignore_errors=True)
+    output.mkdir(parents=True, exist_ok=True)
+    variants = []
+    for r in front:
+        write_variant(output / r["name"], r, meta, encoder_path)
+        variants.append({"name": r["name"], "directory": r["name"], "kind": r["kind"], "params": r["params"],
+                         **{k: r[k] for k in ("accuracy", "macro_f1", "features", "trees", "nodes", "max_depth",
+                                              "compiled_bytes", "pickle_bytes", "latency_ms")}})
+    manifest = {
+        "source": source_path.name,
+        "source_sha256": file_sha256(source_path),
+        "data": str(args.data),
+        "held_out_rows": int(test.sum()),
+        "batch_size": args.batch,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "machine": {"platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count()},
+        "variants": variants,
+    }
+    old_manifest.write_text(json.dumps(manifest, indent=2))
+    logger.info(f"✓ Wrote {len(variants)} Pareto-optimal variants of {len(results)} to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
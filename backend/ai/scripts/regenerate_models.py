@@ -5,10 +5,16 @@ Regenerate pickle files with Python 3.11 compatible versions.
 This script loads existing models and re-saves them using joblib.dump
 with Python 3.11 and pinned library versions to ensure compatibility.
 
+With --compile it also writes models/compiled/, a memory-mappable bundle
+of the served model's tree arrays, label classes and feature columns that
+the AI service loads at startup without importing xgboost or sklearn.
+
 Usage:
-    python scripts/regenerate_models.py
+    python scripts/regenerate_models.py [--compile | --compile-only]
 """
 
+import argparse
+import json
 import sys
 import logging
 from pathlib import Path
@@ -93,8 +99,61 @@ def regenerate_model(model_name: str):
         return False
 
 
+def export_compiled_model(models_dir: Path = MODELS_DIR, output_dir: Path = None) -> bool:
+    """Compile the model the service would serve into a startup-optimized bundle."""
+    from app.compiled import compile_model, parity_error, save_artifact
+    from app.infer import COMPILED_PARITY_TOL
+    
+    output_dir = output_dir or models_dir / "compiled"
+    logger.info(f"Exporting compiled model bundle to {output_dir}...")
+    
+    try:
+        with open(models_dir / "feature_metadata.json") as f:
+            feature_cols = json.load(f).get("enhanced_feature_columns", [])
+        encoder = joblib.load(models_dir / "label_encoder.pkl")
+        
+        # Same priority order as Classifier.load
+        for model_file in ["xgb_enhanced.pkl", "rf_enhanced.pkl", "rf_baseline.pkl"]:
+            path = models_dir / model_file
+            if not path.exists():
+                continue
+            try:
+                model = joblib.load(path)
+            except Exception as e:
+                logger.warning(f"Could not load {model_file}: {e}, trying next model...")
+                continue
+            
+            compiled = compile_model(model)
+            error = parity_error(model, compiled, getattr(model, "n_features_in_", len(feature_cols)))
+            if error > COMPILED_PARITY_TOL:
+                logger.error(f"✗ Compiled {model_file} differs from the original by {error:.2e}")
+                return False
+            
+            save_artifact(output_dir, compiled, encoder.classes_, feature_cols, path, error)
+            logger.info(f"✓ Compiled {model_file}: {compiled.n_trees} trees, {compiled.n_nodes} nodes, "
+                        f"parity error {error:.1e}")
+            return True
+        
+        logger.error("✗ No model file could be loaded for compilation")
+        return False
+        
+    except Exception as e:
+        logger.error(f"✗ Failed to export compiled model bundle: {e}")
+        return False
+
+
 def main():
     """Main function to regenerate all model files."""
+    parser = argparse.ArgumentParser(description="Regenerate model pickles for Python 3.11")
+    parser.add_argument("--compile", action="store_true",
+                        help="also export the compiled model bundle (models/compiled/) for fast startup")
+    parser.add_argument("--compile-only", action="store_true",
+                        help="only export the compiled model bundle, leave the pickles untouched")
+    args = parser.parse_args()
+    
+    if args.compile_only:
+        return 0 if export_compiled_model() else 1
+    
     logger.info("=" * 60)
     logger.info("Model Regeneration Script")
     logger.info("Python version: %s", sys.version)
@@ -128,6 +187,11 @@ def main():
         if regenerate_model(model_file):
             success_count += 1
     
+    if args.compile:
+        total_count += 1
+        if export_compiled_model():
+            success_count += 1
+    
     # Summary
     logger.info("=" * 60)
     logger.info(f"Regeneration complete: {success_count}/{total_count} files succeeded")